@@ -0,0 +1,369 @@
+"""
+Purple Agent V1 - asyncio Version
+
+Native asyncio variant of PurpleAgent for the async A2A servers. HTTP goes
+through a pooled httpx.AsyncClient and every wait (rate limiting, retry
+backoff, readiness polling) is an asyncio.sleep, so one event loop can
+drive many concurrent task runs without a thread per task.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import httpx
+
+from fetch_scheduler import FetchOutcome
+from paging import page_window, plan_pages
+from profiling import RunProfiler, parse_profile
+from purple_agent import PurpleAgent
+from rate_limit import TokenBucket
+import json_codec
+from row_pipeline import RowPipeline
+from run_context import RunContext
+import tracing
+
+
+def create_client(max_connections: int = 100, max_keepalive: int = 20) -> httpx.AsyncClient:
+    """Pooled async HTTP client that can be shared by many agents."""
+    return httpx.AsyncClient(
+        timeout=10,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+        ),
+    )
+
+
+class AsyncPurpleAgent(PurpleAgent):
+    """asyncio Purple Agent V1 with the same run(task_id, output_dir, mock_url) contract.
+
+    Row processing and output writing are inherited unchanged; the I/O
+    methods and run() are coroutines.
+    """
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        # A caller-supplied client stays owned by the caller; otherwise the
+        # agent creates one on first run and closes it in aclose()
+        self.client = client
+        self._owns_client = False
+
+    async def aclose(self) -> None:
+        """Close the HTTP client if this agent created it, then the log sink."""
+        if self._owns_client and self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            self._owns_client = False
+        self.close()
+
+    async def __aenter__(self) -> "AsyncPurpleAgent":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    def _connection_stats(self, ctx: RunContext) -> Dict[str, Any]:
+        """The httpx client pools its own connections; report whether it is shared."""
+        return {"client": "httpx.AsyncClient", "shared": not self._owns_client}
+
+    async def _throttle(self, ctx: RunContext) -> None:
+        """Pace the next request at the task's declared rate_limit_qps."""
+        if ctx.rate_limiter is not None:
+            with tracing.span("rate_limit_wait"):
+                await ctx.rate_limiter.acquire_async()
+
+    @tracing.traced()
+    async def _wait_for_http(self, url: str, timeout_s: int = 20, interval_s: float = 0.5) -> bool:
+        """Wait for HTTP endpoint to be ready."""
+        start = time.time()
+        while time.time() - start < timeout_s:
+            try:
+                resp = await self.client.get(url, timeout=2)
+                if resp.status_code < 500:
+                    return True
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(interval_s)
+        return False
+
+    @tracing.traced()
+    async def _configure_mock(self, ctx: RunContext, mock_url: str, task_def: Dict[str, Any]) -> bool:
+        """Configure mock service with task definition."""
+        self._log(ctx, f"Configuring mock service for task {task_def['task_id']}")
+        try:
+            ctx.current_request += 1
+            await self._throttle(ctx)
+            with ctx.telemetry.request("POST", f"{mock_url}/configure", request=ctx.current_request) as event:
+                resp = await self.client.post(f"{mock_url}/configure", json=task_def, timeout=10)
+                event.status, event.bytes = resp.status_code, len(resp.content)
+            resp.raise_for_status()
+            self._log(ctx, f"Mock configured: {json_codec.loads(resp.content)}")
+            return True
+        except Exception as e:
+            self._log(ctx, f"Configure failed: {e}", "ERROR")
+            return False
+
+    async def _request_once(
+        self,
+        ctx: RunContext,
+        url: str,
+        params: Dict[str, Any],
+        page: Optional[int] = None,
+        attempt: int = 0,
+        backoff: Optional[float] = None,
+    ) -> FetchOutcome:
+        """Make a single GET attempt and classify the response."""
+        # Pace first, so a fetch cancelled while waiting for a token is never counted
+        await self._throttle(ctx)
+        with ctx.lock:
+            ctx.current_request += 1
+            ctx.request_count += 1
+            request = ctx.current_request
+        try:
+            page = ctx.current_page if page is None else page
+            with ctx.telemetry.request("GET", url, params, request, page, attempt, backoff) as event:
+                resp = await self.client.get(url, params=params, timeout=10)
+                event.status, event.bytes = resp.status_code, len(resp.content)
+
+            if resp.status_code == 200:
+                self._log(ctx, f"Request successful [complete=true]", page=page, request=request)
+                return FetchOutcome(status=200, payload=json_codec.loads(resp.content), request=request)
+
+            if resp.status_code in (429, 500):
+                with ctx.lock:
+                    if resp.status_code == 429:
+                        ctx.http_429_count += 1
+                    else:
+                        ctx.http_500_count += 1
+                return FetchOutcome(
+                    status=resp.status_code,
+                    retry_after=resp.headers.get("Retry-After"),
+                    request=request,
+                )
+
+            resp.raise_for_status()
+            raise httpx.HTTPStatusError(f"Unexpected HTTP {resp.status_code}", request=resp.request, response=resp)
+        except (httpx.HTTPError, ValueError) as e:
+            return FetchOutcome(error=e, request=request)
+
+    @tracing.traced("fetch_page")
+    async def _fetch_with_retry(
+        self,
+        ctx: RunContext,
+        url: str,
+        params: Dict[str, Any],
+        max_retries: Optional[int] = None,
+        page: Optional[int] = None,
+        slots: Optional[asyncio.Semaphore] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch with policy-driven backoff on 429/500.
+
+        `slots` bounds concurrent requests; it is only held for the request
+        itself, never while backing off.
+        """
+        if max_retries is None:
+            max_retries = self.retry_policy.max_retries
+        backoff: Optional[float] = None
+        for attempt in range(max_retries + 1):
+            async with slots or contextlib.nullcontext():
+                outcome = await self._request_once(ctx, url, params, page, attempt, backoff)
+            if outcome.ok:
+                return outcome.payload
+
+            backoff = self._plan_retry(ctx, outcome, attempt, max_retries, backoff, page)
+            if backoff is None:
+                return None
+            with tracing.span("backoff", seconds=backoff):
+                await asyncio.sleep(backoff)
+        return None
+
+    async def _fetch_page(
+        self,
+        ctx: RunContext,
+        url: str,
+        page: int,
+        params: Dict[str, Any],
+        slots: asyncio.Semaphore,
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch one planned page window as its own task."""
+        label = f"page {page}" if "page" in params else f"offset {params['offset']}"
+        self._log(ctx, "Fetching %s", page=page, args=(label,))
+        return await self._fetch_with_retry(ctx, url, params, page=page, slots=slots)
+
+    async def _merge_off_loop(self, ctx: RunContext, *args: Any) -> int:
+        """_merge_planned_pages on a worker thread.
+
+        Feeding the pipeline (totals filter, dedup, row packing, spilling
+        sorted runs to disk) is CPU and file work that would otherwise stall
+        every other task on the event loop.
+        """
+        merge = ctx.profiler.profiled(self._merge_planned_pages) if ctx.profiler else self._merge_planned_pages
+        return await asyncio.to_thread(merge, ctx, *args)
+
+    @tracing.traced()
+    async def _fetch_all_pages(
+        self,
+        ctx: RunContext,
+        mock_url: str,
+        paging_mode: str,
+        page_size: int,
+        max_requests: int,
+        total_rows: int,
+    ) -> RowPipeline:
+        """Fetch all records: planned windows concurrently, then any tail one page at a time."""
+        self._log(ctx, f"Fetching records (paging_mode={paging_mode}, page_size={page_size})")
+
+        all_rows = ctx.pipeline
+        if paging_mode not in ("page", "offset"):
+            self._log(ctx, f"Unknown paging_mode: {paging_mode}", "ERROR")
+            return all_rows
+
+        url = f"{mock_url}/records"
+        plan = plan_pages(paging_mode, page_size, max_requests, total_rows)
+        self._log(ctx, f"Fetching {len(plan)} planned pages with {self.concurrency} concurrent requests")
+
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(page: int, params: Dict[str, Any]) -> Tuple[int, Optional[Dict[str, Any]]]:
+            return page, await self._fetch_page(ctx, url, page, params, slots)
+
+        # Pages are merged in page order as they finish; a page that finishes
+        # early waits in `results` until the pages before it are in
+        tasks = [asyncio.create_task(fetch(page, params)) for page, params in plan]
+        results: Dict[int, Optional[Dict[str, Any]]] = {}
+        pending = deque(plan)
+        next_page = plan[-1][0] + 1 if plan else max_requests + 1
+        try:
+            for finished in asyncio.as_completed(tasks):
+                page, payload = await finished
+                results[page] = payload
+                ready = []
+                while pending and pending[0][0] in results:
+                    ready.append(pending.popleft())
+                if not ready:
+                    continue
+                merged = await self._merge_off_loop(ctx, ready, results, paging_mode, page_size, max_requests, all_rows)
+                if merged != ready[-1][0] + 1:
+                    # Failed page or end of data: stop the fetches still running
+                    next_page = merged
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Tail beyond the plan (server returned fewer rows per page than planned)
+        while len(all_rows) < total_rows and next_page <= max_requests:
+            page, params = next_page, page_window(paging_mode, page_size, next_page)
+            result = await self._fetch_page(ctx, url, page, params, slots)
+            next_page = await self._merge_off_loop(
+                ctx, [(page, params)], {page: result}, paging_mode, page_size, max_requests, all_rows
+            )
+
+        self._log(ctx, f"Fetched {len(all_rows)} total rows [complete=true]")
+        return all_rows
+
+    async def run(
+        self,
+        task_id: str,
+        output_dir: str,
+        mock_url: str = "http://localhost:8000",
+        output_formats: Optional[Iterable[str]] = None,
+        profile: Optional[str] = None,
+    ) -> bool:
+        """Run Purple agent for a single task (safe to call concurrently)."""
+        profile = self.profile if profile is None else parse_profile(profile)
+        with self._run_span(task_id, output_dir):
+            if not profile:
+                return await self._run(task_id, output_dir, mock_url, output_formats)
+            profiler = RunProfiler(profile, self.profile_top)
+            with profiler:
+                return await self._run(task_id, output_dir, mock_url, output_formats, profiler)
+
+    async def _run(
+        self,
+        task_id: str,
+        output_dir: str,
+        mock_url: str,
+        output_formats: Optional[Iterable[str]],
+        profiler: Optional[RunProfiler] = None,
+    ) -> bool:
+        if self.client is None:
+            self.client = create_client()
+            self._owns_client = True
+        ctx = self._new_context(task_id, mock_url, output_formats, profiler)
+        ctx.telemetry.mark("wait")
+
+        self._log(ctx, f"Starting Purple Agent V1 (High Performance, asyncio) for task {task_id}")
+
+        # Wait for services to be ready
+        self._log(ctx, "Waiting for mock service...")
+        if not await self._wait_for_http(f"{mock_url}/docs", timeout_s=20):
+            self._log(ctx, "Mock service not ready after 20s", "ERROR")
+            return False
+        self._log(ctx, "Mock service ready")
+
+        # Load task definition
+        ctx.telemetry.mark("configure")
+        task_def = self._get_task_definition(ctx, task_id)
+        if not task_def:
+            self._log(ctx, f"Task {task_id} not found", "ERROR")
+            return False
+
+        # Pace every request of this run (including /configure) at the declared QPS
+        qps = task_def.get("constraints", {}).get("rate_limit_qps")
+        if qps:
+            ctx.rate_limiter = TokenBucket(qps)
+            self._log(ctx, f"Pacing requests at {qps} qps (token bucket)")
+
+        # Configure mock service
+        if not await self._configure_mock(ctx, mock_url, task_def):
+            return False
+
+        # Extract parameters
+        constraints = task_def.get("constraints", {})
+        paging_mode = constraints.get("paging_mode", "page")
+        page_size = constraints.get("page_size", 500)
+        max_requests = constraints.get("max_requests", 50)
+        total_rows = constraints.get("total_rows", 1000)
+        dedup_key = ["year", "reporter", "partner", "flow", "hs", "record_id"]
+
+        # Fetch all records, streaming each page through totals filtering and dedup
+        ctx.telemetry.mark("fetch")
+        ctx.pipeline = self._new_pipeline(task_id, dedup_key)
+        try:
+            rows = await self._fetch_all_pages(ctx, mock_url, paging_mode, page_size, max_requests, total_rows)
+            if not rows:
+                self._log(ctx, f"No rows fetched", "ERROR")
+                return False
+
+            # Merging spilled runs and writing outputs happen off the event loop
+            ctx.telemetry.mark("process")
+            processed_rows, totals_dropped = self._process_rows(ctx, rows, task_id)
+            # Sorting and merging run as data.jsonl consumes the rows; count them as processing
+            processed_rows = ctx.telemetry.timed("process", processed_rows)
+
+            ctx.telemetry.mark("write")
+            output_path = Path(output_dir)
+            await asyncio.to_thread(
+                ctx.profiler.profiled(self._write_outputs) if ctx.profiler else self._write_outputs,
+                ctx,
+                output_path,
+                task_id,
+                task_def["query"],
+                processed_rows,
+                dedup_key,
+                totals_dropped,
+            )
+        finally:
+            ctx.pipeline.close()
+            ctx.telemetry.close()
+
+        self._log(ctx, f"Task {task_id} complete (output: {output_path}) [complete=true]")
+        return True
@@ -0,0 +1,215 @@
+"""
+Crash-safe output directories.
+
+A run's files are written into a unique staging directory next to the final
+one (.<name>.staging-<pid>-<random>) and committed with one rename, so a
+reader, or a concurrent run of the same task_id, only ever sees a complete
+old directory or a complete new one, never a torn or mixed one. The last
+run to commit wins.
+
+On Linux an existing output directory is swapped out atomically with
+renameat2(RENAME_EXCHANGE) and then deleted. Elsewhere it is first renamed
+aside, which leaves a brief window with no directory but never a mixed one.
+A directory holding anything besides agent outputs is never swapped out;
+the staged files are moved into it one os.replace() at a time instead. So
+is a directory that can't be renamed: a mount point, or the working
+directory (or one of its parents), which the swap would delete from under
+the process. Those are staged inside the directory itself. final_dir is
+resolved first, so a symlink to a directory commits into its target.
+
+With fsync on, every staged file is fsynced in one batch at commit, then the
+staging directory and, after the rename, its parent, so a committed
+directory survives power loss. A crash leaves at most a .<name>.staging-*
+or .<name>.old-* directory behind; nothing reads those and they can be
+deleted when no run is active.
+"""
+
+from __future__ import annotations
+
+import ctypes
+import errno
+import os
+import shutil
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+
+from output_formats import FILENAMES
+
+# Files the agent writes; a directory holding only these may be swapped out whole
+OUTPUT_FILES = frozenset({"data.jsonl", "metadata.json", "metrics.jsonl", "run.log", "trace.json", "profile.pstats", "memory_top.txt", *FILENAMES.values()})
+
+# Renames retried when concurrent runs commit the same directory at once
+COMMIT_ATTEMPTS = 8
+
+# Rename errors meaning final_dir can't be replaced whole (busy, mount point, not a directory)
+_UNRENAMEABLE = (errno.EBUSY, errno.ENOTDIR, errno.EXDEV, errno.EINVAL)
+
+_AT_FDCWD = -100
+_RENAME_EXCHANGE = 2
+
+
+def _load_renameat2() -> Optional[Callable[..., int]]:
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+    except (OSError, AttributeError):
+        return None
+    renameat2.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_uint]
+    renameat2.restype = ctypes.c_int
+    return renameat2
+
+
+_renameat2 = _load_renameat2()
+
+
+def exchange(a: Path, b: Path) -> bool:
+    """Atomically swap two existing paths; False where the OS or filesystem can't."""
+    if _renameat2 is None:
+        return False
+    if _renameat2(_AT_FDCWD, os.fsencode(a), _AT_FDCWD, os.fsencode(b), _RENAME_EXCHANGE) == 0:
+        return True
+    err = ctypes.get_errno()
+    if err in (errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP):
+        return False
+    raise OSError(err, os.strerror(err), str(a), None, str(b))
+
+
+def fsync_path(path: Path, directory: bool = False) -> None:
+    fd = os.open(path, os.O_RDONLY | (os.O_DIRECTORY if directory else 0))
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _sibling(final_dir: Path, kind: str, parent: Optional[Path] = None) -> Path:
+    return (parent or final_dir.parent) / f".{final_dir.name}.{kind}-{os.getpid()}-{uuid.uuid4().hex[:12]}"
+
+
+def _pinned(final_dir: Path) -> bool:
+    """Whether final_dir must be updated in place: a mount point or the working directory's tree."""
+    if not final_dir.is_dir():
+        return False
+    cwd = Path.cwd().resolve()
+    return os.path.ismount(final_dir) or cwd == final_dir or final_dir in cwd.parents
+
+
+def _replace_file(source: str, target: Path) -> None:
+    """os.replace(), copying through a temporary file in target's directory across filesystems."""
+    try:
+        os.replace(source, target)
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+        tmp = _sibling(target, "tmp", target.parent)
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, target)
+        os.unlink(source)
+
+
+class StagedOutput:
+    """A run's output directory, written in a staging sibling and committed atomically.
+
+    Write into `path`, then call commit(). Used as a context manager, a
+    staging directory that was never committed is removed on exit.
+    """
+
+    def __init__(self, final_dir: Path, fsync: bool = False):
+        # Resolved so "." and symlinked directories are renamed as what they point at
+        self.final_dir = Path(final_dir).resolve()
+        self.fsync = fsync
+        self.final_dir.parent.mkdir(parents=True, exist_ok=True)
+        self.in_place = _pinned(self.final_dir)
+        # mkdir (not mkdtemp) so the committed directory gets the usual umask mode
+        self.path = _sibling(self.final_dir, "staging", self.final_dir if self.in_place else None)
+        self.path.mkdir()
+        self.committed = False
+
+    def _sync_staged(self) -> None:
+        files = [Path(entry.path) for entry in os.scandir(self.path) if entry.is_file()]
+        if files:
+            # fsync releases the GIL, so the batch is flushed concurrently
+            with ThreadPoolExecutor(max_workers=min(8, len(files))) as pool:
+                list(pool.map(fsync_path, files))
+        fsync_path(self.path, directory=True)
+
+    def _replaceable(self) -> bool:
+        with os.scandir(self.final_dir) as entries:
+            return all(entry.name in OUTPUT_FILES and entry.is_file(follow_symlinks=False) for entry in entries)
+
+    def _replace_files(self) -> None:
+        for entry in list(os.scandir(self.path)):
+            _replace_file(entry.path, self.final_dir / entry.name)
+        if self.fsync:
+            fsync_path(self.final_dir, directory=True)
+        os.rmdir(self.path)
+
+    def commit(self) -> str:
+        """Publish the staged files at final_dir; returns how ("rename", "exchange" or "files")."""
+        if self.fsync:
+            self._sync_staged()
+        if self.in_place:
+            self._replace_files()
+            self.committed = True
+            return "files"
+        trash: List[Path] = []
+        try:
+            for _ in range(COMMIT_ATTEMPTS):
+                try:
+                    # Replaces a missing or empty final_dir
+                    os.rename(self.path, self.final_dir)
+                    mode = "rename"
+                    break
+                except OSError as exc:
+                    if exc.errno in _UNRENAMEABLE:
+                        self._replace_files()
+                        mode = "files"
+                        break
+                    if exc.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                        raise
+                try:
+                    if not self._replaceable():
+                        self._replace_files()
+                        mode = "files"
+                        break
+                    if exchange(self.path, self.final_dir):
+                        # The staging path now holds the previous output
+                        trash.append(self.path)
+                        mode = "exchange"
+                        break
+                    aside = _sibling(self.final_dir, "old")
+                    os.rename(self.final_dir, aside)
+                    trash.append(aside)
+                except FileNotFoundError:
+                    # Another run moved final_dir away first; retry the rename
+                    continue
+                except OSError as exc:
+                    if exc.errno not in _UNRENAMEABLE:
+                        raise
+                    self._replace_files()
+                    mode = "files"
+                    break
+            else:
+                raise OSError(errno.EBUSY, f"Could not commit outputs after {COMMIT_ATTEMPTS} attempts", str(self.final_dir))
+        finally:
+            for path in trash:
+                shutil.rmtree(path, ignore_errors=True)
+        self.committed = True
+        if self.fsync:
+            fsync_path(self.final_dir.parent, directory=True)
+        return mode
+
+    def discard(self) -> None:
+        if not self.committed:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self) -> "StagedOutput":
+        return self
+
+    def __exit__(self, *exc: Any) -> Optional[bool]:
+        self.discard()
+        return None
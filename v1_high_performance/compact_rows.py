@@ -0,0 +1,134 @@
+"""
+Compact in-memory rows for fetched /records data.
+
+A parsed row is a dict that repeats its key strings, hash table and
+per-row copies of strings like "WLD" or "TOTAL". A packed row is a plain
+tuple (schema, value, ...): the field names live once in a shared Schema
+per distinct key layout, and values of low-cardinality fields (year,
+reporter, partner, flow, hs) are interned so every row points at the same
+objects. Schema.dumps() serializes a packed row exactly like json.dumps()
+of the original dict.
+"""
+
+from __future__ import annotations
+
+import sys
+from itertools import repeat
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+import json_codec
+
+# Fields whose values repeat across rows
+INTERNED_FIELDS = ("year", "reporter", "partner", "flow", "hs")
+
+# (Schema, value, ...) in the schema's field order
+PackedRow = Tuple[Any, ...]
+
+
+def _key_getter(positions: List[int]) -> Callable[[PackedRow], tuple]:
+    """Dedup key tuple of a packed row; position 0 marks a missing field (None)."""
+    if all(positions) and len(positions) > 1:
+        return itemgetter(*positions)
+    return lambda row: tuple(row[p] if p else None for p in positions)
+
+
+class Schema:
+    """Field layout shared by every packed row with the same keys in the same order."""
+
+    __slots__ = ("fields", "key", "interned", "_args")
+
+    def __init__(self, fields: Tuple[str, ...], dedup_key: List[str], interned_fields: Iterable[str]):
+        self._args = (fields, list(dedup_key), tuple(interned_fields))
+        self.fields = fields
+        position = {name: i + 1 for i, name in enumerate(fields)}
+        self.key = _key_getter([position.get(name, 0) for name in dedup_key])
+        # Indexes into the value list, not the packed tuple
+        self.interned = tuple(i for i, name in enumerate(fields) if name in interned_fields)
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Rebuilt from its layout: `key` may be a lambda (sharded sort workers unpickle rows)
+        return (Schema, self._args)
+
+    def to_dict(self, row: PackedRow) -> Dict[str, Any]:
+        return dict(zip(self.fields, row[1:]))
+
+    def dumps(self, row: PackedRow) -> str:
+        """json.dumps() of the row as the dict it was packed from (via json_codec)."""
+        return json_codec.dumps(self.to_dict(row))
+
+    def row_bytes(self, row: PackedRow) -> int:
+        """Resident size of one packed row, not counting shared interned values."""
+        interned = self.interned
+        return sys.getsizeof(row) + sum(
+            sys.getsizeof(value) for i, value in enumerate(row[1:]) if i not in interned
+        )
+
+
+def dumps_rows(rows: List[PackedRow]) -> str:
+    """Schema.dumps() of each row, joined by newlines; one codec call for plain packed rows."""
+    if all(type(row[0]) is Schema for row in rows):
+        return json_codec.dumps_lines([row[0].to_dict(row) for row in rows])
+    return "\n".join(row[0].dumps(row) for row in rows)
+
+
+class SchemaRegistry:
+    """Packs dict rows into tuples, sharing schemas and interned values per run."""
+
+    def __init__(self, dedup_key: List[str], interned_fields: Iterable[str] = INTERNED_FIELDS):
+        self.dedup_key = dedup_key
+        self.interned_fields = frozenset(interned_fields)
+        self._schemas: Dict[Tuple[str, ...], Schema] = {}
+        # Per type, so 1, 1.0 and True are never swapped for one another
+        self._strings: Dict[str, str] = {}
+        self._ints: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._schemas)
+
+    @property
+    def interned_values(self) -> int:
+        return len(self._strings) + len(self._ints)
+
+    def schema(self, fields: Tuple[str, ...]) -> Schema:
+        schema = self._schemas.get(fields)
+        if schema is None:
+            schema = self._schemas[fields] = Schema(fields, self.dedup_key, self.interned_fields)
+        return schema
+
+    def pack(self, row: Dict[str, Any]) -> PackedRow:
+        schema = self.schema(tuple(row))
+        values = list(row.values())
+        for i in schema.interned:
+            value = values[i]
+            if type(value) is str:
+                values[i] = self._strings.setdefault(value, value)
+            elif type(value) is int:
+                values[i] = self._ints.setdefault(value, value)
+        return (schema, *values)
+
+    def pack_columns(self, fields: Tuple[str, ...], columns: Sequence[Sequence[Any]]) -> List[PackedRow]:
+        """pack() of rows sharing one key layout, given as one value column per field."""
+        schema = self.schema(fields)
+        columns = list(columns)
+        strings, ints = self._strings, self._ints
+        for i in schema.interned:
+            column = columns[i]
+            types = set(map(type, column))
+            if types == {str}:
+                columns[i] = list(map(strings.setdefault, column, column))
+            elif types == {int}:
+                columns[i] = list(map(ints.setdefault, column, column))
+            else:
+                columns[i] = [
+                    strings.setdefault(value, value) if type(value) is str
+                    else ints.setdefault(value, value) if type(value) is int
+                    else value
+                    for value in column
+                ]
+        return list(zip(repeat(schema), *columns))
+
+    def clear(self) -> None:
+        self._schemas.clear()
+        self._strings.clear()
+        self._ints.clear()
@@ -0,0 +1,137 @@
+"""
+Non-blocking page fetch scheduling.
+
+PageScheduler runs single fetch attempts on a bounded worker pool. A page
+that needs a retry goes back into a delayed queue with its backoff, and the
+workers keep fetching the other pages meanwhile, so backoff time overlaps
+with useful work instead of stalling the whole run.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import heapq
+import itertools
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+@dataclass
+class FetchOutcome:
+    """Result of one HTTP attempt against /records."""
+
+    status: Optional[int] = None  # None when the request never got a response
+    payload: Optional[Dict[str, Any]] = None
+    retry_after: Optional[str] = None
+    error: Optional[Exception] = None
+    request: int = 0  # Request sequence number within the run
+
+    @property
+    def ok(self) -> bool:
+        return self.payload is not None
+
+
+@dataclass
+class PageJob:
+    """One planned page window and its retry state."""
+
+    page: int
+    params: Dict[str, Any]
+    attempt: int = 0
+    previous_backoff: Optional[float] = None
+
+
+class PageScheduler:
+    """Fetch page jobs concurrently with a delayed retry queue.
+
+    `attempt(job)` performs one request; `plan_retry(job, outcome)` returns
+    the backoff before the next attempt, or None to give up on the page.
+    cancel() (e.g. from on_result once the data has ended) stops the run.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        attempt: Callable[[PageJob], FetchOutcome],
+        plan_retry: Callable[[PageJob, FetchOutcome], Optional[float]],
+    ):
+        self.workers = max(1, workers)
+        self._attempt = attempt
+        self._plan_retry = plan_retry
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        """Fetch nothing more: drop pages not started yet and pending retries.
+
+        Attempts already in flight finish, but their pages are neither
+        retried nor reported.
+        """
+        self._cancelled = True
+
+    def run(
+        self,
+        jobs: List[PageJob],
+        on_result: Optional[Callable[[Dict[int, Optional[Dict[str, Any]]]], None]] = None,
+    ) -> Dict[int, Optional[Dict[str, Any]]]:
+        """Fetch every job; returns payload by page (None for pages that gave up).
+
+        `on_result(results)`, when given, is called on this thread each time
+        pages finish, and may pop the pages it has consumed from results.
+        """
+        results: Dict[int, Optional[Dict[str, Any]]] = {}
+        ready: Deque[PageJob] = deque(jobs)
+        delayed: List[Tuple[float, int, PageJob]] = []
+        in_flight: Dict[Future, PageJob] = {}
+        order = itertools.count()
+        self._cancelled = False
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while ready or delayed or in_flight:
+                if self._cancelled:
+                    ready.clear()
+                    delayed.clear()
+                    if not in_flight:
+                        break
+                now = time.monotonic()
+                while delayed and delayed[0][0] <= now:
+                    ready.append(heapq.heappop(delayed)[2])
+
+                while ready and len(in_flight) < self.workers:
+                    job = ready.popleft()
+                    # Each attempt runs in the run's context, so its trace span nests under the fetch
+                    in_flight[executor.submit(contextvars.copy_context().run, self._attempt, job)] = job
+
+                next_due = delayed[0][0] - time.monotonic() if delayed else None
+                if not in_flight:
+                    time.sleep(max(0.0, next_due or 0.0))
+                    continue
+
+                timeout = max(0.0, next_due) if next_due is not None else None
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+                finished = False
+                for future in done:
+                    job = in_flight.pop(future)
+                    outcome = future.result()
+                    if self._cancelled:
+                        continue
+                    if outcome.ok:
+                        results[job.page] = outcome.payload
+                        finished = True
+                        continue
+
+                    backoff = self._plan_retry(job, outcome)
+                    if backoff is None:
+                        results[job.page] = None
+                        finished = True
+                        continue
+
+                    job.attempt += 1
+                    job.previous_backoff = backoff
+                    heapq.heappush(delayed, (time.monotonic() + backoff, next(order), job))
+                if finished and on_result is not None:
+                    on_result(results)
+
+        return results
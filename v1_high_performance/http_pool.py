@@ -0,0 +1,158 @@
+"""
+Process-wide HTTP connection pools for mock service requests.
+
+Mock responses take well under a millisecond, so opening a TCP connection
+costs more than the request itself. ConnectionPools hands out one
+requests.Session per base URL (scheme://host:port) and every run against
+that URL - readiness polling, /configure and /records alike - shares its
+keep-alive connections. Pool stats show how often connections were reused.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def default_pool_size() -> int:
+    """Connections kept per base URL, from PURPLE_POOL_SIZE (default: 10)."""
+    env = os.getenv("PURPLE_POOL_SIZE")
+    if env:
+        return max(1, int(env))
+    return 10
+
+
+def _counting_pool(pool_cls: type, on_connect: Callable[[], None]) -> type:
+    """urllib3 pool class whose connections report every TCP (re)connect."""
+
+    class Connection(pool_cls.ConnectionCls):
+        def connect(self) -> None:
+            super().connect()
+            on_connect()
+
+    return type(pool_cls.__name__, (pool_cls,), {"ConnectionCls": Connection})
+
+
+class CountingAdapter(HTTPAdapter):
+    """HTTPAdapter that counts connects, including reconnects of pooled connections.
+
+    urllib3's own num_connections only counts connection objects, and a
+    pooled object that the server closed silently reconnects on reuse.
+    """
+
+    def __init__(self, **kwargs: Any):
+        self.connects = 0
+        self._connects_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def _connected(self) -> None:
+        with self._connects_lock:
+            self.connects += 1
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: _counting_pool(pool_cls, self._connected)
+            for scheme, pool_cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+
+def base_url(url: str) -> str:
+    """Registry key for `url`: lower-cased scheme://host[:port]."""
+    parts = urlsplit(url)
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+
+
+class ConnectionPools:
+    """Registry of pooled sessions keyed by base URL.
+
+    `pool_size` bounds the idle connections kept per host; with
+    `keep_alive=False` every request asks the server to close its connection
+    (useful to measure the cost of connection setup).
+    """
+
+    def __init__(self, pool_size: Optional[int] = None, keep_alive: bool = True):
+        self.pool_size = max(1, pool_size or default_pool_size())
+        self.keep_alive = keep_alive
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    def _new_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = CountingAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def session(self, url: str) -> requests.Session:
+        """Shared session for the base URL of `url` (created on first use)."""
+        key = base_url(url)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = self._new_session()
+            return session
+
+    def _url_stats(self, session: Optional[requests.Session]) -> Dict[str, int]:
+        requests_sent = opened = idle = 0
+        adapters = {} if session is None else {id(a): a for a in session.adapters.values()}
+        for adapter in adapters.values():
+            opened += adapter.connects
+            manager = adapter.poolmanager
+            for key in manager.pools.keys():
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                requests_sent += pool.num_requests
+                # The idle queue also holds None placeholders and closed connections
+                idle += sum(1 for conn in list(pool.pool.queue) if conn and conn.sock) if pool.pool else 0
+        return {
+            "requests": requests_sent,
+            "connections_opened": opened,
+            "connections_reused": max(0, requests_sent - opened),
+            "idle_connections": idle,
+        }
+
+    def stats(self, url: Optional[str] = None) -> Dict[str, Any]:
+        """Reuse stats for one base URL, or for every pool when url is None."""
+        with self._lock:
+            sessions = dict(self._sessions)
+        if url is not None:
+            return {
+                "pool_size": self.pool_size,
+                "keep_alive": self.keep_alive,
+                **self._url_stats(sessions.get(base_url(url))),
+            }
+        return {
+            "pool_size": self.pool_size,
+            "keep_alive": self.keep_alive,
+            "pools": {key: self._url_stats(session) for key, session in sessions.items()},
+        }
+
+    def close(self) -> None:
+        """Close every pooled connection."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+_default_pools: Optional[ConnectionPools] = None
+_default_lock = threading.Lock()
+
+
+def default_pools() -> ConnectionPools:
+    """The process-wide registry shared by agents built without their own."""
+    global _default_pools
+    with _default_lock:
+        if _default_pools is None:
+            _default_pools = ConnectionPools()
+        return _default_pools
@@ -0,0 +1,255 @@
+"""
+Local stand-in for the Green Comtrade Bench mock service.
+
+Serves the endpoints the agents use (POST /configure, GET /records, GET
+/docs) with every fault_injection mode of tasks.py, so runs and load tests
+need no external mock. Rows are synthesized on demand: row i of a task is a
+pure function of (seed, task, i), so any window of a multi-million row
+stream costs only the rows it returns, and the same seed always serves the
+same bytes.
+
+A configured task is a stream of exactly total_rows rows (what the agents
+count against), cut into windows by ?page=&page_size= or
+?offset=&maxRecords=. Fault modes:
+
+- none, pagination: rows 0..total_rows-1, record_id = position
+- duplicates: duplicate_rate of the positions repeat an earlier row of
+  their page and cross_page_duplicate_rate one of an earlier page (pages are
+  constraints.page_size rows)
+- rate_limit / server_error: /records calls listed in fail_on (1-based,
+  counted since /configure) get HTTP 429 with Retry-After / HTTP 500;
+  fail_rate also fails that fraction of calls, seeded by call number
+- page_drift: every response lists its rows in a different order, and the
+  first row of drift_rate of the pages repeats the last row of the page
+  before
+- totals_trap: every totals_every-th position is a totals row (isTotal,
+  partner WLD, hs TOTAL)
+
+Rated faults hit evenly spaced positions (from a seeded phase) rather than
+independent draws, so even a 25-row task gets its share.
+
+Every request first waits --latency-ms plus a uniform +-(--jitter-ms) delay.
+Clients sharing one mock can keep separate configurations under a path
+prefix: --mock-url http://localhost:8000/<name> configures and reads
+/<name>/configure and /<name>/records.
+
+Usage:
+    python3 mock_comtrade.py --port 8000
+    python3 mock_comtrade.py --port 8000 --latency-ms 20 --jitter-ms 10 --seed 7
+    python3 mock_comtrade.py --port 8000 --total-rows 5000000   # every task
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+from typing import Any, Dict, FrozenSet, List, Optional
+
+import json_codec
+
+from fastapi import FastAPI, Request
+import uvicorn
+
+FAULT_MODES = ("none", "pagination", "duplicates", "rate_limit", "server_error", "page_drift", "totals_trap")
+
+DEFAULT_RETRY_AFTER = 1.0
+DEFAULT_DRIFT_RATE = 0.25
+DEFAULT_TOTALS_EVERY = 50
+
+_MASK = (1 << 64) - 1
+# Salts keeping the draws of each decision independent
+_DUP, _CROSS, _DUP_SOURCE, _DRIFT, _VALUE, _FAIL, _ORDER, _LATENCY = range(1, 9)
+
+
+def _mix(*parts: int) -> int:
+    """splitmix64 over parts: a fast, seedable hash for per-position draws."""
+    x = 0
+    for part in parts:
+        x = (x ^ part) + 0x9E3779B97F4A7C15 & _MASK
+        x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & _MASK
+        x = (x ^ (x >> 27)) * 0x94D049BB133111EB & _MASK
+        x ^= x >> 31
+    return x
+
+
+def _unit(*parts: int) -> float:
+    """Uniform draw in [0, 1) determined by parts."""
+    return _mix(*parts) / 2.0 ** 64
+
+
+def _hits(rate: float, index: int, phase: float) -> bool:
+    """Whether index is one of a rate fraction of indexes spread evenly from phase."""
+    return rate > 0 and int((index + 1) * rate + phase) > int(index * rate + phase)
+
+
+class Scenario:
+    """One /configure'd task: its synthetic row stream and fault injection."""
+
+    def __init__(self, task: Dict[str, Any], seed: int = 0, total_rows: Optional[int] = None):
+        query = task["query"]
+        constraints = task.get("constraints") or {}
+        fault = task.get("fault_injection") or {}
+        self.task_id = task.get("task_id")
+        self.mode = fault.get("mode", "none")
+        if self.mode not in FAULT_MODES:
+            raise ValueError(f"Unknown fault_injection mode {self.mode!r}, expected one of {FAULT_MODES}")
+        self.seed = seed
+        self.total_rows = int(total_rows if total_rows is not None else constraints.get("total_rows", 1000))
+        self.page_size = max(1, int(constraints.get("page_size", 500)))
+        if self.total_rows < 0:
+            raise ValueError(f"total_rows must be >= 0, got {self.total_rows}")
+
+        self.fail_status = {"rate_limit": 429, "server_error": 500}.get(self.mode)
+        self.fail_on: FrozenSet[int] = frozenset(int(n) for n in fault.get("fail_on", ()))
+        self.fail_rate = float(fault.get("fail_rate", 0.0))
+        self.retry_after = float(fault.get("retry_after", DEFAULT_RETRY_AFTER))
+        self.duplicate_rate = float(fault.get("duplicate_rate", 0.0)) if self.mode == "duplicates" else 0.0
+        self.cross_rate = float(fault.get("cross_page_duplicate_rate", 0.0)) if self.mode == "duplicates" else 0.0
+        self.drift_rate = float(fault.get("drift_rate", DEFAULT_DRIFT_RATE)) if self.mode == "page_drift" else 0.0
+        self.totals_every = max(2, int(fault.get("totals_every", DEFAULT_TOTALS_EVERY)))
+
+        self._base = {
+            "year": query["year"],
+            "reporter": query["reporter"],
+            "partner": query["partner"],
+            "flow": query["flow"],
+            "hs": query["hs"],
+        }
+        # Seeds differ per task, so two tasks never share a stream
+        self._seed = _mix(seed, *(_mix(*map(ord, str(value))) for value in self._base.values()))
+        self._phases = {salt: _unit(self._seed, salt) for salt in (_DUP, _CROSS, _DRIFT)}
+        self.calls = 0
+
+    def describe(self) -> Dict[str, Any]:
+        return {"task_id": self.task_id, "mode": self.mode, "total_rows": self.total_rows, "seed": self.seed}
+
+    def next_call(self) -> int:
+        self.calls += 1
+        return self.calls
+
+    def fault(self, call: int) -> Optional[int]:
+        """HTTP status to fail /records call number `call` with, or None."""
+        if self.fail_status is None:
+            return None
+        if call in self.fail_on or (self.fail_rate and _unit(self._seed, _FAIL, call) < self.fail_rate):
+            return self.fail_status
+        return None
+
+    def _repeats(self, position: int) -> Optional[int]:
+        """Earlier position whose row `position` repeats, or None for a row of its own."""
+        page_start = position - position % self.page_size
+        if position > page_start and _hits(self.duplicate_rate, position, self._phases[_DUP]):
+            return page_start + int(_unit(self._seed, _DUP_SOURCE, position) * (position - page_start))
+        if page_start and _hits(self.cross_rate, position, self._phases[_CROSS]):
+            return int(_unit(self._seed, _DUP_SOURCE, position) * page_start)
+        if page_start and position == page_start and _hits(self.drift_rate, position // self.page_size - 1, self._phases[_DRIFT]):
+            return position - 1
+        return None
+
+    def row(self, position: int) -> Dict[str, Any]:
+        """Row served at stream position `position`."""
+        source = self._repeats(position)
+        while source is not None:
+            position, source = source, self._repeats(source)
+        value = (_mix(self._seed, _VALUE, position) >> 24) % 10_000_000_000 / 100
+        if self.mode == "totals_trap" and position % self.totals_every == self.totals_every - 1:
+            return dict(self._base, partner="WLD", hs="TOTAL", record_id=position, value=value * 100, isTotal=True)
+        return dict(self._base, record_id=position, value=value, isTotal=False)
+
+    def window(self, start: int, size: int, call: int) -> List[Dict[str, Any]]:
+        """Rows [start, start + size) of the stream, as served to /records call `call`."""
+        rows = [self.row(position) for position in range(start, min(self.total_rows, start + max(0, size)))]
+        if self.mode == "page_drift":
+            random.Random(_mix(self._seed, _ORDER, call)).shuffle(rows)
+        return rows
+
+
+def create_app(
+    seed: int = 0,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    total_rows: Optional[int] = None,
+) -> FastAPI:
+    """The mock service app; total_rows, when set, overrides every task's constraint."""
+    CodecJSONResponse = json_codec.response_class()
+    app = FastAPI(title="Green Comtrade Bench mock (local)", default_response_class=CodecJSONResponse)
+    # Configured scenarios by path prefix ("" for the unprefixed endpoints)
+    scenarios: Dict[str, Scenario] = {}
+    requests_seen = 0
+
+    async def delay() -> None:
+        nonlocal requests_seen
+        requests_seen += 1
+        seconds = (latency_ms + jitter_ms * (2 * _unit(seed, _LATENCY, requests_seen) - 1)) / 1000
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    async def configure(request: Request, scenario: str = ""):
+        await delay()
+        try:
+            configured = Scenario(json_codec.loads(await request.body()), seed, total_rows)
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            return CodecJSONResponse(content={"ok": False, "error": f"Invalid task definition: {e}"}, status_code=400)
+        scenarios[scenario] = configured
+        return {"ok": True, **configured.describe()}
+
+    async def records(
+        scenario: str = "",
+        page: Optional[int] = None,
+        page_size: Optional[int] = None,
+        offset: Optional[int] = None,
+        maxRecords: Optional[int] = None,
+    ):
+        configured = scenarios.get(scenario)
+        if configured is None:
+            return CodecJSONResponse(content={"error": "Not configured, POST /configure first"}, status_code=409)
+        call = configured.next_call()
+        await delay()
+        status = configured.fault(call)
+        if status == 429:
+            return CodecJSONResponse(
+                content={"error": "Too Many Requests"},
+                status_code=429,
+                headers={"Retry-After": f"{configured.retry_after:g}"},
+            )
+        if status is not None:
+            return CodecJSONResponse(content={"error": "Internal Server Error"}, status_code=status)
+        if page is not None:
+            size = page_size or configured.page_size
+            start = (page - 1) * size
+        else:
+            size = maxRecords or configured.page_size
+            start = offset or 0
+        if start < 0 or size < 0:
+            return CodecJSONResponse(content={"error": "page, offset and sizes must be positive"}, status_code=400)
+        return {"data": configured.window(start, size, call)}
+
+    for prefix in ("", "/{scenario}"):
+        app.add_api_route(f"{prefix}/configure", configure, methods=["POST"])
+        app.add_api_route(f"{prefix}/records", records, methods=["GET"])
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local Green Comtrade Bench mock service")
+    parser.add_argument("--host", default="127.0.0.1", help="Server host (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="Server port (default: 8000)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic rows and faults (default: 0)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every request (default: 0)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +- jitter on that delay (default: 0)")
+    parser.add_argument(
+        "--total-rows",
+        type=int,
+        default=None,
+        help="Rows served for every task instead of its constraints.total_rows",
+    )
+    args = parser.parse_args()
+
+    app = create_app(args.seed, args.latency_ms, args.jitter_ms, args.total_rows)
+    print(f"Starting mock service on {args.host}:{args.port} (seed {args.seed})")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Streaming data.jsonl writer with an incremental SHA-256.
+
+Rows are encoded in batches (one json_codec call per batch when the writer
+is given a batch encoder) and written as bytes through one large buffer.
+The digest is updated with exactly the bytes written, so data_sha256 needs
+no second read of the file and memory stays constant however many rows a
+run writes. Sinks (e.g. output_formats.FormatWriters) get the same bytes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Optional
+
+# Write buffer for the underlying file
+DEFAULT_BUFFER_BYTES = 1024 * 1024
+# Encoded lines joined into one write
+DEFAULT_BATCH_ROWS = 1024
+
+
+class HashingWriter:
+    """Line writer for data.jsonl that hashes everything it writes.
+
+    `encode` turns a batch of queued items into their lines joined by
+    newlines; by default items are already encoded lines. Each of `sinks`
+    has write(bytes) called with every block written; the caller closes
+    them. Use as a context manager; `hexdigest()` is final once it has
+    closed.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        buffer_bytes: int = DEFAULT_BUFFER_BYTES,
+        batch_rows: int = DEFAULT_BATCH_ROWS,
+        encode: Optional[Callable[[List[Any]], str]] = None,
+        sinks: Iterable[Any] = (),
+    ):
+        self.path = path
+        self.encode = encode or "\n".join
+        self.sinks = list(sinks)
+        self.batch_rows = max(1, batch_rows)
+        self.lines = 0
+        self.bytes_written = 0
+        self._sha256 = hashlib.sha256()
+        self._batch: list = []
+        self._file = open(path, "wb", buffering=buffer_bytes)
+
+    def write(self, item: Any) -> None:
+        """Queue one item, written as one line."""
+        self._batch.append(item)
+        if len(self._batch) >= self.batch_rows:
+            self.flush()
+
+    def write_text(self, text: str) -> None:
+        """Write raw text after everything queued so far."""
+        self.flush()
+        self._write(text.encode("utf-8"))
+
+    def _write(self, data: bytes) -> None:
+        self._sha256.update(data)
+        self._file.write(data)
+        for sink in self.sinks:
+            sink.write(data)
+        self.bytes_written += len(data)
+
+    def flush(self) -> None:
+        if not self._batch:
+            return
+        self.lines += len(self._batch)
+        batch, self._batch = self._batch, []
+        self._write((self.encode(batch) + "\n").encode("utf-8"))
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self._file.close()
+
+    def __enter__(self) -> "HashingWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> Optional[bool]:
+        self.close()
+        return None
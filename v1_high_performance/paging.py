@@ -0,0 +1,30 @@
+"""
+Page planning for Green Comtrade Bench record fetches.
+
+The task constraints declare total_rows and page_size up front, so the full
+set of page (or offset) windows can be planned before the first request and
+fetched concurrently.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Dict, List, Tuple
+
+
+def page_window(paging_mode: str, page_size: int, page: int) -> Dict[str, Any]:
+    """Request params for 1-based page number `page`."""
+    if paging_mode == "page":
+        return {"page": page, "page_size": page_size}
+    return {"offset": (page - 1) * page_size, "maxRecords": page_size}
+
+
+def plan_pages(
+    paging_mode: str,
+    page_size: int,
+    max_requests: int,
+    total_rows: int,
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """Return (page number, request params) for every window covering total_rows."""
+    page_count = min(max(1, math.ceil(total_rows / page_size)), max_requests)
+    return [(page, page_window(paging_mode, page_size, page)) for page in range(1, page_count + 1)]
@@ -0,0 +1,270 @@
+"""
+Streaming row pipeline for fetched /records pages.
+
+Pages flow through totals filtering and dedup as they arrive instead of the
+whole result set being copied once per processing step. Accepted rows are
+buffered up to a memory budget; a full buffer is sorted by dedup_key and
+spilled to a run file on disk, and the runs are k-way merged back into
+dedup_key order while data.jsonl is written. On-arrival dedup remembers
+key tuples, or fixed-width digests of them (see hashed_keys), and accepted
+rows are held packed (see compact_rows) rather than as dicts.
+
+In external sort mode (dedup_on_merge) there is no in-memory key set at
+all: duplicates sort next to each other and the merge keeps the first one
+that arrived, so memory stays within the budget however many unique rows a
+query returns.
+
+Large runs that never spilled are sorted and encoded across worker
+processes instead (see sharding).
+"""
+
+from __future__ import annotations
+
+import heapq
+import os
+import shutil
+import tempfile
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import json_codec
+from compact_rows import PackedRow, SchemaRegistry
+from hashed_keys import HashedKeySet, TupleKeySet, new_key_set
+from sharding import DEFAULT_SHARD_THRESHOLD, ShardedSort, release_workers, reserve_workers
+
+Row = Dict[str, Any]
+
+# Merge entries are (key, packed row). The buffer and every run are stably
+# sorted and the runs stay in arrival order, and heapq.merge breaks ties by
+# source order, so the first row fetched always wins dedup
+_by_key = itemgetter(0)
+
+
+class RowPipeline:
+    """Totals filter -> dedup -> sorted spill runs, fed one page at a time.
+
+    Pages are fed as parsed dicts; sorted_rows() yields packed rows.
+
+    `is_totals` drops matching rows (None disables the filter). Dedup keeps
+    the first row seen for each dedup_key, either on arrival or - with
+    dedup_on_merge - while merging. With memory_budget_bytes=None the buffer
+    never spills. At most `max_fan_in` runs are merged at once; more runs
+    are first merged into larger ones in extra passes. `digest_bits` (64 or
+    128) keeps on-arrival dedup keys as digests of that width instead of
+    tuples (None). A run of at
+    least `shard_threshold` rows still in memory is sorted in up to `shards`
+    processes when `shards` is above 1 and worker slots are free.
+    """
+
+    def __init__(
+        self,
+        dedup_key: List[str],
+        is_totals: Optional[Callable[[Row], bool]] = None,
+        memory_budget_bytes: Optional[int] = None,
+        spill_dir: Optional[str] = None,
+        dedup_on_merge: bool = False,
+        max_fan_in: int = 64,
+        digest_bits: Optional[int] = None,
+        shards: int = 1,
+        shard_threshold: int = DEFAULT_SHARD_THRESHOLD,
+    ):
+        self.dedup_key = dedup_key
+        self.is_totals = is_totals
+        self.memory_budget_bytes = memory_budget_bytes
+        self.spill_dir = spill_dir
+        self.dedup_on_merge = dedup_on_merge
+        self.max_fan_in = max(2, max_fan_in)
+        self.shards = max(1, shards)
+        self.shard_threshold = shard_threshold
+        self.digest_bits = digest_bits
+        self._seen: Optional[Union[TupleKeySet, HashedKeySet]] = None if dedup_on_merge else new_key_set(digest_bits)
+        self.schemas = SchemaRegistry(dedup_key)
+        self._buffer: List[PackedRow] = []
+        self._row_bytes = 0
+        self._runs: List[str] = []
+        self._run_id = 0
+        self._tmpdir: Optional[str] = None
+        # Stats
+        self.rows_fetched = 0
+        self.totals_dropped = 0
+        self.duplicates_dropped = 0
+        self.spilled_runs = 0
+        self.rows_spilled = 0
+        self.bytes_spilled = 0
+        self.peak_buffered_rows = 0
+        self.merge_passes = 0
+        self.pages = 0
+        # 1-based page (in feed order) -> duplicates dropped on arrival, nonzero only
+        self.duplicates_by_page: Dict[int, int] = {}
+        self.key_set_bytes = 0
+        self.sharded = 0
+
+    def __len__(self) -> int:
+        """Rows fed so far, before filtering (what len(all_rows) used to be)."""
+        return self.rows_fetched
+
+    @property
+    def rows_kept(self) -> int:
+        return self.rows_fetched - self.totals_dropped - self.duplicates_dropped
+
+    @property
+    def max_buffered_rows(self) -> Optional[int]:
+        """Rows that fit in the memory budget at the current size estimate."""
+        if self.memory_budget_bytes is None or not self._row_bytes:
+            return None
+        return max(1, self.memory_budget_bytes // self._row_bytes)
+
+    def key(self, row: PackedRow) -> tuple:
+        return row[0].key(row)
+
+    def extend(self, rows: Iterable[Row]) -> None:
+        """Feed one page of rows."""
+        sampled = False
+        duplicates = 0
+        for row in rows:
+            self.rows_fetched += 1
+            if self.is_totals is not None and self.is_totals(row):
+                self.totals_dropped += 1
+                continue
+            row = self.schemas.pack(row)
+            key = row[0].key(row)
+            if self._seen is not None and not self._seen.add(key):
+                duplicates += 1
+                continue
+            self._buffer.append(row)
+            if not sampled:
+                # Track the largest row seen, one sample per page
+                sampled = True
+                self._row_bytes = max(self._row_bytes, row[0].row_bytes(row))
+            limit = self.max_buffered_rows
+            if limit is not None and len(self._buffer) >= limit:
+                self._spill()
+        self.peak_buffered_rows = max(self.peak_buffered_rows, len(self._buffer))
+        self.pages += 1
+        if duplicates:
+            self.duplicates_dropped += duplicates
+            self.duplicates_by_page[self.pages] = duplicates
+
+    def _write_run(self, entries: Iterable[Tuple[tuple, PackedRow]]) -> Tuple[str, int]:
+        """Write sorted entries as row JSON lines; returns (path, rows)."""
+        if self._tmpdir is None:
+            self._tmpdir = tempfile.mkdtemp(prefix="purple-spill-", dir=self.spill_dir)
+        path = os.path.join(self._tmpdir, f"run-{self._run_id:05d}.jsonl")
+        self._run_id += 1
+        count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for _, row in entries:
+                line = row[0].dumps(row) + "\n"
+                f.write(line)
+                self.bytes_spilled += len(line)
+                count += 1
+        return path, count
+
+    def _spill(self) -> None:
+        """Sort the buffer and write it out as one run file."""
+        self.peak_buffered_rows = max(self.peak_buffered_rows, len(self._buffer))
+        self._buffer.sort(key=self.key)
+        path, count = self._write_run(self._keyed(self._buffer))
+        self._runs.append(path)
+        self.spilled_runs += 1
+        self.rows_spilled += count
+        self._buffer = []
+
+    def _keyed(self, rows: Iterable[PackedRow]) -> Iterator[Tuple[tuple, PackedRow]]:
+        for row in rows:
+            yield row[0].key(row), row
+
+    def _read_run(self, path: str) -> Iterator[Tuple[tuple, PackedRow]]:
+        with open(path, encoding="utf-8") as f:
+            yield from self._keyed(self.schemas.pack(json_codec.loads(line)) for line in f)
+
+    def _merge(self, sources: List[Iterator[Tuple[tuple, PackedRow]]]) -> Iterator[Tuple[tuple, PackedRow]]:
+        """k-way merge sorted entries, dropping later duplicates in dedup_on_merge mode."""
+        merged = heapq.merge(*sources, key=_by_key)
+        if not self.dedup_on_merge:
+            yield from merged
+            return
+        last_key = None
+        for entry in merged:
+            if entry[0] == last_key:
+                self.duplicates_dropped += 1
+                continue
+            last_key = entry[0]
+            yield entry
+
+    def _reduce_runs(self) -> None:
+        """Merge runs in groups of max_fan_in until one final merge can take them all."""
+        while len(self._runs) + 1 > self.max_fan_in:
+            self.merge_passes += 1
+            runs, self._runs = self._runs, []
+            for i in range(0, len(runs), self.max_fan_in):
+                group = runs[i:i + self.max_fan_in]
+                path, _ = self._write_run(self._merge([self._read_run(run) for run in group]))
+                for run in group:
+                    os.remove(run)
+                self._runs.append(path)
+
+    def sorted_rows(self) -> Iterator[PackedRow]:
+        """Yield every kept row, packed, in dedup_key order, merging spilled runs."""
+        # Fetching is over; the on-arrival dedup set is no longer needed
+        if self._seen is not None:
+            self.key_set_bytes = self._seen.nbytes
+            self._seen = None
+        workers = 0
+        if self.shards > 1 and not self._runs and len(self._buffer) >= self.shard_threshold:
+            workers = reserve_workers(self.shards)
+        if workers:
+            try:
+                yield from self._sharded_rows(workers)
+            finally:
+                release_workers(workers)
+            return
+        self._buffer.sort(key=self.key)
+        if self._runs:
+            self._reduce_runs()
+            self.merge_passes += 1
+        sources = [self._read_run(path) for path in self._runs] + [self._keyed(self._buffer)]
+        for _, row in self._merge(sources):
+            yield row
+
+    def _sharded_rows(self, workers: int) -> Iterator[PackedRow]:
+        """sorted_rows() across worker processes; rows come back already encoded."""
+        sort = ShardedSort(self._buffer, workers)
+        # The shards now hold the rows
+        self._buffer = []
+        self.sharded = workers
+        yield from sort.rows()
+        self.duplicates_dropped += sort.duplicates_dropped
+
+    def stats(self) -> Dict[str, Any]:
+        """Summary for metadata.json."""
+        return {
+            "engine": "row",
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "rows_fetched": self.rows_fetched,
+            "rows_kept": self.rows_kept,
+            "peak_buffered_rows": self.peak_buffered_rows,
+            "spilled_runs": self.spilled_runs,
+            "rows_spilled": self.rows_spilled,
+            "bytes_spilled": self.bytes_spilled,
+            "dedup": "during_merge" if self.dedup_on_merge else "on_arrival",
+            "duplicates_dropped": self.duplicates_dropped,
+            "pages": self.pages,
+            "duplicates_by_page": {str(page): count for page, count in self.duplicates_by_page.items()},
+            "key_digest_bits": None if self.dedup_on_merge else self.digest_bits,
+            "key_set_bytes": self._seen.nbytes if self._seen is not None else self.key_set_bytes,
+            "merge_fan_in": self.max_fan_in,
+            "merge_passes": self.merge_passes,
+            "shards": self.sharded,
+            "shard_threshold": self.shard_threshold if self.shards > 1 else None,
+            "row_format": "packed",
+            "schemas": len(self.schemas),
+            "interned_values": self.schemas.interned_values,
+        }
+
+    def close(self) -> None:
+        """Remove spilled run files and drop interned values."""
+        self.schemas.clear()
+        if self._tmpdir is not None:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
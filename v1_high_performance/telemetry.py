@@ -0,0 +1,225 @@
+"""
+Structured per-request telemetry for one task run.
+
+Every HTTP attempt against the mock service (/configure and each /records
+attempt, retries included) becomes one JSON event:
+
+    {"event": "request", "t": 0.1234, "request": 3, "page": 2,
+     "method": "GET", "endpoint": "/records", "params": {"page": 2},
+     "status": 429, "error": null, "latency_ms": 1.87, "bytes": 64,
+     "attempt": 1, "backoff_s": 0.5}
+
+`t` is seconds since the run started, `latency_ms` covers the HTTP call
+only (not rate-limit pacing), and `backoff_s` is the backoff slept before
+this attempt. Events stream to an anonymous temporary file as they happen
+and become metrics.jsonl when the outputs are written, so nothing is left
+behind by a run that fails or crashes.
+
+The run is also split into consecutive phases (wait, configure, fetch,
+process, write) by mark(); summary() feeds metadata.json["performance"]
+with /records latency percentiles, throughput and the time per phase.
+Sorted rows are produced lazily while data.jsonl is written, so timed()
+charges the time spent producing them to "process", not "write". The
+phase times also close metrics.jsonl, one event per phase:
+
+    {"event": "phase", "phase": "process", "seconds": 0.4321}
+"""
+
+from __future__ import annotations
+
+import shutil
+import tempfile
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, IO, Iterable, Iterator, Optional
+from urllib.parse import urlsplit
+
+import json_codec
+import tracing
+
+PHASES = ("wait", "configure", "fetch", "process", "write")
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(ordered: Any, pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not len(ordered):
+        return None
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class RequestEvent:
+    """One HTTP attempt; the caller fills in status and bytes from the response."""
+
+    __slots__ = ("fields", "status", "bytes", "error")
+
+    def __init__(self, fields: Dict[str, Any]):
+        self.fields = fields
+        self.status: Optional[int] = None
+        self.bytes = 0
+        self.error: Optional[str] = None
+
+
+class RunTelemetry:
+    """Request events, latencies and phase times of one task run."""
+
+    def __init__(self, spill_dir: Optional[str] = None, observer: Any = None):
+        self.spill_dir = spill_dir
+        # Also told about every request (server_metrics.ServerMetrics in server mode)
+        self.observer = observer
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.response_bytes = 0
+        # /records latencies in ms, kept compact for percentiles
+        self._latencies = array("d")
+        self.phases: Dict[str, float] = {}
+        self._phase: Optional[str] = None
+        self._phase_started = 0.0
+        # Time inside the current phase already charged to another one by timed()
+        self._charged = 0.0
+        self._events: Optional[IO[bytes]] = None
+        self._lock = threading.Lock()
+
+    def mark(self, phase: Optional[str]) -> None:
+        """End the current phase and start `phase` (None just stops the clock)."""
+        now = time.perf_counter()
+        if self._phase is not None:
+            elapsed = now - self._phase_started - self._charged
+            self.phases[self._phase] = self.phases.get(self._phase, 0.0) + elapsed
+        self._phase, self._phase_started = phase, now
+        self._charged = 0.0
+
+    def timed(self, phase: str, rows: Iterable[Any]) -> Iterator[Any]:
+        """Yield rows, charging the time spent producing them to `phase` instead of the running one."""
+        clock = time.perf_counter
+        rows = iter(rows)
+        spent = 0.0
+        try:
+            while True:
+                started = clock()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    spent += clock() - started
+                    return
+                spent += clock() - started
+                yield row
+        finally:
+            self.phases[phase] = self.phases.get(phase, 0.0) + spent
+            self._charged += spent
+
+    @contextmanager
+    def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        request: Optional[int] = None,
+        page: Optional[int] = None,
+        attempt: int = 0,
+        backoff: Optional[float] = None,
+    ) -> Iterator[RequestEvent]:
+        """Time the HTTP call inside the block and record it, also when it raises.
+
+        While a trace is active the call is also a span, so retries of a page
+        show up as separate attempts in trace.json.
+        """
+        endpoint = urlsplit(url).path
+        event = RequestEvent({
+            "event": "request",
+            "t": None,
+            "request": request,
+            "page": page,
+            "method": method,
+            "endpoint": endpoint,
+            "params": dict(params) if params else {},
+        })
+        with tracing.span(f"{method} {endpoint}", "http", page=page, attempt=attempt) as span:
+            started = time.perf_counter()
+            try:
+                yield event
+            except BaseException as e:
+                # Includes CancelledError: an abandoned request is recorded as such
+                event.error = f"{type(e).__name__}: {e}"
+                raise
+            finally:
+                self._record(event, started, time.perf_counter(), attempt, backoff)
+                span.set(status=event.status, bytes=event.bytes)
+
+    def _record(self, event: RequestEvent, started: float, ended: float, attempt: int, backoff: Optional[float]) -> None:
+        fields = event.fields
+        latency_ms = (ended - started) * 1000
+        fields.update(
+            t=round(started - self.started, 6),
+            status=event.status,
+            error=event.error,
+            latency_ms=round(latency_ms, 3),
+            bytes=event.bytes,
+            attempt=attempt,
+            backoff_s=round(backoff or 0.0, 6),
+        )
+        line = (json_codec.dumps(fields) + "\n").encode("utf-8")
+        with self._lock:
+            self.requests += 1
+            self.response_bytes += event.bytes
+            if fields["endpoint"].endswith("/records"):
+                self._latencies.append(latency_ms)
+            if self._events is None:
+                self._events = tempfile.TemporaryFile(prefix="purple-metrics-", dir=self.spill_dir)
+            self._events.write(line)
+        if self.observer is not None:
+            self.observer.observe_request(fields["endpoint"], event.status, latency_ms / 1000, attempt)
+
+    def write_events(self, path: Path) -> int:
+        """Write every request event so far, then the phase times, to `path` (metrics.jsonl).
+
+        Returns the request event count.
+        """
+        with self._lock:
+            with open(path, "wb") as out:
+                if self._events is not None:
+                    self._events.flush()
+                    self._events.seek(0)
+                    shutil.copyfileobj(self._events, out)
+                    self._events.seek(0, 2)
+                for phase in PHASES:
+                    if phase in self.phases:
+                        event = {"event": "phase", "phase": phase, "seconds": round(self.phases[phase], 4)}
+                        out.write((json_codec.dumps(event) + "\n").encode("utf-8"))
+            return self.requests
+
+    def close(self) -> None:
+        with self._lock:
+            if self._events is not None:
+                self._events.close()
+                self._events = None
+
+    def summary(self, rows_fetched: int, rows_written: int) -> Dict[str, Any]:
+        """metadata.json["performance"]."""
+        with self._lock:
+            ordered = sorted(self._latencies)
+            response_bytes = self.response_bytes
+        fetch_s = self.phases.get("fetch", 0.0)
+        run_s = sum(self.phases.values())
+        latency = {"count": len(ordered)}
+        for pct in PERCENTILES:
+            value = percentile(ordered, pct)
+            latency[f"p{pct}"] = None if value is None else round(value, 3)
+        latency["max"] = round(ordered[-1], 3) if ordered else None
+        return {
+            "latency_ms": latency,
+            "throughput": {
+                "fetch_rows_per_second": round(rows_fetched / fetch_s, 1) if fetch_s else None,
+                "fetch_bytes_per_second": round(response_bytes / fetch_s, 1) if fetch_s else None,
+                "rows_written_per_second": round(rows_written / run_s, 1) if run_s else None,
+            },
+            "requests": self.requests,
+            "response_bytes": response_bytes,
+            "phases_seconds": {phase: round(self.phases[phase], 4) for phase in PHASES if phase in self.phases},
+            "metrics_log": "metrics.jsonl",
+        }
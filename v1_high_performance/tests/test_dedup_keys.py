@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from hashed_keys import HashedKeySet, TupleKeySet, new_key_set
+from row_pipeline import RowPipeline
+
+DEDUP_KEY = ["year", "reporter", "partner", "flow", "hs", "record_id"]
+
+
+@pytest.mark.parametrize("bits", [None, 64, 128])
+def test_key_sets_follow_tuple_equality(bits):
+    keys = new_key_set(bits)
+    assert keys.add((2021, "840", 1))
+    assert not keys.add((2021.0, "840", 1.0))
+    assert not keys.add((2021, "840", True))
+    assert keys.add((2021, "840", 0.0))
+    assert not keys.add((2021, "840", -0.0))
+    assert not keys.add((2021, "840", False))
+    # Values that are not == stay apart
+    assert keys.add((2021, "840", "1"))
+    assert keys.add((2021, "840", 1.5))
+    assert len(keys) == 4
+
+
+@pytest.mark.parametrize("bits", [64, 128])
+def test_digest_set_matches_tuple_set(bits):
+    rng = random.Random(bits)
+    digests, tuples = HashedKeySet(bits, capacity=8), TupleKeySet()
+    for _ in range(20000):
+        key = (rng.choice([2020, 2021.0, True]), str(rng.randint(0, 50)), rng.randint(0, 300))
+        assert digests.add(key) == tuples.add(key)
+    assert len(digests) == len(tuples)
+
+
+def test_default_key_set_is_tuples():
+    assert isinstance(new_key_set(), TupleKeySet)
+    assert isinstance(new_key_set(64), HashedKeySet)
+    with pytest.raises(ValueError):
+        new_key_set(32)
+
+
+def mixed_rows():
+    rows = []
+    for i in range(300):
+        # record_id alternates between int and float spellings of the same number
+        record_id = [i, float(i)][i % 2] if i % 3 else i
+        rows.append({"year": 2021, "reporter": "840", "partner": "156", "flow": "M", "hs": "85",
+                     "record_id": record_id, "value": float(i), "isTotal": False})
+    dupes = [dict(row, record_id=float(row["record_id"]), value=-1.0) for row in rows[::7]]
+    dupes += [dict(row, record_id=int(row["record_id"]), value=-2.0) for row in rows[1::5]]
+    return rows + dupes
+
+
+def dedup(pipeline):
+    rows = mixed_rows()
+    for start in range(0, len(rows), 40):
+        pipeline.extend(rows[start:start + 40])
+    try:
+        return [row[0].dumps(row) for row in pipeline.sorted_rows()]
+    finally:
+        pipeline.close()
+
+
+def test_engines_dedup_alike(tmp_path):
+    expected = dedup(RowPipeline(DEDUP_KEY))
+    assert len(expected) == 300
+    assert dedup(RowPipeline(DEDUP_KEY, digest_bits=64)) == expected
+    assert dedup(RowPipeline(DEDUP_KEY, digest_bits=128)) == expected
+    # Spilled runs, deduplicated while merging
+    spilled = RowPipeline(DEDUP_KEY, memory_budget_bytes=4096, spill_dir=str(tmp_path), dedup_on_merge=True)
+    assert dedup(spilled) == expected
+
+
+def test_columnar_engine_dedups_alike():
+    columnar = pytest.importorskip("columnar")
+    assert dedup(columnar.ColumnarPipeline(DEDUP_KEY)) == dedup(RowPipeline(DEDUP_KEY))
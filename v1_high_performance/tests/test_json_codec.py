@@ -0,0 +1,54 @@
+import json
+import math
+
+import pytest
+
+import json_codec
+
+CODECS = [name for name, installed in json_codec.available().items() if installed]
+
+ROW = {"year": 2021, "reporter": "USA", "partner": "CHN", "flow": "M", "hs": "8471", "record_id": 7, "value": 1.5, "isTotal": False}
+
+EDGE_VALUES = [
+    0.1, 1e16, 1.5e16, 9999999999999998.0, 1e-4, 1e-5, 0.00001234, 1e300, -0.0, 5e-324,
+    math.nan, math.inf, -math.inf,
+    2 ** 63 - 1, 2 ** 64, -2 ** 63, 10 ** 30,
+    "é", "Côte d'Ivoire", " ", "😀", "\x7f", "\x00", 'say "hi"', "back\\slash", "tab\t", '", "x": 1',
+    None, True, [], {}, [1, {"a": None}], {"nested": {"b": 1}},
+]
+
+
+@pytest.fixture(params=CODECS)
+def codec(request):
+    return json_codec.select(request.param)
+
+
+@pytest.mark.parametrize("value", EDGE_VALUES, ids=repr)
+def test_dumps_matches_stdlib(codec, value):
+    row = dict(ROW, value=value)
+    assert codec.dumps(row) == json.dumps(row)
+    assert codec.dumps(value) == json.dumps(value)
+    assert codec.dumps_lines([ROW, row, ROW]) == "\n".join(map(json.dumps, [ROW, row, ROW]))
+
+
+@pytest.mark.parametrize("value", [v for v in EDGE_VALUES if not (isinstance(v, float) and not math.isfinite(v))], ids=repr)
+def test_dumps_compact_matches_starlette(codec, value):
+    body = {"data": [dict(ROW, value=value)]}
+    expected = json.dumps(body, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+    assert codec.dumps_compact(body) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    ['{"n": 123456789012345678901234567890}', '{"v": NaN, "w": -Infinity}', '"\\ud800"', '{"x": 1e400}', '[1.0, -0.0, 1E-7]'],
+)
+def test_loads_matches_stdlib(codec, text):
+    expected, loaded = json.loads(text), codec.loads(text.encode())
+    assert repr(loaded) == repr(expected)
+    assert type(loaded) is type(expected)
+
+
+def test_empty_and_mixed_batches(codec):
+    assert codec.dumps_lines([]) == ""
+    assert codec.dumps_lines([{}]) == "{}"
+    assert codec.dumps_lines([ROW, [1], "s"]) == "\n".join(map(json.dumps, [ROW, [1], "s"]))
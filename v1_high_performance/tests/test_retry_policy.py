@@ -0,0 +1,17 @@
+from retry_policy import RetryPolicy
+
+
+def test_retry_after_is_honored_past_the_backoff_cap():
+    policy = RetryPolicy(cap_seconds=8.0)
+    assert policy.delay(0, 429, "30") == 30.0
+    assert policy.delay(0, 500, "30") == 1.0
+    assert RetryPolicy(honor_retry_after=False).delay(2, 429, "30") == 4.0
+
+
+def test_retry_budget_bounds_a_long_retry_after():
+    policy = RetryPolicy(budget_seconds=10.0)
+    budget = policy.new_budget()
+    assert budget.take(policy.delay(0, 429, "6"))
+    assert not budget.take(policy.delay(1, 429, "6"))
+    assert budget.exhausted
+    assert budget.spent_seconds == 6.0
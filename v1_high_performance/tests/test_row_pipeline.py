@@ -0,0 +1,86 @@
+import json
+import random
+
+import pytest
+
+from compact_rows import dumps_rows
+from row_pipeline import RowPipeline
+
+DEDUP_KEY = ["year", "reporter", "partner", "flow", "hs", "record_id"]
+
+
+def is_totals(row):
+    return row.get("isTotal") is True and row.get("partner") == "WLD" and row.get("hs") == "TOTAL"
+
+
+def pages(count=20, size=250, seed=3):
+    """Shuffled pages with in-page and cross-page duplicates, totals rows and a few odd values."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count * size):
+        record_id = rng.randrange(count * size // 2)
+        row = {
+            "year": 2020 + record_id % 3,
+            "reporter": "USA",
+            "partner": "WLD" if i % 97 == 0 else rng.choice(["CHN", "DEU", "Côte d'Ivoire"]),
+            "flow": "M",
+            "hs": "TOTAL" if i % 97 == 0 else "8471",
+            "record_id": record_id,
+            "value": rng.choice([i / 7, 1e16, 1e-5, -0.0, 123]),
+            "isTotal": i % 97 == 0,
+        }
+        if i % 50 == 0:
+            row["note"] = 'quote " and \\ slash'
+        rows.append(row)
+    return [rows[start:start + size] for start in range(0, len(rows), size)]
+
+
+def expected_bytes(feed):
+    """First row per dedup key, totals dropped, in dedup_key order, as json.dumps lines."""
+    first = {}
+    for page in feed:
+        for row in page:
+            if not is_totals(row):
+                first.setdefault(tuple(row[k] for k in DEDUP_KEY), row)
+    return "\n".join(json.dumps(first[key]) for key in sorted(first))
+
+
+def output_bytes(pipeline, feed):
+    for page in feed:
+        pipeline.extend(page)
+    try:
+        return dumps_rows(list(pipeline.sorted_rows()))
+    finally:
+        pipeline.close()
+
+
+def test_spilled_merge_matches_in_memory_bytes(tmp_path):
+    feed = pages()
+    in_memory = output_bytes(RowPipeline(DEDUP_KEY, is_totals), feed)
+    spilling = RowPipeline(DEDUP_KEY, is_totals, memory_budget_bytes=40_000, spill_dir=str(tmp_path))
+    spilled = output_bytes(spilling, feed)
+    assert spilling.spilled_runs > 2
+    assert spilling.peak_buffered_rows < spilling.rows_kept // 2
+    assert spilled == in_memory == expected_bytes(feed)
+    assert spilling.totals_dropped > 0 and spilling.duplicates_dropped > 0
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("max_fan_in", [2, 64])
+def test_dedup_during_merge_matches_in_memory_bytes(tmp_path, max_fan_in):
+    feed = pages()
+    external = RowPipeline(
+        DEDUP_KEY,
+        is_totals,
+        memory_budget_bytes=40_000,
+        spill_dir=str(tmp_path),
+        dedup_on_merge=True,
+        max_fan_in=max_fan_in,
+    )
+    merged = output_bytes(external, feed)
+    assert merged == expected_bytes(feed)
+    assert external.spilled_runs > max_fan_in or max_fan_in == 64
+    assert (external.merge_passes > 1) == (max_fan_in == 2)
+    assert external.duplicates_dropped > 0
+    assert external.stats()["key_set_bytes"] == 0
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,50 @@
+import json
+import threading
+
+from purple_agent import PurpleAgent
+from retry_policy import RetryPolicy
+
+TASKS = ["T2_multi_page", "T3_duplicates", "T4_rate_limit_429", "T7_totals_trap"]
+
+
+def outputs(output_dir):
+    metadata = json.loads((output_dir / "metadata.json").read_text())
+    return {
+        "data": (output_dir / "data.jsonl").read_bytes(),
+        "task_id": metadata["task_id"],
+        "request_count": metadata["request_count"],
+        "retries": metadata["request_stats"]["retries_total"],
+        "log": (output_dir / "run.log").read_text(),
+    }
+
+
+def test_concurrent_runs_on_one_agent_keep_their_own_state(comtrade_url, tmp_path):
+    # Each run gets its own mock scenario (URL prefix), so faults and call counts don't mix
+    expected = {}
+    for task_id in TASKS:
+        with PurpleAgent(retry_policy=RetryPolicy(base_seconds=0.01)) as agent:
+            assert agent.run(task_id, str(tmp_path / "serial" / task_id), f"{comtrade_url}/serial-{task_id}")
+        expected[task_id] = outputs(tmp_path / "serial" / task_id)
+
+    results = {}
+    barrier = threading.Barrier(len(TASKS))
+    with PurpleAgent(retry_policy=RetryPolicy(base_seconds=0.01)) as agent:
+
+        def run(task_id):
+            barrier.wait()
+            results[task_id] = agent.run(task_id, str(tmp_path / "shared" / task_id), f"{comtrade_url}/shared-{task_id}")
+
+        threads = [threading.Thread(target=run, args=(task_id,)) for task_id in TASKS]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(60)
+
+    assert results == {task_id: True for task_id in TASKS}
+    for task_id in TASKS:
+        got = outputs(tmp_path / "shared" / task_id)
+        for field in ("data", "task_id", "request_count", "retries"):
+            assert got[field] == expected[task_id][field], (task_id, field)
+        others = [other for other in TASKS if other != task_id]
+        assert not any(other in got["log"] for other in others)
+    assert expected["T4_rate_limit_429"]["retries"] > 0
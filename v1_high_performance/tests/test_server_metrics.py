@@ -0,0 +1,125 @@
+import asyncio
+
+import pytest
+
+import server_metrics
+from admission import AdmissionController
+from purple_agent import PurpleAgent
+from retry_policy import RetryPolicy
+from server_metrics import Counter, Histogram, ServerMetrics
+from worker_pool import WorkerPool
+
+
+def samples(text):
+    """Sample lines of an exposition by series (name plus labels)."""
+    values = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            series, value = line.rsplit(" ", 1)
+            values[series] = float(value)
+    return values
+
+
+def test_every_family_has_help_and_type():
+    text = ServerMetrics().render()
+    lines = text.splitlines()
+    assert text.endswith("\n")
+    for name, kind in [
+        ("purple_tasks_total", "counter"),
+        ("purple_task_duration_seconds", "histogram"),
+        ("purple_upstream_request_duration_seconds", "histogram"),
+        ("purple_upstream_retries_total", "counter"),
+        ("process_start_time_seconds", "gauge"),
+    ]:
+        type_line = lines.index(f"# TYPE {name} {kind}")
+        assert lines[type_line - 1].startswith(f"# HELP {name} ")
+    values = samples(text)
+    # Unlabelled counters start at 0; labelled families have no series yet
+    assert values["purple_upstream_retries_total"] == 0
+    assert not any(series.startswith("purple_tasks_total{") for series in values)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", ("endpoint",), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(seconds, "/records")
+    assert histogram.samples() == [
+        'latency_seconds_bucket{endpoint="/records",le="0.1"} 2',
+        'latency_seconds_bucket{endpoint="/records",le="1"} 3',
+        'latency_seconds_bucket{endpoint="/records",le="+Inf"} 4',
+        'latency_seconds_sum{endpoint="/records"} 2.65',
+        'latency_seconds_count{endpoint="/records"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    counter = Counter("errors_total", "Errors", ("reason",))
+    counter.inc('bad "quote"\\\n')
+    assert counter.samples() == ['errors_total{reason="bad \\"quote\\"\\\\\\n"} 1']
+
+
+def test_upstream_requests_by_status():
+    metrics = ServerMetrics()
+    metrics.observe_request("/records", 200, 0.003, 0)
+    metrics.observe_request("/records", 429, 0.002, 1)
+    metrics.observe_request("/records", 503, 0.2, 2)
+    metrics.observe_request("/configure", None, 0.3, 0)
+    values = samples(metrics.render())
+    assert values['purple_upstream_request_duration_seconds_count{endpoint="/records",status="200"}'] == 1
+    assert values['purple_upstream_request_duration_seconds_bucket{endpoint="/records",status="503",le="0.1"}'] == 0
+    assert values['purple_upstream_request_duration_seconds_count{endpoint="/configure",status="error"}'] == 1
+    assert values["purple_upstream_retries_total"] == 2
+    assert values["purple_upstream_rate_limited_total"] == 1
+    assert values["purple_upstream_server_errors_total"] == 1
+
+
+def test_task_outcomes_and_series_cap(monkeypatch):
+    monkeypatch.setattr(server_metrics, "MAX_TASK_SERIES", 2)
+    metrics = ServerMetrics()
+
+    def run(task_id, succeed):
+        if succeed is None:
+            raise RuntimeError("boom")
+        return succeed
+
+    assert metrics.run_task(run, "T1", True)
+    assert not metrics.run_task(run, "T2", False)
+    with pytest.raises(RuntimeError):
+        metrics.run_task(run, "T3", None)
+
+    async def cancelled(task_id):
+        raise asyncio.CancelledError
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(metrics.run_task_async(cancelled, "T1"))
+    values = samples(metrics.render())
+    for outcome in ("completed", "failed", "error", "cancelled"):
+        assert values[f'purple_tasks_total{{outcome="{outcome}"}}'] == 1
+    assert values['purple_task_duration_seconds_count{task_id="T1"}'] == 2
+    assert values['purple_task_duration_seconds_count{task_id="other"}'] == 1
+    assert not any('task_id="T3"' in series for series in values)
+
+
+def test_render_reads_pool_and_admission_gauges():
+    pool = WorkerPool(3)
+    try:
+        values = samples(ServerMetrics().render(pool, AdmissionController(2, 4)))
+    finally:
+        pool.shutdown()
+    assert values["purple_worker_pool_max_workers"] == 3
+    assert values["purple_worker_pool_queue_depth"] == 0
+    assert values["purple_tasks_in_flight"] == 0
+    assert values["purple_admission_rejected_total"] == 0
+    assert values["process_resident_memory_bytes"] > 0
+
+
+def test_agent_runs_feed_the_upstream_metrics(comtrade_url, tmp_path):
+    metrics = ServerMetrics()
+    with PurpleAgent(metrics=metrics, retry_policy=RetryPolicy(base_seconds=0.01)) as agent:
+        assert metrics.run_task(agent.run, "T4_rate_limit_429", str(tmp_path), comtrade_url)
+    values = samples(metrics.render())
+    assert values['purple_tasks_total{outcome="completed"}'] == 1
+    assert values['purple_upstream_request_duration_seconds_count{endpoint="/records",status="429"}'] >= 1
+    assert values['purple_upstream_request_duration_seconds_count{endpoint="/records",status="200"}'] >= 3
+    assert values["purple_upstream_rate_limited_total"] >= 1
+    assert values["purple_upstream_retries_total"] >= 1
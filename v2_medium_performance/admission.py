@@ -0,0 +1,150 @@
+"""
+Admission control for the A2A servers.
+
+Every task run holds its fetched rows in memory and occupies a worker, so the
+servers cap how many runs are in flight. Callers beyond the cap wait in a
+bounded queue for a limited time; once the queue is full (or the wait times
+out) the request is rejected with a JSON-RPC "busy" error, HTTP 503 and a
+Retry-After hint instead of slowing every other run down.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+# JSON-RPC server-defined error code for "try again later"
+BUSY_ERROR_CODE = -32000
+
+
+class ServerBusy(Exception):
+    """Raised when a request cannot be admitted."""
+
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(f"Server busy ({reason}), retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def busy_error(rpc_id: Any, exc: ServerBusy) -> Dict[str, Any]:
+    """JSON-RPC error body for a rejected request."""
+    return {
+        "jsonrpc": "2.0",
+        "id": rpc_id,
+        "error": {
+            "code": BUSY_ERROR_CODE,
+            "message": "Server busy",
+            "data": {"reason": exc.reason, "retry_after_seconds": exc.retry_after},
+        },
+    }
+
+
+def retry_after_header(exc: ServerBusy) -> Dict[str, str]:
+    """HTTP headers for a 503 rejection."""
+    return {"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+
+
+class AdmissionController:
+    """Caps in-flight runs with a bounded, time-limited wait queue.
+
+    max_in_flight=None disables admission control.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: Optional[int],
+        max_queue: int = 0,
+        queue_timeout: float = 0.0,
+        retry_after: float = 5.0,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = max(0.0, queue_timeout)
+        self.retry_after = retry_after
+        self._slots = asyncio.Semaphore(max_in_flight) if max_in_flight else None
+        # Gauges
+        self.in_flight = 0
+        self.waiting = 0
+        # Counters
+        self.admitted = 0
+        self.rejected = 0
+
+    def _reject(self, reason: str) -> ServerBusy:
+        self.rejected += 1
+        return ServerBusy(self.retry_after, reason)
+
+    async def acquire(self) -> None:
+        """Take a run slot, waiting in the queue if allowed; raises ServerBusy."""
+        if self._slots is not None:
+            if self._slots.locked():
+                if self.waiting >= self.max_queue or self.queue_timeout <= 0:
+                    raise self._reject("queue_full")
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+                except asyncio.TimeoutError:
+                    raise self._reject("queue_timeout") from None
+                finally:
+                    self.waiting -= 1
+            else:
+                await self._slots.acquire()
+        self.in_flight += 1
+        self.admitted += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        if self._slots is not None:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a run slot for the duration of the block."""
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Current gauges and counters."""
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that admits POST requests through an AdmissionController.
+
+    Used where the JSON-RPC dispatch is owned by a framework (the a2a-sdk
+    app); GETs such as the agent card and health checks always pass.
+    """
+
+    def __init__(self, app: Any, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.controller.acquire()
+        except ServerBusy as exc:
+            body = json.dumps(busy_error(None, exc)).encode("utf-8")
+            headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+            headers += [(k.lower().encode(), v.encode()) for k, v in retry_after_header(exc).items()]
+            await send({"type": "http.response.start", "status": 503, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
@@ -0,0 +1,85 @@
+"""
+JSON codec benchmark on a synthetic /records page set.
+
+Decodes every page body and encodes every page's rows as JSON lines (the
+batches HashingWriter hands to json_codec) with each installed codec,
+checks the output is byte-identical to json.dumps, and prints the timings
+against the stdlib.
+
+Usage:
+    python3 bench_json.py                      # 1M rows in pages of 5000
+    python3 bench_json.py --rows 200000 --page-size 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+import json_codec
+
+
+def make_pages(rows: int, page_size: int, seed: int = 0) -> List[bytes]:
+    """/records response bodies shaped like the mock service's pages."""
+    rng = random.Random(seed)
+    pages = []
+    for start in range(0, rows, page_size):
+        data = [
+            {
+                "year": rng.choice([2021, 2022, 2023]),
+                "reporter": str(rng.randint(4, 894)),
+                "partner": rng.choice(["WLD", str(rng.randint(4, 894))]),
+                "flow": rng.choice(["M", "X"]),
+                "hs": rng.choice(["TOTAL", f"{rng.randint(1, 99):02d}"]),
+                "record_id": i,
+                "value": round(rng.uniform(0, 1e9), rng.randint(0, 2)),
+                "isTotal": rng.random() < 0.01,
+            }
+            for i in range(start, min(rows, start + page_size))
+        ]
+        pages.append(json.dumps({"data": data, "page": len(pages) + 1}).encode("utf-8"))
+    return pages
+
+
+def run(name: str, pages: List[bytes]) -> Dict[str, Any]:
+    codec = json_codec.select(name)
+    started = time.perf_counter()
+    decoded = [codec.loads(body)["data"] for body in pages]
+    decode_s = time.perf_counter() - started
+
+    digest = hashlib.sha256()
+    started = time.perf_counter()
+    for rows in decoded:
+        digest.update(codec.dumps_lines(rows).encode("utf-8"))
+    encode_s = time.perf_counter() - started
+    return {"codec": codec.name, "decode_s": decode_s, "encode_s": encode_s, "sha256": digest.hexdigest()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark JSON codecs on a synthetic page set")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows in the page set (default: 1000000)")
+    parser.add_argument("--page-size", type=int, default=5000, help="Rows per page (default: 5000)")
+    args = parser.parse_args()
+
+    pages = make_pages(args.rows, args.page_size)
+    print(f"{args.rows} rows in {len(pages)} pages, {sum(map(len, pages)) / 1e6:.1f} MB")
+
+    names = ["stdlib"] + [name for name, ok in json_codec.available().items() if ok and name != "stdlib"]
+    results = [run(name, pages) for name in names]
+    baseline = results[0]
+    for result in results:
+        identical = result["sha256"] == baseline["sha256"]
+        print(
+            f"{result['codec']:>8}: decode {result['decode_s']:6.2f}s "
+            f"({baseline['decode_s'] / result['decode_s']:.1f}x)  "
+            f"encode {result['encode_s']:6.2f}s ({baseline['encode_s'] / result['encode_s']:.1f}x)  "
+            f"byte-identical={identical}"
+        )
+
+
+if __name__ == "__main__":
+    main()
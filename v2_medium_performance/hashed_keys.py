@@ -0,0 +1,141 @@
+"""
+Dedup key sets for streaming row dedup.
+
+By default seen keys are kept as dedup_key tuples in a set (TupleKeySet),
+the fastest option and the same key equality as every other engine. A
+tuple costs about 100 bytes per unique row on top of the set table.
+
+HashedKeySet (opt-in, --dedup-digest-bits) stores a fixed-width BLAKE2b
+digest of each key instead, in a flat open-addressing table of 64-bit
+words: 16 bytes per slot for 64-bit digests and 32 for 128-bit ones at the
+worst-case 50% load, with no per-key Python objects. It roughly halves the
+key set's memory but hashes every key in Python, which makes feeding rows
+about 2-3x slower.
+"""
+
+from __future__ import annotations
+
+import math
+import sys
+from array import array
+from hashlib import blake2b
+from typing import Any, Optional, Set, Tuple, Union
+
+DIGEST_BITS = (64, 128)
+
+
+def _canonical(value: Any) -> Any:
+    """A value every value == to it maps to (True -> 1, 2.0 -> 2, -0.0 -> 0)."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, float) and math.isfinite(value) and value.is_integer():
+        return int(value)
+    return value
+
+
+def key_digest(key: Tuple[Any, ...], digest_bytes: int = 16) -> bytes:
+    """Fixed-width digest of a dedup_key tuple.
+
+    Keys that compare equal as tuples get the same digest, so the digest
+    set dedups exactly like a set of tuples: numbers are canonicalized
+    (1 == 1.0 == True, -0.0 == 0.0), and repr() keeps other types apart
+    ("1" vs 1).
+    """
+    return blake2b(repr(tuple(map(_canonical, key))).encode("utf-8"), digest_size=digest_bytes).digest()
+
+
+class TupleKeySet:
+    """Set of dedup_key tuples with the HashedKeySet interface."""
+
+    def __init__(self) -> None:
+        self._keys: Set[Tuple[Any, ...]] = set()
+        self._key_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def nbytes(self) -> int:
+        """Set table plus the key tuples (their values are shared with the buffered rows)."""
+        return sys.getsizeof(self._keys) + self._key_bytes * len(self._keys)
+
+    def add(self, key: Tuple[Any, ...]) -> bool:
+        """Add `key`; False if it was already present."""
+        keys = self._keys
+        size = len(keys)
+        keys.add(key)
+        if len(keys) == size:
+            return False
+        if not self._key_bytes:
+            self._key_bytes = sys.getsizeof(key)
+        return True
+
+
+class HashedKeySet:
+    """Open-addressing set of key digests in flat array("Q") tables.
+
+    A 64-bit digest takes one table; 128-bit digests add a second table
+    for the low word. Zero marks an empty slot, so a zero high word is
+    stored as 1.
+    """
+
+    def __init__(self, digest_bits: int = 128, capacity: int = 1024):
+        if digest_bits not in DIGEST_BITS:
+            raise ValueError(f"digest_bits must be one of {DIGEST_BITS}, got {digest_bits}")
+        self.digest_bits = digest_bits
+        self.digest_bytes = digest_bits // 8
+        slots = 1
+        while slots < capacity:
+            slots *= 2
+        self._allocate(slots)
+
+    def _allocate(self, slots: int) -> None:
+        self._slots = slots
+        self._mask = slots - 1
+        self._high = array("Q", bytes(8 * slots))
+        self._low = array("Q", bytes(8 * slots)) if self.digest_bits == 128 else None
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        tables = 1 if self._low is None else 2
+        return 8 * self._slots * tables
+
+    def _insert(self, high: int, low: int) -> bool:
+        table, lows, mask = self._high, self._low, self._mask
+        slot = high & mask
+        while True:
+            current = table[slot]
+            if not current:
+                table[slot] = high
+                if lows is not None:
+                    lows[slot] = low
+                self._count += 1
+                return True
+            if current == high and (lows is None or lows[slot] == low):
+                return False
+            slot = (slot + 1) & mask
+
+    def _grow(self) -> None:
+        highs, lows = self._high, self._low
+        self._allocate(self._slots * 2)
+        for slot, high in enumerate(highs):
+            if high:
+                self._insert(high, lows[slot] if lows is not None else 0)
+
+    def add(self, key: Tuple[Any, ...]) -> bool:
+        """Add the digest of `key`; False if it was already present."""
+        if (self._count + 1) * 2 > self._slots:
+            self._grow()
+        digest = key_digest(key, self.digest_bytes)
+        return self._insert(int.from_bytes(digest[:8], "little") or 1, int.from_bytes(digest[8:], "little"))
+
+
+def new_key_set(digest_bits: Optional[int] = None) -> Union[TupleKeySet, HashedKeySet]:
+    """Tuples by default; 64- or 128-bit digests when digest_bits is set."""
+    if digest_bits is None:
+        return TupleKeySet()
+    return HashedKeySet(digest_bits)
@@ -0,0 +1,231 @@
+"""
+CPU and memory profiling of one task run.
+
+--profile cpu|mem|both (or "profile" in a task request) wraps the run in
+cProfile and/or tracemalloc and leaves next to data.jsonl:
+
+- profile.pstats: cProfile stats of the run, including work it hands to
+  other threads through profiled() (page fetch workers, the async agent's
+  output writer); open with pstats or snakeviz
+- memory_top.txt: peak traced memory and the top allocation sites (by
+  file:line) live when metadata.json is written, i.e. with the fetched
+  rows still buffered
+
+metadata.json["profile"] records the mode, peak traced memory and the
+files written. Only one run is CPU profiled at a time (from Python 3.12
+cProfile sees every thread); another run asking for it meanwhile is not
+CPU profiled. tracemalloc is process-wide, so a run's memory report can
+include allocations of runs alongside it. The profile ends just before the
+outputs are committed: its files are staged with them, so they land in the
+output directory in the same atomic commit. A run that fails before then
+writes no profile.
+"""
+
+from __future__ import annotations
+
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+PROFILES = ("cpu", "mem", "both")
+
+PSTATS_FILENAME = "profile.pstats"
+MEMORY_FILENAME = "memory_top.txt"
+
+# Allocation sites listed in memory_top.txt
+DEFAULT_TOP = 25
+
+# cProfile sees only the thread that enabled it before 3.12 (sys.monitoring since)
+_ALL_THREADS = sys.version_info >= (3, 12)
+
+# One CPU-profiled run at a time
+_cpu_lock = threading.Lock()
+# Runs currently tracing allocations; tracemalloc stops when the last one ends
+_mem_lock = threading.Lock()
+_mem_users = 0
+
+
+def parse_profile(value: Optional[str]) -> Optional[str]:
+    """Validate a --profile / task request value; None or "" means no profiling."""
+    if not value:
+        return None
+    if value not in PROFILES:
+        raise ValueError(f"Unknown profile mode {value!r}, expected one of {PROFILES}")
+    return value
+
+
+def _mib(n: int) -> str:
+    return f"{n / (1024 * 1024):.1f} MiB"
+
+
+class _Snapshot:
+    """pstats input from a cProfile.Profile that may still be running on another thread."""
+
+    def __init__(self, profile: cProfile.Profile):
+        self._profile = profile
+
+    def create_stats(self) -> None:
+        self._profile.snapshot_stats()
+        self.stats = self._profile.stats
+
+
+class RunProfiler:
+    """cProfile and/or tracemalloc around one run; use as a context manager and write() inside it."""
+
+    def __init__(self, mode: str, top: int = DEFAULT_TOP):
+        self.mode = parse_profile(mode)
+        self.top = max(1, top)
+        self.cpu = self.mode in ("cpu", "both")
+        self.mem = self.mode in ("mem", "both")
+        self.notes: List[str] = []
+        self._profile: Optional[cProfile.Profile] = None
+        self._thread = threading.get_ident()
+        # Profiles of other threads that ran profiled() work, by thread id
+        self._thread_profiles: Dict[int, cProfile.Profile] = {}
+        self._lock = threading.Lock()
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+        self._checkpoint: Dict[str, Any] = {}
+        self._peak = 0
+        self._stopped = False
+
+    def __enter__(self) -> "RunProfiler":
+        global _mem_users
+        if self.cpu and not _cpu_lock.acquire(blocking=False):
+            self.cpu = False
+            self.notes.append("cpu profiling skipped: another run is being profiled")
+        if self.mem:
+            with _mem_lock:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                _mem_users += 1
+            tracemalloc.reset_peak()
+        if self.cpu:
+            self._thread = threading.get_ident()
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, *exc: Any) -> Optional[bool]:
+        global _mem_users
+        if self.cpu:
+            self._profile.disable()
+            _cpu_lock.release()
+        if self.mem:
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            with _mem_lock:
+                _mem_users -= 1
+                if not _mem_users:
+                    tracemalloc.stop()
+        return None
+
+    def profiled(self, fn: F) -> F:
+        """fn, CPU profiled into this run's stats also when it is called on another thread."""
+        if not self.cpu or _ALL_THREADS:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            ident = threading.get_ident()
+            if ident == self._thread or self._stopped:
+                return fn(*args, **kwargs)
+            with self._lock:
+                profile = self._thread_profiles.setdefault(ident, cProfile.Profile())
+            profile.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+        return wrapper  # type: ignore[return-value]
+
+    def checkpoint(self) -> Dict[str, Any]:
+        """Memory so far and the files the profile will write, for metadata.json["profile"]."""
+        info: Dict[str, Any] = {"mode": self.mode, "files": self.filenames()}
+        if self.mem and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            self._peak = max(self._peak, peak)
+            # Allocation sites are taken here, while the run's rows are still buffered
+            self._snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ))
+            self._checkpoint = {"traced_bytes": current, "peak_traced_bytes": self._peak}
+            info.update(self._checkpoint)
+        if self.notes:
+            info["notes"] = list(self.notes)
+        return info
+
+    def stop(self) -> None:
+        """End the profile here; profiles running on other threads are snapshotted by write()."""
+        if self._stopped:
+            return
+        self._stopped = True
+        ident = threading.get_ident()
+        if self.cpu and (_ALL_THREADS or ident == self._thread):
+            self._profile.disable()
+        with self._lock:
+            profile = self._thread_profiles.get(ident)
+        if profile is not None:
+            profile.disable()
+        if self.mem and tracemalloc.is_tracing():
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+
+    def filenames(self) -> List[str]:
+        return ([PSTATS_FILENAME] if self.cpu else []) + ([MEMORY_FILENAME] if self.mem else [])
+
+    def write(self, output_dir: Path) -> List[Path]:
+        """stop(), then write profile.pstats and/or memory_top.txt into output_dir; returns the paths written."""
+        self.stop()
+        output_dir = Path(output_dir)
+        written = []
+        try:
+            output_dir.mkdir(parents=True, exist_ok=True)
+            if self.cpu and self._profile is not None:
+                with self._lock:
+                    profiles = list(self._thread_profiles.values())
+                stats = pstats.Stats(_Snapshot(self._profile))
+                for profile in profiles:
+                    stats.add(_Snapshot(profile))
+                written.append(self._replace(output_dir / PSTATS_FILENAME, stats.dump_stats))
+            if self.mem:
+                written.append(self._replace(output_dir / MEMORY_FILENAME, self._write_memory_report))
+        except OSError as e:
+            logger.warning("Could not write profile to %s: %s", output_dir, e)
+        return written
+
+    def _replace(self, path: Path, write: Any) -> Path:
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        write(tmp)
+        os.replace(tmp, path)
+        return path
+
+    def _write_memory_report(self, path: Path) -> None:
+        lines = [f"Peak traced memory: {_mib(self._peak)} ({self._peak} bytes)"]
+        if self._snapshot is None:
+            lines.append("No allocation snapshot (the run ended before writing metadata.json)")
+        else:
+            stats = self._snapshot.statistics("lineno")
+            lines.append(
+                f"Traced when metadata.json was written: {_mib(self._checkpoint['traced_bytes'])}"
+                f" ({self._checkpoint['traced_bytes']} bytes)"
+            )
+            lines.append("")
+            lines.append(f"Top {min(self.top, len(stats))} allocation sites by size at that point:")
+            for rank, stat in enumerate(stats[: self.top], 1):
+                frame = stat.traceback[0]
+                lines.append(f"{rank:>4}. {frame.filename}:{frame.lineno}: {_mib(stat.size)} in {stat.count} blocks")
+            rest = stats[self.top:]
+            if rest:
+                lines.append(f"      {len(rest)} other sites: {_mib(sum(s.size for s in rest))}")
+        lines.extend(self.notes)
+        Path(path).write_text("\n".join(lines) + "\n", encoding="utf-8")
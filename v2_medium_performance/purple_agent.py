@@ -13,39 +13,116 @@ from __future__ import annotations
 import hashlib
 import json
 import time
+from collections import deque
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import requests
 
+from fetch_scheduler import FetchOutcome, PageJob, PageScheduler
+import json_codec
+from http_pool import ConnectionPools, default_pools
+from log_sink import LogLine, create_sink, message_level
+from atomic_output import StagedOutput
+from output_formats import FormatWriters, parse_formats
+from output_writer import HashingWriter
+from paging import plan_pages
+from profiling import DEFAULT_TOP, RunProfiler, parse_profile
+from rate_limit import TokenBucket
+from retry_policy import RetryPolicy
+from compact_rows import PackedRow, dumps_rows
+from row_pipeline import RowPipeline
+from sharding import DEFAULT_SHARD_THRESHOLD
+from run_context import RunContext
+from server_metrics import ServerMetrics
+from telemetry import RunTelemetry
+import tracing
+
 
 class PurpleAgent:
     """Medium-performance Purple Agent V2 for green-comtrade-bench evaluation."""
 
-    def __init__(self):
-        self.session = requests.Session()
-        self.log_lines: List[str] = []
-        # Efficiency tracking
-        self.request_count = 0
-        self.retry_count = 0
-        self.start_time = 0.0
-        self.current_task_id = ""
-        self.current_page = 0
-
-    def _log(self, message: str) -> None:
-        """Add message to run log with basic traceability."""
-        # Add task_id and page for basic observability
-        prefix = f"[task_id={self.current_task_id}] [page={self.current_page}]"
-        full_message = f"{prefix} {message}"
-        self.log_lines.append(full_message)
-        print(f"[Purple V2] {full_message}")
+    def __init__(
+        self,
+        concurrency: int = 1,
+        retry_policy: Optional[RetryPolicy] = None,
+        pools: Optional[ConnectionPools] = None,
+        memory_budget_mb: Optional[float] = 256,
+        spill_dir: Optional[str] = None,
+        external_sort: bool = False,
+        engine: str = "row",
+        dedup_digest_bits: Optional[int] = None,
+        shards: int = 1,
+        shard_threshold: int = DEFAULT_SHARD_THRESHOLD,
+        output_formats: Iterable[str] = (),
+        compress_threads: Optional[int] = None,
+        fsync_outputs: bool = False,
+        log_sink: str = "queue",
+        log_level: str = "INFO",
+        metrics: Optional[ServerMetrics] = None,
+        trace: bool = False,
+        profile: Optional[str] = None,
+        profile_top: int = DEFAULT_TOP,
+    ):
+        # Long-lived and shared by every run; per-run state lives in RunContext
+        # Keep-alive connections per mock_url, shared process-wide by default
+        self.pools = pools or default_pools()
+        self.retry_policy = retry_policy or RetryPolicy()
+        # Page fetch workers; 1 fetches pages one at a time, retries still overlap
+        self.concurrency = max(1, concurrency)
+        # Rows buffered per run before a sorted run is spilled to disk (None: never spill)
+        self.memory_budget_mb = memory_budget_mb
+        self.spill_dir = spill_dir
+        # Dedup during the merge instead of with an in-memory key set
+        self.external_sort = external_sort
+        # "row" (pure Python) or "columnar" (NumPy, in memory only)
+        self.engine = engine
+        # Keep dedup keys seen during fetch as 64- or 128-bit digests (None: tuples)
+        self.dedup_digest_bits = dedup_digest_bits
+        # Worker processes that sort runs of at least shard_threshold rows (1: in-process)
+        self.shards = max(1, shards)
+        self.shard_threshold = shard_threshold
+        # Extra files written next to data.jsonl unless a run asks for others
+        self.output_formats = parse_formats(output_formats)
+        # Threads compressing data.jsonl.gz / data.jsonl.zst (default: CPU count)
+        self.compress_threads = compress_threads
+        # fsync staged output files in one batch before the atomic commit
+        self.fsync_outputs = fsync_outputs
+        # Console side of _log: "queue" (background batched writer) or "sync"; run.log keeps every line
+        self.log_sink = create_sink(log_sink, log_level, "[Purple V2] ")
+        # Process-wide Prometheus metrics fed by every run (server mode only)
+        self.metrics = metrics
+        # Write a span trace of each run to trace.json in its output directory
+        self.trace = trace
+        # Profile every run ("cpu", "mem" or "both") unless a run asks otherwise
+        self.profile = parse_profile(profile)
+        self.profile_top = profile_top
+
+    def close(self) -> None:
+        """Stop the console log sink (its writer thread and exit hook); runs already logged stay in run.log."""
+        self.log_sink.close()
+
+    def __enter__(self) -> "PurpleAgent":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _log(self, ctx: RunContext, message: str, page: Optional[int] = None, args: Tuple[Any, ...] = ()) -> None:
+        """Add message (% args, formatted lazily) to run log with basic traceability."""
+        # Add task_id and page for basic observability (explicit page wins for concurrent fetches)
+        page = ctx.current_page if page is None else page
+        line = LogLine(message_level(message), "[task_id={}] [page={}] {}", (ctx.task_id, page), message, args)
+        ctx.log_lines.append(line)
+        self.log_sink.emit(line)
 
+    @tracing.traced()
     def _wait_for_http(self, url: str, timeout_s: int = 20, interval_s: float = 0.5) -> bool:
         """Wait for HTTP endpoint to be ready."""
         start = time.time()
         while time.time() - start < timeout_s:
             try:
-                resp = self.session.get(url, timeout=2)
+                resp = self.pools.session(url).get(url, timeout=2)
                 if resp.status_code < 500:
                     return True
             except requests.RequestException:
@@ -53,7 +130,14 @@ class PurpleAgent:
             time.sleep(interval_s)
         return False
 
-    def _get_task_definition(self, task_id: str) -> Optional[Dict[str, Any]]:
+    def _throttle(self, ctx: RunContext) -> None:
+        """Pace the next request at the task's declared rate_limit_qps."""
+        if ctx.rate_limiter is not None:
+            with tracing.span("rate_limit_wait"):
+                ctx.rate_limiter.acquire()
+
+    @tracing.traced()
+    def _get_task_definition(self, ctx: RunContext, task_id: str) -> Optional[Dict[str, Any]]:
         """Load task definition from tasks.py."""
         try:
             from tasks import get_tasks
@@ -66,85 +150,151 @@ class PurpleAgent:
                         "fault_injection": task.fault_injection,
                     }
         except Exception as e:
-            self._log(f"ERROR: Failed to load task definition: {e}")
+            self._log(ctx, f"ERROR: Failed to load task definition: {e}")
         return None
 
-    def _configure_mock(self, mock_url: str, task_def: Dict[str, Any]) -> bool:
+    @tracing.traced()
+    def _configure_mock(self, ctx: RunContext, mock_url: str, task_def: Dict[str, Any]) -> bool:
         """Configure mock service with task definition."""
-        self._log(f"INFO: Configuring mock service for task {task_def['task_id']}")
+        self._log(ctx, f"INFO: Configuring mock service for task {task_def['task_id']}")
         try:
-            resp = self.session.post(
-                f"{mock_url}/configure",
-                json=task_def,
-                timeout=10,
-            )
+            self._throttle(ctx)
+            with ctx.telemetry.request("POST", f"{mock_url}/configure") as event:
+                resp = self.pools.session(mock_url).post(
+                    f"{mock_url}/configure",
+                    json=task_def,
+                    timeout=10,
+                )
+                event.status, event.bytes = resp.status_code, len(resp.content)
             resp.raise_for_status()
-            self._log(f"INFO: Mock configured: {resp.json()}")
+            self._log(ctx, f"INFO: Mock configured: {json_codec.loads(resp.content)}")
             return True
         except Exception as e:
-            self._log(f"ERROR: Configure failed: {e}")
+            self._log(ctx, f"ERROR: Configure failed: {e}")
             return False
 
+    def _request_once(
+        self,
+        ctx: RunContext,
+        url: str,
+        params: Dict[str, Any],
+        page: Optional[int] = None,
+        attempt: int = 0,
+        backoff: Optional[float] = None,
+    ) -> FetchOutcome:
+        """Make a single GET attempt and classify the response."""
+        with ctx.lock:
+            ctx.request_count += 1
+            request = ctx.request_count
+        try:
+            self._throttle(ctx)
+            page = ctx.current_page if page is None else page
+            with ctx.telemetry.request("GET", url, params, request, page, attempt, backoff) as event:
+                resp = self.pools.session(url).get(url, params=params, timeout=10)
+                event.status, event.bytes = resp.status_code, len(resp.content)
+            
+            if resp.status_code == 200:
+                return FetchOutcome(status=200, payload=json_codec.loads(resp.content))
+            
+            if resp.status_code in {429, 500}:
+                return FetchOutcome(status=resp.status_code, retry_after=resp.headers.get("Retry-After"))
+            
+            resp.raise_for_status()
+            raise requests.HTTPError(f"Unexpected HTTP {resp.status_code}", response=resp)
+        except (requests.RequestException, ValueError) as e:
+            # ValueError: a 200 whose body isn't JSON, retried like a transport error
+            return FetchOutcome(error=e)
+
+    def _plan_retry(
+        self,
+        ctx: RunContext,
+        outcome: FetchOutcome,
+        attempt: int,
+        max_retries: int,
+        previous: Optional[float],
+        page: Optional[int] = None,
+    ) -> Optional[float]:
+        """Log a failed attempt; return the backoff before retrying, or None to give up."""
+        if outcome.status is None:
+            self._log(ctx, f"ERROR: Request failed: {outcome.error}", page)
+        
+        if attempt >= max_retries:
+            if outcome.status is not None:
+                self._log(ctx, f"ERROR: HTTP {outcome.status} after max {max_retries} retries limit reached", page)
+            return None
+        
+        backoff = self.retry_policy.delay(attempt, outcome.status, outcome.retry_after, previous)
+        if not ctx.retry_budget.take(backoff):
+            self._log(ctx, f"ERROR: Retry budget of {self.retry_policy.budget_seconds}s exhausted, giving up", page)
+            return None
+        with ctx.lock:
+            ctx.retry_count += 1
+        
+        if outcome.status is not None:
+            self._log(ctx, f"WARN: HTTP {outcome.status} received, exponential backoff retry after {backoff:.3g}s (attempt {attempt + 1}/{max_retries})", page)
+        else:
+            self._log(ctx, f"WARN: Retrying after {backoff:.3g}s", page)
+        return backoff
+
+    @tracing.traced("fetch_page")
     def _fetch_with_retry(
         self,
+        ctx: RunContext,
         url: str,
         params: Dict[str, Any],
-        max_retries: int = 3,
+        max_retries: Optional[int] = None,
+        page: Optional[int] = None,
     ) -> Optional[Dict[str, Any]]:
-        """Fetch with exponential backoff on 429/500."""
+        """Fetch with policy-driven backoff on 429/500 (blocks while backing off)."""
+        if max_retries is None:
+            max_retries = self.retry_policy.max_retries
+        backoff: Optional[float] = None
         for attempt in range(max_retries + 1):
-            self.request_count += 1
-            try:
-                resp = self.session.get(url, params=params, timeout=10)
-                
-                if resp.status_code == 200:
-                    return resp.json()
-                
-                if resp.status_code in {429, 500}:
-                    if attempt < max_retries:
-                        self.retry_count += 1
-                        backoff = 2 ** attempt
-                        self._log(f"WARN: HTTP {resp.status_code} received, exponential backoff retry after {backoff}s (attempt {attempt + 1}/{max_retries})")
-                        time.sleep(backoff)
-                        continue
-                    else:
-                        self._log(f"ERROR: HTTP {resp.status_code} after max {max_retries} retries limit reached")
-                        return None
-                
-                resp.raise_for_status()
-            except requests.RequestException as e:
-                self._log(f"ERROR: Request failed: {e}")
-                if attempt < max_retries:
-                    self.retry_count += 1
-                    backoff = 2 ** attempt
-                    self._log(f"WARN: Retrying after {backoff}s")
-                    time.sleep(backoff)
-                else:
-                    return None
+            outcome = self._request_once(ctx, url, params, page, attempt, backoff)
+            if outcome.ok:
+                return outcome.payload
+            
+            backoff = self._plan_retry(ctx, outcome, attempt, max_retries, backoff, page)
+            if backoff is None:
+                return None
+            with tracing.span("backoff", seconds=backoff):
+                time.sleep(backoff)
         return None
 
+    @tracing.traced()
     def _fetch_all_pages(
         self,
+        ctx: RunContext,
         mock_url: str,
         paging_mode: str,
         page_size: int,
         max_requests: int,
         total_rows: int,
-    ) -> List[Dict[str, Any]]:
+    ) -> RowPipeline:
         """Fetch all records using pagination - FIXED VERSION."""
-        self._log(f"INFO: Fetching records (paging_mode={paging_mode}, page_size={page_size})")
+        self._log(ctx, f"INFO: Fetching records (paging_mode={paging_mode}, page_size={page_size})")
         
-        all_rows: List[Dict[str, Any]] = []
+        # Pages stream into the run's pipeline; len(all_rows) counts fetched rows
+        all_rows = ctx.pipeline
+        next_page = 1
+        
+        # Fetch the planned windows through the page scheduler (one worker at
+        # the default concurrency, so a page backing off doesn't stall the
+        # rest), then let the sequential loop pick up any tail beyond the plan
+        if paging_mode in ("page", "offset"):
+            all_rows, next_page = self._fetch_planned_pages(
+                ctx, mock_url, paging_mode, page_size, max_requests, total_rows
+            )
         
         if paging_mode == "page":
-            page = 1
+            page = next_page
             # FIXED: Continue until data is empty OR we have enough rows
             while len(all_rows) < total_rows and page <= max_requests:
-                self.current_page = page
+                ctx.current_page = page
                 params = {"page": page, "page_size": page_size}
-                self._log(f"INFO: Fetching page {page}")
+                self._log(ctx, "INFO: Fetching page %s", args=(page,))
                 
-                result = self._fetch_with_retry(f"{mock_url}/records", params)
+                result = self._fetch_with_retry(ctx, f"{mock_url}/records", params)
                 if not result:
                     break
                 
@@ -153,19 +303,19 @@ class PurpleAgent:
                 
                 # FIXED: Only stop if NO data returned
                 if len(data) == 0:
-                    self._log(f"INFO: No more data returned")
+                    self._log(ctx, f"INFO: No more data returned")
                     break
                 
                 page += 1
         
         elif paging_mode == "offset":
-            offset = 0
+            offset = (next_page - 1) * page_size
             while len(all_rows) < total_rows and offset // page_size < max_requests:
-                self.current_page = offset // page_size + 1
+                ctx.current_page = offset // page_size + 1
                 params = {"offset": offset, "maxRecords": page_size}
-                self._log(f"INFO: Fetching offset {offset}")
+                self._log(ctx, "INFO: Fetching offset %s", args=(offset,))
                 
-                result = self._fetch_with_retry(f"{mock_url}/records", params)
+                result = self._fetch_with_retry(ctx, f"{mock_url}/records", params)
                 if not result:
                     break
                 
@@ -174,17 +324,109 @@ class PurpleAgent:
                 
                 # FIXED: Only stop if NO data returned
                 if len(data) == 0:
-                    self._log(f"INFO: No more data returned")
+                    self._log(ctx, f"INFO: No more data returned")
                     break
                 
                 offset += len(data)
         
         else:
-            self._log(f"ERROR: Unknown paging_mode: {paging_mode}")
+            self._log(ctx, f"ERROR: Unknown paging_mode: {paging_mode}")
         
-        self._log(f"INFO: Fetched {len(all_rows)} total rows")
+        self._log(ctx, f"INFO: Fetched {len(all_rows)} total rows")
         return all_rows
 
+    def _fetch_planned_pages(
+        self,
+        ctx: RunContext,
+        mock_url: str,
+        paging_mode: str,
+        page_size: int,
+        max_requests: int,
+        total_rows: int,
+    ) -> Tuple[RowPipeline, int]:
+        """Fetch planned page windows through a bounded worker pool.
+        
+        Pages that need a retry wait in a delayed queue while the workers
+        keep fetching other pages. Finished pages are fed into the run's
+        pipeline in page order as they arrive. Returns the pipeline and the
+        page the sequential loop should continue from (past max_requests
+        once pagination is done).
+        """
+        plan = plan_pages(paging_mode, page_size, max_requests, total_rows)
+        workers = min(self.concurrency, len(plan))
+        self._log(ctx, f"INFO: Fetching {len(plan)} planned pages with {workers} workers")
+        
+        url = f"{mock_url}/records"
+        max_retries = self.retry_policy.max_retries
+        # Attempts run on the scheduler's threads; profiled() keeps them in a CPU profile
+        attempt = lambda job: self._attempt_page(ctx, url, job)
+        scheduler = PageScheduler(
+            workers,
+            attempt=ctx.profiler.profiled(attempt) if ctx.profiler else attempt,
+            plan_retry=lambda job, outcome: self._plan_retry(
+                ctx, outcome, job.attempt, max_retries, job.previous_backoff, job.page
+            ),
+        )
+        all_rows = ctx.pipeline
+        # Planned pages not merged yet, in page order
+        pending = deque(plan)
+        next_page = plan[-1][0] + 1 if plan else max_requests + 1
+        
+        def merge_ready(results: Dict[int, Optional[Dict[str, Any]]]) -> None:
+            nonlocal next_page
+            ready = []
+            while pending and pending[0][0] in results:
+                ready.append(pending.popleft())
+            if not ready:
+                return
+            merged = self._merge_planned_pages(ctx, ready, results, paging_mode, page_size, max_requests, all_rows)
+            if merged != ready[-1][0] + 1:
+                # Failed page or end of data: fetch and retry nothing more
+                next_page = merged
+                pending.clear()
+                scheduler.cancel()
+        
+        scheduler.run([PageJob(page, params) for page, params in plan], on_result=merge_ready)
+        return all_rows, next_page
+
+    def _merge_planned_pages(
+        self,
+        ctx: RunContext,
+        plan: List[Tuple[int, Dict[str, Any]]],
+        results: Dict[int, Optional[Dict[str, Any]]],
+        paging_mode: str,
+        page_size: int,
+        max_requests: int,
+        all_rows: RowPipeline,
+    ) -> int:
+        """Feed fetched page results into all_rows in page order.
+        
+        Returns the next page to fetch, or max_requests + 1 once pagination
+        is done (failed page or end of data).
+        """
+        for page, params in plan:
+            # Release each payload once its rows are in the pipeline
+            result = results.pop(page, None)
+            ctx.current_page = page
+            if not result:
+                return max_requests + 1
+            
+            data = result.get("data", [])
+            all_rows.extend(data)
+            
+            if len(data) == 0:
+                self._log(ctx, f"INFO: No more data returned")
+                return max_requests + 1
+        
+        return plan[-1][0] + 1 if plan else max_requests + 1
+
+    def _attempt_page(self, ctx: RunContext, url: str, job: PageJob) -> FetchOutcome:
+        """One attempt at a planned page window (runs on a worker thread)."""
+        if job.attempt == 0:
+            label = f"page {job.page}" if "page" in job.params else f"offset {job.params['offset']}"
+            self._log(ctx, "INFO: Fetching %s", job.page, args=(label,))
+        return self._request_once(ctx, url, job.params, job.page, job.attempt, job.previous_backoff)
+
     def _is_totals_row(self, row: Dict[str, Any]) -> bool:
         """Check if row is a totals row per repo marker rule."""
         return (
@@ -193,141 +435,266 @@ class PurpleAgent:
             and row.get("hs") == "TOTAL"
         )
 
+    @tracing.traced()
     def _process_rows(
         self,
-        rows: List[Dict[str, Any]],
+        ctx: RunContext,
+        rows: RowPipeline,
         task_id: str,
-        dedup_key: List[str],
-    ) -> tuple[List[Dict[str, Any]], int]:
-        """Process rows: filter totals, deduplicate, sort."""
-        # Filter totals rows for T7
-        totals_dropped = 0
+    ) -> Tuple[Iterator[PackedRow], int]:
+        """Report the totals filtering and dedup done while fetching; return rows sorted by dedup_key."""
+        # Totals rows for T7 were dropped as pages arrived
         if task_id == "T7_totals_trap":
-            filtered = []
-            for row in rows:
-                if self._is_totals_row(row):
-                    totals_dropped += 1
-                else:
-                    filtered.append(row)
-            rows = filtered
-            self._log(f"INFO: Dropped {totals_dropped} totals rows")
+            self._log(ctx, f"INFO: Dropped {rows.totals_dropped} totals rows")
         
-        # Deduplicate by dedup_key
-        seen = set()
-        unique_rows = []
-        for row in rows:
-            key = tuple(row.get(k) for k in dedup_key)
-            if key not in seen:
-                seen.add(key)
-                unique_rows.append(row)
+        # Sorted runs spilled to disk are merged lazily while data.jsonl is written
+        if rows.rows_spilled:
+            self._log(ctx, f"INFO: Merging {rows.rows_spilled} spilled rows in {rows.spilled_runs} sorted runs")
         
-        if len(unique_rows) < len(rows):
-            self._log(f"INFO: Deduplication: {len(rows)} → {len(unique_rows)} rows")
+        # External sort: duplicates are only known once the merge has run
+        if rows.dedup_on_merge:
+            return self._dedup_while_merging(ctx, rows), rows.totals_dropped
         
-        # Stable sort by dedup_key for deterministic output
-        sorted_rows = sorted(unique_rows, key=lambda r: tuple(r.get(k) for k in dedup_key))
+        if rows.duplicates_dropped:
+            self._log(ctx, f"INFO: Deduplication: {rows.rows_kept + rows.duplicates_dropped} → {rows.rows_kept} rows")
         
-        return sorted_rows, totals_dropped
+        return rows.sorted_rows(), rows.totals_dropped
 
+    def _dedup_while_merging(self, ctx: RunContext, rows: RowPipeline) -> Iterator[PackedRow]:
+        """Yield merged rows, then log the duplicates the merge dropped."""
+        yield from rows.sorted_rows()
+        if rows.duplicates_dropped:
+            self._log(ctx, f"INFO: Deduplication: {rows.rows_kept + rows.duplicates_dropped} → {rows.rows_kept} rows")
+
+    @tracing.traced()
     def _write_outputs(
         self,
+        ctx: RunContext,
+        output_dir: Path,
+        task_id: str,
+        query: Dict[str, Any],
+        rows: Iterable[PackedRow],
+        dedup_key: List[str],
+        totals_dropped: int,
+    ) -> None:
+        """Write contract-compliant output files, committed to output_dir with one atomic rename."""
+        # Unique staging dir per run, so concurrent runs of one task_id never mix files
+        with StagedOutput(output_dir, fsync=self.fsync_outputs) as staged:
+            self._write_files(ctx, staged.path, task_id, query, rows, dedup_key, totals_dropped)
+            if ctx.profiler is not None:
+                ctx.profiler.write(staged.path)
+            mode = staged.commit()
+        if mode == "files":
+            self._log(ctx, f"WARN: {output_dir} holds other files or can't be swapped out; outputs replaced file by file")
+        self._log(ctx, f"INFO: Committed outputs to {output_dir} ({mode})")
+
+    def _write_files(
+        self,
+        ctx: RunContext,
         output_dir: Path,
         task_id: str,
         query: Dict[str, Any],
-        rows: List[Dict[str, Any]],
+        rows: Iterable[PackedRow],
         dedup_key: List[str],
         totals_dropped: int,
     ) -> None:
-        """Write contract-compliant output files."""
-        output_dir.mkdir(parents=True, exist_ok=True)
+        """Write data.jsonl, metadata.json, run.log and any extra formats into output_dir."""
         
-        # data.jsonl
+        # data.jsonl, encoded in batches and hashed as it is written; schema comes from the first row
         data_path = output_dir / "data.jsonl"
-        data_path.write_text("\n".join(json.dumps(row) for row in rows) + "\n", encoding="utf-8")
-        self._log(f"INFO: Wrote {len(rows)} rows to data.jsonl")
+        row_count = 0
+        schema: List[str] = []
+        # Extra formats requested for this run are fed the same bytes as data.jsonl
+        extra = FormatWriters(output_dir, ctx.output_formats, self.compress_threads) if ctx.output_formats else None
+        try:
+            with HashingWriter(data_path, encode=dumps_rows, sinks=[extra] if extra else ()) as writer:
+                for row in rows:
+                    if not row_count:
+                        schema = list(row[0].fields)
+                    writer.write(row)
+                    row_count += 1
+                if not row_count:
+                    writer.write_text("\n")
+        finally:
+            if extra is not None:
+                extra.close()
+        self._log(ctx, f"INFO: Wrote {row_count} rows to data.jsonl")
         
-        # Extract schema from first row
-        schema = list(rows[0].keys()) if rows else []
+        # metrics.jsonl: one event per HTTP attempt, streamed while the run went on
+        ctx.telemetry.mark(None)
+        events = ctx.telemetry.write_events(output_dir / "metrics.jsonl")
+        self._log(ctx, f"INFO: Wrote {events} request events to metrics.jsonl")
         
         # metadata.json
         metadata = {
             "task_id": task_id,
             "query": query,
-            "row_count": len(rows),
+            "row_count": row_count,
             "schema": schema,
             "dedup_key": dedup_key,
             "sorted_by": dedup_key,
             "pagination_stats": {
                 "paging_mode": "varies",
                 "page_size": "varies",
-                "pages_fetched": self.current_page,
+                "pages_fetched": ctx.current_page,
                 "stop_reason": "complete",
             },
-            "request_count": self.request_count,
-            "execution_time_seconds": round(time.time() - self.start_time, 2),
+            "request_count": ctx.request_count,
+            "execution_time_seconds": round(time.time() - ctx.start_time, 2),
             "request_stats": {
-                "requests_total": self.request_count,
-                "retries_total": self.retry_count,
+                "requests_total": ctx.request_count,
+                "retries_total": ctx.retry_count,
                 "http_429": 0,
                 "http_500": 0,
             },
+            "performance": ctx.telemetry.summary(ctx.pipeline.rows_fetched if ctx.pipeline else 0, row_count),
+            "rate_limit": ctx.rate_limiter.stats() if ctx.rate_limiter else {"qps": None},
             "retry_policy": {
-                "max_retries": 3,
-                "backoff": "exponential",
-                "base_seconds": 1,
+                **self.retry_policy.describe(),
+                "retries": ctx.retry_budget.retries,
+                "retry_sleep_seconds": round(ctx.retry_budget.spent_seconds, 3),
+                "budget_exhausted": ctx.retry_budget.exhausted,
             },
+            "connection_pool": self._connection_stats(ctx),
+            "pipeline": ctx.pipeline.stats() if ctx.pipeline else None,
+            "json_codec": json_codec.active(),
             "totals_handling": {
                 "enabled": task_id == "T7_totals_trap",
                 "rows_dropped": totals_dropped,
                 "rule": "drop rows where isTotal=true AND partner=WLD AND hs=TOTAL",
             },
-            "output_hashes": {"data_sha256": "optional", "metadata_sha256": "optional"},
+            "output_hashes": {"data_sha256": writer.hexdigest(), "metadata_sha256": None},
             "created_at": "2026-01-30T00:00:00Z",
             "tool_versions": {"purple": "v2-medium-performance", "python": "3.x"},
             "notes": "Purple Agent V2 - Medium Performance",
         }
+        if extra is not None:
+            metadata["output_formats"] = extra.describe()
+            for entry in metadata["output_formats"]:
+                if entry["file"]:
+                    self._log(ctx, f"INFO: Wrote {entry['file']}")
+                else:
+                    self._log(ctx, f"WARN: {entry['format']} output not written: {entry['error']}")
+        
+        if ctx.profiler is not None:
+            metadata["profile"] = ctx.profiler.checkpoint()
+            self._log(ctx, f"INFO: Profiling ({ctx.profiler.mode}), writing {', '.join(metadata['profile']['files'])} with the outputs")
         
         metadata_path = output_dir / "metadata.json"
-        metadata_path.write_text(json.dumps(metadata, ensure_ascii=True, indent=2) + "\n", encoding="utf-8")
-        self._log(f"INFO: Wrote metadata.json")
+        metadata_path.write_text(self._metadata_text(metadata), encoding="utf-8")
+        self._log(ctx, f"INFO: Wrote metadata.json")
         
         # run.log
         log_path = output_dir / "run.log"
-        log_path.write_text("\n".join(self.log_lines) + "\n", encoding="utf-8")
-        self._log(f"INFO: Wrote run.log")
+        log_path.write_text("\n".join(map(str, ctx.log_lines)) + "\n", encoding="utf-8")
+        self._log(ctx, f"INFO: Wrote run.log")
+
+    def _metadata_text(self, metadata: Dict[str, Any]) -> str:
+        """metadata.json text; metadata_sha256 hashes the same text rendered with that field null."""
+        hashes = metadata["output_hashes"]
+        hashes["metadata_sha256"] = None
+        text = json.dumps(metadata, ensure_ascii=True, indent=2) + "\n"
+        hashes["metadata_sha256"] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return json.dumps(metadata, ensure_ascii=True, indent=2) + "\n"
+
+    def _connection_stats(self, ctx: RunContext) -> Dict[str, Any]:
+        """Connection reuse for this run's mock_url (cumulative across runs)."""
+        return self.pools.stats(ctx.mock_url)
+
+    def _new_pipeline(self, task_id: str, dedup_key: List[str]) -> RowPipeline:
+        """Streaming totals filter, dedup and spill for one run's rows."""
+        if self.engine == "columnar":
+            from columnar import ColumnarPipeline
+            is_totals = self._is_totals_row if task_id == "T7_totals_trap" else None
+            return ColumnarPipeline(dedup_key, is_totals=is_totals)
+        budget = self.memory_budget_mb
+        return RowPipeline(
+            dedup_key,
+            is_totals=self._is_totals_row if task_id == "T7_totals_trap" else None,
+            memory_budget_bytes=None if budget is None else int(budget * 1024 * 1024),
+            spill_dir=self.spill_dir,
+            dedup_on_merge=self.external_sort,
+            digest_bits=self.dedup_digest_bits,
+            shards=self.shards,
+            shard_threshold=self.shard_threshold,
+        )
+
+    def _new_context(
+        self,
+        task_id: str,
+        mock_url: str,
+        output_formats: Optional[Iterable[str]] = None,
+        profiler: Optional[RunProfiler] = None,
+    ) -> RunContext:
+        """Fresh per-run state for a new task; output_formats overrides the agent's."""
+        return RunContext(
+            task_id=task_id,
+            mock_url=mock_url,
+            retry_budget=self.retry_policy.new_budget(),
+            output_formats=self.output_formats if output_formats is None else parse_formats(output_formats),
+            telemetry=RunTelemetry(self.spill_dir, self.metrics),
+            profiler=profiler,
+        )
+
+    def _run_span(self, task_id: str, output_dir: str) -> Any:
+        """Span around a run: a child of the caller's span (A2A request), else a new trace if enabled."""
+        span = tracing.start("run", enabled=self.trace, task_id=task_id)
+        if span is not tracing.NO_SPAN and span.trace.path is None:
+            span.trace.path = Path(output_dir) / tracing.TRACE_FILENAME
+        return span
 
     def run(
         self,
         task_id: str,
         output_dir: str,
         mock_url: str = "http://localhost:8000",
+        output_formats: Optional[Iterable[str]] = None,
+        profile: Optional[str] = None,
     ) -> bool:
-        """Run Purple agent for a single task."""
-        # Reset efficiency counters
-        self.request_count = 0
-        self.retry_count = 0
-        self.start_time = time.time()
-        self.current_task_id = task_id
-        self.current_page = 0
-        self.log_lines = []
+        """Run Purple agent for a single task; profile ("cpu", "mem", "both") overrides the agent's."""
+        profile = self.profile if profile is None else parse_profile(profile)
+        with self._run_span(task_id, output_dir):
+            if not profile:
+                return self._run(task_id, output_dir, mock_url, output_formats)
+            profiler = RunProfiler(profile, self.profile_top)
+            with profiler:
+                return self._run(task_id, output_dir, mock_url, output_formats, profiler)
+
+    def _run(
+        self,
+        task_id: str,
+        output_dir: str,
+        mock_url: str,
+        output_formats: Optional[Iterable[str]],
+        profiler: Optional[RunProfiler] = None,
+    ) -> bool:
+        ctx = self._new_context(task_id, mock_url, output_formats, profiler)
+        ctx.telemetry.mark("wait")
         
-        self._log(f"INFO: Starting Purple Agent V2 (Medium Performance) for task {task_id}")
+        self._log(ctx, f"INFO: Starting Purple Agent V2 (Medium Performance) for task {task_id}")
         
         # Wait for services to be ready
-        self._log("INFO: Waiting for mock service...")
+        self._log(ctx, "INFO: Waiting for mock service...")
         if not self._wait_for_http(f"{mock_url}/docs", timeout_s=20):
-            self._log("ERROR: Mock service not ready after 20s")
+            self._log(ctx, "ERROR: Mock service not ready after 20s")
             return False
-        self._log("INFO: Mock service ready")
+        self._log(ctx, "INFO: Mock service ready")
         
         # Load task definition
-        task_def = self._get_task_definition(task_id)
+        ctx.telemetry.mark("configure")
+        task_def = self._get_task_definition(ctx, task_id)
         if not task_def:
-            self._log(f"ERROR: Task {task_id} not found")
+            self._log(ctx, f"ERROR: Task {task_id} not found")
             return False
         
+        # Pace every request of this run (including /configure) at the declared QPS
+        qps = task_def.get("constraints", {}).get("rate_limit_qps")
+        if qps:
+            ctx.rate_limiter = TokenBucket(qps)
+            self._log(ctx, f"INFO: Pacing requests at {qps} qps (token bucket)")
+        
         # Configure mock service
-        if not self._configure_mock(mock_url, task_def):
+        if not self._configure_mock(ctx, mock_url, task_def):
             return False
         
         # Extract parameters
@@ -338,25 +705,36 @@ class PurpleAgent:
         total_rows = constraints.get("total_rows", 1000)
         dedup_key = ["year", "reporter", "partner", "flow", "hs", "record_id"]
         
-        # Fetch all records
-        rows = self._fetch_all_pages(mock_url, paging_mode, page_size, max_requests, total_rows)
-        if not rows:
-            self._log(f"ERROR: No rows fetched")
-            return False
-        
-        # Process rows
-        processed_rows, totals_dropped = self._process_rows(rows, task_id, dedup_key)
-        
-        # Write outputs
-        output_path = Path(output_dir)
-        self._write_outputs(
-            output_path,
-            task_id,
-            task_def["query"],
-            processed_rows,
-            dedup_key,
-            totals_dropped,
-        )
+        # Fetch all records, streaming each page through totals filtering and dedup
+        ctx.telemetry.mark("fetch")
+        ctx.pipeline = self._new_pipeline(task_id, dedup_key)
+        try:
+            rows = self._fetch_all_pages(ctx, mock_url, paging_mode, page_size, max_requests, total_rows)
+            if not rows:
+                self._log(ctx, f"ERROR: No rows fetched")
+                return False
+            
+            # Process rows
+            ctx.telemetry.mark("process")
+            processed_rows, totals_dropped = self._process_rows(ctx, rows, task_id)
+            # Sorting and merging run as data.jsonl consumes the rows; count them as processing
+            processed_rows = ctx.telemetry.timed("process", processed_rows)
+            
+            # Write outputs
+            ctx.telemetry.mark("write")
+            output_path = Path(output_dir)
+            self._write_outputs(
+                ctx,
+                output_path,
+                task_id,
+                task_def["query"],
+                processed_rows,
+                dedup_key,
+                totals_dropped,
+            )
+        finally:
+            ctx.pipeline.close()
+            ctx.telemetry.close()
         
-        self._log(f"INFO: Task {task_id} complete (output: {output_path})")
+        self._log(ctx, f"INFO: Task {task_id} complete (output: {output_path})")
         return True
@@ -0,0 +1,125 @@
+"""
+Retry policies for mock service requests.
+
+A RetryPolicy decides how long to wait before retrying a throttled (429),
+failed (5xx) or dropped request. It honors the server's Retry-After header,
+supports jittered backoff, and caps total retry sleep per run through a
+RetryBudget so fault-injected tasks don't oversleep.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+JITTER_MODES = ("none", "full", "decorrelated")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RetryBudget:
+    """Tracks retry sleep spent by one run against the policy's budget."""
+
+    def __init__(self, budget_seconds: Optional[float]):
+        self.budget_seconds = budget_seconds
+        self.spent_seconds = 0.0
+        self.retries = 0
+        self.exhausted = False
+        self._lock = threading.Lock()
+
+    def take(self, delay: float) -> bool:
+        """Reserve `delay` seconds of retry sleep; False once the budget is spent."""
+        with self._lock:
+            if self.budget_seconds is not None and self.spent_seconds + delay > self.budget_seconds:
+                self.exhausted = True
+                return False
+            self.spent_seconds += delay
+            self.retries += 1
+            return True
+
+
+class RetryPolicy:
+    """Backoff policy for retrying 429/5xx responses and transport errors.
+
+    - 429 responses wait exactly Retry-After when the server sends it,
+      however long; only the run's RetryBudget bounds it
+    - otherwise the wait is exponential from base_seconds, capped at
+      cap_seconds, with optional "full" or "decorrelated" jitter
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_seconds: float = 1.0,
+        cap_seconds: float = 8.0,
+        jitter: str = "none",
+        budget_seconds: Optional[float] = None,
+        honor_retry_after: bool = True,
+        seed: Optional[int] = None,
+    ):
+        if jitter not in JITTER_MODES:
+            raise ValueError(f"jitter must be one of {JITTER_MODES}, got {jitter!r}")
+        self.max_retries = max_retries
+        self.base_seconds = base_seconds
+        self.cap_seconds = cap_seconds
+        self.jitter = jitter
+        self.budget_seconds = budget_seconds
+        self.honor_retry_after = honor_retry_after
+        self._random = random.Random(seed)
+
+    def new_budget(self) -> RetryBudget:
+        """Fresh retry budget for one run."""
+        return RetryBudget(self.budget_seconds)
+
+    def backoff(self, attempt: int, previous: Optional[float] = None) -> float:
+        """Backoff before retry number `attempt` (0-based) without server hints."""
+        exponential = min(self.cap_seconds, self.base_seconds * (2 ** attempt))
+        if self.jitter == "full":
+            return self._random.uniform(0.0, exponential)
+        if self.jitter == "decorrelated":
+            previous = self.base_seconds if previous is None else previous
+            return min(self.cap_seconds, self._random.uniform(self.base_seconds, previous * 3))
+        return exponential
+
+    def delay(
+        self,
+        attempt: int,
+        status: Optional[int] = None,
+        retry_after: Optional[str] = None,
+        previous: Optional[float] = None,
+    ) -> float:
+        """Wait before retry number `attempt` after `status` (None for transport errors)."""
+        if self.honor_retry_after and status == 429:
+            hinted = parse_retry_after(retry_after)
+            if hinted is not None:
+                return hinted
+        return self.backoff(attempt, previous)
+
+    def describe(self) -> Dict[str, Any]:
+        """Policy settings for metadata.json."""
+        return {
+            "max_retries": self.max_retries,
+            "backoff": "exponential" if self.jitter == "none" else f"exponential_{self.jitter}_jitter",
+            "base_seconds": self.base_seconds,
+            "cap_seconds": self.cap_seconds,
+            "jitter": self.jitter,
+            "honor_retry_after": self.honor_retry_after,
+            "budget_seconds": self.budget_seconds,
+        }
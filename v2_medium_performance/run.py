@@ -13,21 +13,77 @@ Usage:
 from __future__ import annotations
 
 import argparse
-import json
 import os
 import sys
 from pathlib import Path
+from typing import Any, Dict, Optional
+
+import json_codec
+from log_sink import LEVELS, SINKS
+from output_formats import FORMATS, parse_formats
+from profiling import DEFAULT_TOP, PROFILES, parse_profile
 
 # Server mode imports
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 import uvicorn
 
 # Server mode imports (lazy)
-def run_server(host: str, port: int, card_url: str) -> None:
+def run_server(
+    host: str,
+    port: int,
+    card_url: str,
+    agent_options: Optional[Dict[str, Any]] = None,
+    use_async: bool = False,
+    workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    max_queue: int = 16,
+    queue_timeout: float = 30.0,
+) -> None:
     """Start FastAPI server for AgentBeats runner."""
+    import logging
+    from admission import AdmissionController, ServerBusy, busy_error, retry_after_header
+    from server_metrics import CONTENT_TYPE, ServerMetrics
+    import tracing
+    from worker_pool import WorkerPool
+
+    # Configure logging to stdout once per process
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO, force=True)
+    logger = logging.getLogger("purple_rpc")
+
+    # Every response body is rendered by the configured JSON codec (same bytes as the stdlib)
+    CodecJSONResponse = json_codec.response_class()
+    app = FastAPI(title="Purple Comtrade Baseline v2", default_response_class=CodecJSONResponse)
+
+    # One bounded pool for all agent runs, sized at startup
+    pool = WorkerPool(workers)
+    # Cap concurrent task runs (default: one per pool worker) with a bounded wait queue
+    admission = AdmissionController(max_in_flight or pool.max_workers, max_queue, queue_timeout)
+    # Prometheus counters and histograms, fed by every agent run
+    metrics = ServerMetrics()
+
+    @app.on_event("shutdown")
+    async def shutdown_pool():
+        pool.shutdown(wait=False)
+
+    # One long-lived agent serves every task; per-run state lives in a RunContext
+    if use_async:
+        from async_purple_agent import AsyncPurpleAgent, create_client
+        shared_client = create_client()
+        agent = AsyncPurpleAgent(client=shared_client, metrics=metrics, **(agent_options or {}))
+
+        @app.on_event("shutdown")
+        async def close_client():
+            await agent.aclose()
+            await shared_client.aclose()
+    else:
+        from purple_agent import PurpleAgent
+        agent = PurpleAgent(metrics=metrics, **(agent_options or {}))
 
-    app = FastAPI(title="Purple Comtrade Baseline v2")
+        @app.on_event("shutdown")
+        async def close_pools():
+            agent.close()
+            agent.pools.close()
 
     AGENT_CARD = {
         "name": "purple-comtrade-baseline-v2",
@@ -37,6 +93,7 @@ def run_server(host: str, port: int, card_url: str) -> None:
         "endpoints": {
             "rpc": "/a2a/rpc",
             "health": "/healthz",
+            "metrics": "/metrics",
         },
         "capabilities": {
             "streaming": False,
@@ -60,25 +117,35 @@ def run_server(host: str, port: int, card_url: str) -> None:
 
     @app.get("/health")
     async def health():
-        return {"status": "ok"}
+        return {
+            "status": "ok",
+            "worker_pool": pool.stats(),
+            "admission": admission.stats(),
+            "connection_pools": agent.pools.stats(),
+            "json_codec": json_codec.active(),
+        }
 
     @app.get("/healthz")
     async def healthz():
         return {"status": "ok"}
 
+    @app.get("/metrics")
+    async def prometheus_metrics():
+        return Response(content=metrics.render(pool, admission), media_type=CONTENT_TYPE)
+
     @app.get("/agent-card")
     async def agent_card_simple():
-        return JSONResponse(content=AGENT_CARD)
+        return CodecJSONResponse(content=AGENT_CARD)
 
     @app.get("/.well-known/agent-card.json")
     async def agent_card():
-        return JSONResponse(content=AGENT_CARD)
+        return CodecJSONResponse(content=AGENT_CARD)
 
     @app.post("/run")
     async def run_task(request: Request):
         """Handle task run request from AgentBeats runner."""
         try:
-            body = await request.json()
+            body = json_codec.loads(await request.body())
         except Exception:
             body = {}
         
@@ -93,23 +160,13 @@ def run_server(host: str, port: int, card_url: str) -> None:
     @app.post("/a2a/rpc")
     async def a2a_rpc(request: Request):
         """Handle A2A JSON-RPC requests."""
-        from purple_agent import PurpleAgent
-        import asyncio
-        from concurrent.futures import ThreadPoolExecutor
-        import logging
-        import sys
-
-        # Configure logging to stdout
-        logging.basicConfig(stream=sys.stdout, level=logging.INFO, force=True)
-        logger = logging.getLogger("purple_rpc")
-
         logger.info("Handler invoked")
         try:
-            body = await request.json()
+            body = json_codec.loads(await request.body())
             logger.info(f"Received request: method={body.get('method')}, id={body.get('id')}")
         except Exception as e:
             logger.error(f"Failed to parse JSON: {e}")
-            return JSONResponse(content={
+            return CodecJSONResponse(content={
                 "jsonrpc": "2.0",
                 "id": "1",
                 "error": {"code": -32700, "message": "Parse error"}
@@ -133,7 +190,7 @@ def run_server(host: str, port: int, card_url: str) -> None:
                 logger.info(f"Processing part {i}: keys={list(part.keys()) if isinstance(part, dict) else 'not a dict'}")
                 if isinstance(part, dict) and part.get("kind") == "text":
                     try:
-                        task_request = json.loads(part.get("text", "{}"))
+                        task_request = json_codec.loads(part.get("text", "{}"))
                         logger.info(f"Extracted task_request: {task_request}")
                         break
                     except Exception as e:
@@ -142,7 +199,7 @@ def run_server(host: str, port: int, card_url: str) -> None:
 
             if not task_request or "task_id" not in task_request:
                 logger.error(f"task_id not found in request")
-                return JSONResponse(content={
+                return CodecJSONResponse(content={
                     "jsonrpc": "2.0",
                     "id": rpc_id,
                     "error": {
@@ -154,21 +211,50 @@ def run_server(host: str, port: int, card_url: str) -> None:
             task_id = task_request["task_id"]
             mock_url = task_request.get("mock_url", "http://mock-comtrade:8000")
             output_dir = task_request.get("output_dir", f"/workspace/purple_output/{task_id}")
+            # Extra output files for this run only (default: --output-format)
+            # Profile this run only: "cpu", "mem", "both" (default: --profile)
+            try:
+                output_formats = parse_formats(task_request["output_formats"]) if "output_formats" in task_request else None
+                profile = parse_profile(task_request["profile"]) if task_request.get("profile") is not None else None
+            except (TypeError, ValueError) as e:
+                logger.error(f"Invalid task options: {e}")
+                return CodecJSONResponse(content={
+                    "jsonrpc": "2.0",
+                    "id": rpc_id,
+                    "error": {
+                        "code": -32602,
+                        "message": f"Invalid params: {e}"
+                    }
+                })
 
-            # Run task in background thread
-            agent = PurpleAgent()
-            loop = asyncio.get_event_loop()
-            with ThreadPoolExecutor() as executor:
-                success = await loop.run_in_executor(
-                    executor,
-                    agent.run,
-                    task_id,
-                    output_dir,
-                    mock_url
-                )
+            # Root span of the run's trace (with --trace); the agent's run span nests under it
+            with tracing.start("a2a tasks/send", "server", enabled=agent.trace, task_id=task_id, rpc_id=rpc_id) as span:
+                try:
+                    with tracing.span("admission_wait", "server"):
+                        await admission.acquire()
+                except ServerBusy as exc:
+                    logger.warning(f"Rejecting {task_id}: {exc} {admission.stats()}")
+                    span.set(rejected=exc.reason)
+                    return CodecJSONResponse(
+                        status_code=503,
+                        headers=retry_after_header(exc),
+                        content=busy_error(rpc_id, exc),
+                    )
+
+                try:
+                    if use_async:
+                        # Run task on the event loop
+                        success = await metrics.run_task_async(agent.run, task_id, output_dir, mock_url, output_formats, profile)
+                    else:
+                        # Run task on the shared worker pool
+                        logger.info(f"Submitting {task_id} to worker pool: {pool.stats()}")
+                        success = await pool.run(metrics.run_task, agent.run, task_id, output_dir, mock_url, output_formats, profile)
+                finally:
+                    admission.release()
+                span.set(success=success)
 
             if success:
-                return JSONResponse(content={
+                return CodecJSONResponse(content={
                     "jsonrpc": "2.0",
                     "id": rpc_id,
                     "result": {
@@ -191,7 +277,7 @@ def run_server(host: str, port: int, card_url: str) -> None:
                                     "parts": [
                                         {
                                             "kind": "text",
-                                            "text": json.dumps({
+                                            "text": json_codec.dumps({
                                                 "task_id": task_id,
                                                 "status": "completed",
                                                 "output_dir": output_dir
@@ -204,7 +290,7 @@ def run_server(host: str, port: int, card_url: str) -> None:
                     }
                 })
             else:
-                return JSONResponse(content={
+                return CodecJSONResponse(content={
                     "jsonrpc": "2.0",
                     "id": rpc_id,
                     "error": {
@@ -215,7 +301,7 @@ def run_server(host: str, port: int, card_url: str) -> None:
 
         # Default response for other methods
         logger.info(f"Returning default response for method: {method}")
-        return JSONResponse(content={
+        return CodecJSONResponse(content={
             "jsonrpc": "2.0",
             "id": rpc_id,
             "result": {
@@ -230,16 +316,33 @@ def run_server(host: str, port: int, card_url: str) -> None:
     uvicorn.run(app, host=host, port=port)
 
 
-def run_local(task_id: str, output_dir: str, mock_url: str) -> int:
+def run_local(
+    task_id: str,
+    output_dir: str,
+    mock_url: str,
+    agent_options: Optional[Dict[str, Any]] = None,
+    use_async: bool = False,
+) -> int:
     """Run single task locally and exit."""
+    if use_async:
+        import asyncio
+        from async_purple_agent import AsyncPurpleAgent
+
+        async def run_async() -> bool:
+            async with AsyncPurpleAgent(**(agent_options or {})) as agent:
+                return await agent.run(task_id=task_id, output_dir=output_dir, mock_url=mock_url)
+
+        success = asyncio.run(run_async())
+        return 0 if success else 1
+
     from purple_agent import PurpleAgent
 
-    agent = PurpleAgent()
-    success = agent.run(
-        task_id=task_id,
-        output_dir=output_dir,
-        mock_url=mock_url,
-    )
+    with PurpleAgent(**(agent_options or {})) as agent:
+        success = agent.run(
+            task_id=task_id,
+            output_dir=output_dir,
+            mock_url=mock_url,
+        )
     return 0 if success else 1
 
 
@@ -295,22 +398,231 @@ def main() -> int:
         default="http://localhost:8000",
         help="Mock service URL (default: http://localhost:8000)",
     )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Concurrent page fetch workers (default: 1, one page at a time)",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=None,
+        help="HTTP connections kept alive per mock_url (default: $PURPLE_POOL_SIZE or 10)",
+    )
+    parser.add_argument(
+        "--no-keep-alive",
+        action="store_true",
+        default=False,
+        help="Close the HTTP connection after every request",
+    )
+    parser.add_argument(
+        "--memory-budget-mb",
+        type=float,
+        default=256,
+        help="Rows buffered per run before spilling sorted runs to disk, in MB (default: 256, 0 never spills)",
+    )
+    parser.add_argument(
+        "--spill-dir",
+        default=None,
+        help="Directory for spilled sorted runs (default: system temp dir)",
+    )
+    parser.add_argument(
+        "--external-sort",
+        action="store_true",
+        default=False,
+        help="Dedup while merging spilled runs instead of with an in-memory key set",
+    )
+    parser.add_argument(
+        "--dedup-digest-bits",
+        type=int,
+        choices=[64, 128],
+        default=None,
+        help="Keep dedup keys as digests of this width: less memory, slower (default: key tuples)",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Worker processes that sort and encode large runs (default: 1, in-process)",
+    )
+    parser.add_argument(
+        "--shard-threshold",
+        type=int,
+        default=500_000,
+        help="Rows a run needs before sorting is sharded across processes (default: 500000)",
+    )
+    parser.add_argument(
+        "--json-codec",
+        choices=list(json_codec.CODECS),
+        default=None,
+        help="JSON codec for responses, rows and RPC bodies (default: $PURPLE_JSON_CODEC or auto)",
+    )
+    parser.add_argument(
+        "--output-format",
+        action="append",
+        default=None,
+        metavar="FORMAT",
+        help=f"Also write data.jsonl as FORMAT, repeatable or comma-separated: {', '.join(FORMATS)} (default: none)",
+    )
+    parser.add_argument(
+        "--compress-threads",
+        type=int,
+        default=None,
+        help="Threads compressing jsonl.gz / jsonl.zst outputs (default: CPU count)",
+    )
+    parser.add_argument(
+        "--fsync-outputs",
+        action="store_true",
+        default=False,
+        help="fsync output files in one batch before they are atomically committed",
+    )
+    parser.add_argument(
+        "--log-sink",
+        choices=list(SINKS),
+        default="queue",
+        help="Console log writer: background batched queue or synchronous print (default: queue)",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=list(LEVELS),
+        default="INFO",
+        help="Lowest level printed to the console; run.log always has every line (default: INFO)",
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        default=False,
+        help="Write a span trace of each run to trace.json (Chrome trace-event format) in its output directory",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=list(PROFILES),
+        default=None,
+        help="Profile each run with cProfile (cpu), tracemalloc (mem) or both; writes profile.pstats / memory_top.txt next to data.jsonl",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=DEFAULT_TOP,
+        help=f"Allocation sites listed in memory_top.txt (default: {DEFAULT_TOP})",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["row", "columnar"],
+        default="row",
+        help="Row processing engine; columnar needs NumPy and keeps rows in memory (default: row)",
+    )
+    parser.add_argument(
+        "--async-agent",
+        action="store_true",
+        default=False,
+        help="Use the asyncio agent (httpx) instead of the threaded one",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Server worker pool size (default: $PURPLE_WORKERS or min(32, CPUs + 4))",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="Max concurrent task runs in server mode (default: worker pool size)",
+    )
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=16,
+        help="Task runs allowed to wait for a slot before rejecting with 503 (default: 16)",
+    )
+    parser.add_argument(
+        "--queue-timeout",
+        type=float,
+        default=30.0,
+        help="Seconds a queued task run waits for a slot (default: 30)",
+    )
+    
+    # Retry policy args
+    parser.add_argument(
+        "--retry-jitter",
+        choices=["none", "full", "decorrelated"],
+        default="none",
+        help="Backoff jitter mode (default: none, deterministic)",
+    )
+    parser.add_argument(
+        "--retry-base",
+        type=float,
+        default=1.0,
+        help="Base backoff in seconds (default: 1.0)",
+    )
+    parser.add_argument(
+        "--retry-budget",
+        type=float,
+        default=None,
+        help="Total retry sleep budget per run in seconds (default: unlimited)",
+    )
     
     # Parse known args, ignore unknown (for compose compatibility)
     args, unknown = parser.parse_known_args()
     if unknown:
         print(f"Ignoring unknown args: {unknown}")
+    if args.json_codec:
+        json_codec.use(args.json_codec)
+    try:
+        output_formats = parse_formats(args.output_format)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    from http_pool import ConnectionPools
+    from retry_policy import RetryPolicy
+
+    agent_options = {
+        "concurrency": args.concurrency,
+        "pools": ConnectionPools(args.pool_size, keep_alive=not args.no_keep_alive),
+        "memory_budget_mb": args.memory_budget_mb or None,
+        "spill_dir": args.spill_dir,
+        "external_sort": args.external_sort,
+        "engine": args.engine,
+        "dedup_digest_bits": args.dedup_digest_bits,
+        "shards": args.shards,
+        "shard_threshold": args.shard_threshold,
+        "output_formats": output_formats,
+        "compress_threads": args.compress_threads,
+        "fsync_outputs": args.fsync_outputs,
+        "log_sink": args.log_sink,
+        "log_level": args.log_level,
+        "trace": args.trace,
+        "profile": args.profile,
+        "profile_top": args.profile_top,
+        "retry_policy": RetryPolicy(
+            base_seconds=args.retry_base,
+            jitter=args.retry_jitter,
+            budget_seconds=args.retry_budget,
+        ),
+    }
     
     # Local mode if --local flag is set
     if args.local:
         if args.output_dir is None:
             args.output_dir = f"_purple_output/{args.task_id}"
-        return run_local(args.task_id, args.output_dir, args.mock_url)
+        return run_local(args.task_id, args.output_dir, args.mock_url, agent_options, args.async_agent)
     
     # Server mode (default)
     port = int(os.getenv("PORT", str(args.port)))
     card_url = args.card_url or f"http://localhost:{port}"
-    run_server(args.host, port, card_url)
+    run_server(
+        args.host,
+        port,
+        card_url,
+        agent_options,
+        args.async_agent,
+        args.workers,
+        args.max_in_flight,
+        args.max_queue,
+        args.queue_timeout,
+    )
     return 0
 
 
@@ -0,0 +1,54 @@
+"""
+Per-run state for Purple agent task runs.
+
+A PurpleAgent holds only long-lived configuration (HTTP connection pools,
+retry policy, concurrency). Everything that belongs to a single task run
+lives in a RunContext created by run(), so one agent instance - and its warm
+connection pools - can serve many tasks concurrently.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from log_sink import LogLine
+from profiling import RunProfiler
+from rate_limit import TokenBucket
+from retry_policy import RetryBudget
+from row_pipeline import RowPipeline
+from telemetry import RunTelemetry
+
+
+@dataclass
+class RunContext:
+    """Counters, pacing, retry budget and log lines of one task run."""
+
+    task_id: str
+    retry_budget: RetryBudget
+    mock_url: str = ""
+    start_time: float = field(default_factory=time.time)
+    # Client-side pacing at the task's rate_limit_qps
+    rate_limiter: Optional[TokenBucket] = None
+    # Streaming totals filter, dedup and spill for fetched rows
+    pipeline: Optional[RowPipeline] = None
+    # Extra output files next to data.jsonl (output_formats.FORMATS)
+    output_formats: Tuple[str, ...] = ()
+    # Per-request events (metrics.jsonl), latencies and phase times
+    telemetry: RunTelemetry = field(default_factory=RunTelemetry)
+    # cProfile / tracemalloc around the run when profiling was asked for
+    profiler: Optional[RunProfiler] = None
+    # run.log lines, formatted when first printed or written
+    log_lines: List[LogLine] = field(default_factory=list)
+    # Efficiency tracking
+    request_count: int = 0
+    retry_count: int = 0
+    http_429_count: int = 0
+    http_500_count: int = 0
+    # Traceability
+    current_page: int = 0
+    current_request: int = 0
+    # Guards counters updated by concurrent page fetches
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
@@ -0,0 +1,240 @@
+"""
+Prometheus metrics for the A2A servers, rendered in the text exposition
+format (version 0.0.4) without prometheus_client or any exporter process.
+
+One ServerMetrics per server process collects:
+
+- purple_tasks_total{outcome}: agent runs by outcome (completed, failed,
+  error when run() raised, cancelled)
+- purple_task_duration_seconds{task_id}: run time per task (histogram, at
+  most MAX_TASK_SERIES task_ids)
+- purple_upstream_request_duration_seconds{endpoint,status}: every mock
+  service attempt (histogram; status "error" for transport failures)
+- purple_upstream_retries_total, purple_upstream_rate_limited_total (429)
+  and purple_upstream_server_errors_total (5xx)
+
+Agents report upstream requests through their RunTelemetry observer. At
+scrape time render() adds gauges read from the worker pool, the admission
+controller and the process: queue depth, active workers, in-flight and
+waiting task runs, rejections and resident memory.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; a task run spans retries and backoff, an upstream request one HTTP call
+TASK_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Distinct task_id labels kept; task_ids come from clients, later ones count as "other"
+MAX_TASK_SERIES = 100
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[values] = self._values.get(values, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labels:
+            items = [((), 0.0)]
+        return [f"{self.name}{_labels(self.labels, values)} {_number(value)}" for values, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = REQUEST_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._values: Dict[LabelValues, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *values: str) -> None:
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._values.get(values)
+            if series is None:
+                series = self._values[values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def has_series(self, *values: str) -> bool:
+        with self._lock:
+            return values in self._values
+
+    def series_count(self) -> int:
+        with self._lock:
+            return len(self._values)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((values, (list(counts), total)) for values, (counts, total) in self._values.items())
+        lines = []
+        for values, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, values)} {cumulative}")
+        return lines
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Current RSS from /proc; elsewhere the peak RSS from getrusage (None if neither exists)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+class ServerMetrics:
+    """Process-wide counters and histograms for one server, rendered for /metrics."""
+
+    def __init__(self) -> None:
+        self.tasks = Counter("purple_tasks_total", "Agent task runs by outcome", ("outcome",))
+        self.task_duration = Histogram(
+            "purple_task_duration_seconds", "Agent task run time", ("task_id",), TASK_BUCKETS,
+        )
+        self.upstream_latency = Histogram(
+            "purple_upstream_request_duration_seconds",
+            "Mock service request latency by endpoint and HTTP status",
+            ("endpoint", "status"),
+            REQUEST_BUCKETS,
+        )
+        self.retries = Counter("purple_upstream_retries_total", "Mock service requests that were retries")
+        self.rate_limited = Counter("purple_upstream_rate_limited_total", "Mock service HTTP 429 responses")
+        self.server_errors = Counter("purple_upstream_server_errors_total", "Mock service HTTP 5xx responses")
+        self.started = time.time()
+
+    def observe_request(self, endpoint: str, status: Optional[int], seconds: float, attempt: int) -> None:
+        """RunTelemetry observer hook: one HTTP attempt against the mock service."""
+        self.upstream_latency.observe(seconds, endpoint, "error" if status is None else str(status))
+        if attempt > 0:
+            self.retries.inc()
+        if status == 429:
+            self.rate_limited.inc()
+        elif status is not None and status >= 500:
+            self.server_errors.inc()
+
+    def _finish_task(self, task_id: str, started: float, outcome: str) -> None:
+        if not self.task_duration.has_series(task_id) and self.task_duration.series_count() >= MAX_TASK_SERIES:
+            task_id = "other"
+        self.task_duration.observe(time.perf_counter() - started, task_id)
+        self.tasks.inc(outcome)
+
+    def run_task(self, run: Callable[..., bool], task_id: str, *args: Any) -> bool:
+        """Call run(task_id, *args) and record its duration and outcome."""
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            success = run(task_id, *args)
+            outcome = "completed" if success else "failed"
+            return success
+        finally:
+            self._finish_task(task_id, started, outcome)
+
+    async def run_task_async(self, run: Callable[..., Any], task_id: str, *args: Any) -> bool:
+        """Await run(task_id, *args) and record its duration and outcome."""
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            success = await run(task_id, *args)
+            outcome = "completed" if success else "failed"
+            return success
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            self._finish_task(task_id, started, outcome)
+
+    def render(self, pool: Any = None, admission: Any = None) -> str:
+        """Exposition text with the current worker pool, admission and process gauges."""
+        families: List[Tuple[str, str, str, List[str]]] = [
+            (m.name, m.help, m.kind, m.samples())
+            for m in (self.tasks, self.task_duration, self.upstream_latency, self.retries, self.rate_limited, self.server_errors)
+        ]
+
+        def single(name: str, help: str, kind: str, value: Optional[float]) -> None:
+            if value is not None:
+                families.append((name, help, kind, [f"{name} {_number(value)}"]))
+
+        if pool is not None:
+            stats = pool.stats()
+            single("purple_worker_pool_max_workers", "Worker pool size", "gauge", stats["max_workers"])
+            single("purple_worker_pool_queue_depth", "Runs waiting for a worker pool thread", "gauge", stats["queue_depth"])
+            single("purple_worker_pool_active_workers", "Worker pool threads running a task", "gauge", stats["active_workers"])
+        if admission is not None:
+            stats = admission.stats()
+            single("purple_tasks_in_flight", "Task runs holding an admission slot", "gauge", stats["in_flight"])
+            single("purple_admission_waiting", "Task runs queued for an admission slot", "gauge", stats["waiting"])
+            single("purple_admission_rejected_total", "Task runs rejected with HTTP 503", "counter", stats["rejected"])
+        single("process_resident_memory_bytes", "Resident memory size in bytes", "gauge", resident_memory_bytes())
+        single("process_start_time_seconds", "Start time of the server since the epoch in seconds", "gauge", self.started)
+
+        lines = []
+        for name, help, kind, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
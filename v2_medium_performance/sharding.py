@@ -0,0 +1,139 @@
+"""
+Multi-core sort, dedup and encoding for large in-memory runs.
+
+Sorting by dedup_key and encoding rows to JSON are the single-threaded tail
+of a run. Above a row threshold the buffered rows are hash-partitioned by
+dedup_key into one shard per worker process; equal keys always land in the
+same shard, so each worker can dedup and sort its shard on its own and
+return the kept rows already encoded. The sorted shards are then k-way
+merged into data.jsonl order.
+
+Sharding is opt-in (--shards, default 1). Workers are started by a
+forkserver (spawn where there is none), never by forking the agent process
+itself, which in server mode has worker pool, log sink and event loop
+threads whose held locks a forked child would inherit. Each worker is sent
+its shard pickled and sends back only the kept row indices and one block of
+JSON text. Fresh worker processes start on the default JSON codec, so each
+is switched to the agent's json_codec choice when it starts. Worker processes are capped process-wide at MAX_WORKERS, shared
+by concurrent runs; a run that gets fewer than two sorts in-process.
+"""
+
+from __future__ import annotations
+
+import heapq
+import multiprocessing
+import os
+import threading
+from array import array
+from operator import itemgetter
+from typing import Any, Iterator, List, Tuple
+
+import json_codec
+from compact_rows import PackedRow, dumps_rows
+
+# Rows a run needs before sorting is sharded across processes
+DEFAULT_SHARD_THRESHOLD = 500_000
+
+# Sort worker processes alive at once across every run in this process
+MAX_WORKERS = os.cpu_count() or 1
+
+_workers_lock = threading.Lock()
+_workers_in_use = 0
+
+
+def start_method() -> str:
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _start_worker(codec: str) -> None:
+    """Pool initializer: encode with the codec the agent process chose."""
+    json_codec.use(codec)
+
+
+def worker_pool(processes: int) -> Any:
+    """Pool of sort workers using the active JSON codec."""
+    context = multiprocessing.get_context(start_method())
+    return context.Pool(processes, initializer=_start_worker, initargs=(json_codec.active(),))
+
+
+def reserve_workers(wanted: int) -> int:
+    """Take up to `wanted` of the MAX_WORKERS slots; 0 (nothing taken) if fewer than 2 are free."""
+    global _workers_in_use
+    with _workers_lock:
+        granted = min(wanted, MAX_WORKERS - _workers_in_use)
+        if granted < 2:
+            return 0
+        _workers_in_use += granted
+        return granted
+
+
+def release_workers(count: int) -> None:
+    global _workers_in_use
+    with _workers_lock:
+        _workers_in_use -= count
+
+
+class EncodedSchema:
+    """Schema stand-in for rows a worker already encoded: (EncodedSchema, json_text)."""
+
+    __slots__ = ("fields",)
+
+    def __init__(self, fields: Tuple[str, ...]):
+        self.fields = fields
+
+    def dumps(self, row: Tuple[Any, str]) -> str:
+        return row[1]
+
+
+def _sort_shard(rows: List[PackedRow]) -> Tuple[bytes, str, int]:
+    """Stable sort + first-wins dedup of one shard; returns (kept indices, JSON lines, duplicates)."""
+    keys = [row[0].key(row) for row in rows]
+    kept = array("q")
+    last = duplicates = 0
+    for i in sorted(range(len(rows)), key=keys.__getitem__):
+        if kept and keys[i] == last:
+            duplicates += 1
+            continue
+        last = keys[i]
+        kept.append(i)
+    return kept.tobytes(), dumps_rows([rows[i] for i in kept]) if kept else "", duplicates
+
+
+def partition(rows: List[PackedRow], shards: int) -> List[List[PackedRow]]:
+    """Split rows by dedup_key hash, keeping arrival order within each shard."""
+    parts: List[List[PackedRow]] = [[] for _ in range(shards)]
+    for row in rows:
+        parts[hash(row[0].key(row)) % shards].append(row)
+    return parts
+
+
+class ShardedSort:
+    """Sorts and encodes one run's rows in `shards` worker processes (see reserve_workers)."""
+
+    def __init__(self, rows: List[PackedRow], shards: int):
+        self.parts = partition(rows, shards)
+        self.duplicates_dropped = 0
+
+    def _encoded(self, rows: List[PackedRow], kept: bytes, text: str) -> Iterator[Tuple[tuple, Tuple[Any, str]]]:
+        encoded = {}
+        indices = array("q")
+        indices.frombytes(kept)
+        for i, line in zip(indices, text.split("\n") if indices else ()):
+            row = rows[i]
+            schema = row[0]
+            stand_in = encoded.get(schema)
+            if stand_in is None:
+                stand_in = encoded[schema] = EncodedSchema(schema.fields)
+            yield schema.key(row), (stand_in, line)
+
+    def rows(self) -> Iterator[Tuple[Any, str]]:
+        """Yield every kept row, encoded, in dedup_key order."""
+        with worker_pool(len(self.parts)) as pool:
+            results = pool.map(_sort_shard, self.parts, chunksize=1)
+        sources = []
+        for rows, (kept, text, duplicates) in zip(self.parts, results):
+            self.duplicates_dropped += duplicates
+            sources.append(self._encoded(rows, kept, text))
+        # Keys are unique across shards once each shard is deduped
+        for _, row in heapq.merge(*sources, key=itemgetter(0)):
+            yield row
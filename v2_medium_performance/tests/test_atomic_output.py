@@ -0,0 +1,109 @@
+import errno
+import os
+
+import pytest
+
+import atomic_output
+from atomic_output import StagedOutput
+
+
+def commit(final_dir, files):
+    with StagedOutput(final_dir) as staged:
+        for name, text in files.items():
+            (staged.path / name).write_text(text)
+        return staged.commit()
+
+
+def listing(path):
+    return {entry.name: entry.read_text() for entry in path.iterdir()}
+
+
+def test_commit_creates_missing_directory(tmp_path):
+    out = tmp_path / "T1"
+    assert commit(out, {"data.jsonl": "new\n"}) == "rename"
+    assert listing(out) == {"data.jsonl": "new\n"}
+    assert os.listdir(tmp_path) == ["T1"]
+
+
+def test_commit_swaps_previous_outputs(tmp_path):
+    out = tmp_path / "T1"
+    commit(out, {"data.jsonl": "old\n", "run.log": "old\n"})
+    assert commit(out, {"data.jsonl": "new\n"}) in ("exchange", "rename")
+    assert listing(out) == {"data.jsonl": "new\n"}
+    assert os.listdir(tmp_path) == ["T1"]
+
+
+def test_commit_keeps_foreign_files(tmp_path):
+    out = tmp_path / "T1"
+    out.mkdir()
+    (out / "notes.txt").write_text("mine")
+    (out / "data.jsonl").write_text("old\n")
+    assert commit(out, {"data.jsonl": "new\n"}) == "files"
+    assert listing(out) == {"data.jsonl": "new\n", "notes.txt": "mine"}
+
+
+def test_discard_removes_uncommitted_staging(tmp_path):
+    out = tmp_path / "T1"
+    with StagedOutput(out) as staged:
+        (staged.path / "data.jsonl").write_text("partial")
+    assert os.listdir(tmp_path) == []
+
+
+def test_commit_into_working_directory(tmp_path, monkeypatch):
+    out = tmp_path / "work"
+    out.mkdir()
+    (out / "data.jsonl").write_text("old\n")
+    monkeypatch.chdir(out)
+    assert commit(".", {"data.jsonl": "new\n", "run.log": "log\n"}) == "files"
+    # The working directory itself was updated, not swapped away
+    assert os.getcwd() == str(out)
+    assert listing(out) == {"data.jsonl": "new\n", "run.log": "log\n"}
+    assert os.listdir(tmp_path) == ["work"]
+
+
+def test_commit_through_symlinked_directory(tmp_path):
+    target = tmp_path / "real"
+    target.mkdir()
+    (target / "data.jsonl").write_text("old\n")
+    link = tmp_path / "link"
+    link.symlink_to(target, target_is_directory=True)
+    commit(link, {"data.jsonl": "new\n"})
+    assert link.is_symlink()
+    assert listing(target) == {"data.jsonl": "new\n"}
+
+
+@pytest.mark.parametrize("code", [errno.EBUSY, errno.EXDEV, errno.ENOTDIR, errno.EINVAL])
+def test_unrenameable_directory_falls_back_to_files(tmp_path, monkeypatch, code):
+    out = tmp_path / "mnt"
+    out.mkdir()
+    (out / "data.jsonl").write_text("old\n")
+
+    def rename(src, dst):
+        raise OSError(code, os.strerror(code))
+
+    monkeypatch.setattr(atomic_output.os, "rename", rename)
+    monkeypatch.setattr(atomic_output, "exchange", lambda a, b: rename(a, b))
+    assert commit(out, {"data.jsonl": "new\n"}) == "files"
+    assert listing(out) == {"data.jsonl": "new\n"}
+    assert os.listdir(tmp_path) == ["mnt"]
+
+
+def test_replace_copies_across_filesystems(tmp_path, monkeypatch):
+    source = tmp_path / "a"
+    source.write_text("new")
+    target = tmp_path / "b"
+    target.write_text("old")
+    real_replace = os.replace
+    calls = []
+
+    def replace(src, dst):
+        calls.append(src)
+        if len(calls) == 1:
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(atomic_output.os, "replace", replace)
+    atomic_output._replace_file(str(source), target)
+    assert target.read_text() == "new"
+    assert not source.exists()
+    assert sorted(os.listdir(tmp_path)) == ["b"]
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from conftest import serve_comtrade
+from fetch_scheduler import FetchOutcome, PageJob, PageScheduler
+from purple_agent import PurpleAgent
+
+
+def scripted(failures):
+    """attempt() failing each page's first `failures[page]` attempts with a 429."""
+    calls = []
+
+    def attempt(job):
+        calls.append((job.page, job.attempt))
+        if job.attempt < failures.get(job.page, 0):
+            return FetchOutcome(status=429)
+        return FetchOutcome(status=200, payload={"data": [job.page]})
+
+    return attempt, calls
+
+
+def test_one_worker_fetches_other_pages_while_a_page_backs_off():
+    attempt, calls = scripted({1: 1})
+    seen = []
+    scheduler = PageScheduler(1, attempt, plan_retry=lambda job, outcome: 0.05)
+    results = scheduler.run(
+        [PageJob(page, {"page": page}) for page in (1, 2, 3)],
+        on_result=lambda results: seen.append(sorted(results)),
+    )
+    assert calls == [(1, 0), (2, 0), (3, 0), (1, 1)]
+    assert seen == [[2], [2, 3], [1, 2, 3]]
+    assert results == {page: {"data": [page]} for page in (1, 2, 3)}
+
+
+def test_retries_are_requeued_by_due_time_and_give_up_as_planned():
+    attempt, calls = scripted({1: 2, 2: 1, 4: 9})
+    backoffs = {1: 0.3, 2: 0.1, 4: 0.01}
+    planned = []
+
+    def plan_retry(job, outcome):
+        planned.append((job.page, job.attempt, job.previous_backoff, outcome.status))
+        return None if job.attempt >= 1 and job.page == 4 else backoffs[job.page]
+
+    results = PageScheduler(1, attempt, plan_retry).run([PageJob(page, {"page": page}) for page in (1, 2, 3, 4)])
+    assert calls == [(1, 0), (2, 0), (3, 0), (4, 0), (4, 1), (2, 1), (1, 1), (1, 2)]
+    assert planned == [(1, 0, None, 429), (2, 0, None, 429), (4, 0, None, 429), (4, 1, 0.01, 429), (1, 1, 0.3, 429)]
+    assert results == {1: {"data": [1]}, 2: {"data": [2]}, 3: {"data": [3]}, 4: None}
+
+
+def test_workers_fetch_every_page_once():
+    attempt, calls = scripted({})
+    results = PageScheduler(4, attempt, plan_retry=lambda job, outcome: 0.0).run(
+        [PageJob(page, {"page": page}) for page in range(1, 51)]
+    )
+    assert sorted(calls) == [(page, 0) for page in range(1, 51)]
+    assert results == {page: {"data": [page]} for page in range(1, 51)}
+
+
+@pytest.mark.parametrize("task_id", ["T2_multi_page", "T7_totals_trap"])
+def test_concurrent_fetch_writes_the_same_bytes(comtrade_url, tmp_path, task_id):
+    outputs = []
+    for concurrency in (1, 4):
+        with PurpleAgent(concurrency=concurrency) as agent:
+            assert agent.run(task_id, str(tmp_path / str(concurrency)), comtrade_url)
+        outputs.append((tmp_path / str(concurrency) / "data.jsonl").read_bytes())
+    assert outputs[0] == outputs[1]
+    assert outputs[0].count(b"\n") > 500
+
+
+def test_cancel_drops_queued_pages_and_pending_retries():
+    attempt, calls = scripted({2: 5})
+    scheduler = PageScheduler(1, attempt, plan_retry=lambda job, outcome: 0.01)
+
+    def on_result(results):
+        if 3 in results:
+            scheduler.cancel()
+
+    results = scheduler.run([PageJob(page, {"page": page}) for page in range(1, 7)], on_result=on_result)
+    assert calls == [(1, 0), (2, 0), (3, 0)]
+    assert sorted(results) == [1, 3]
+
+
+def test_end_of_data_stops_fetching(tmp_path):
+    # T2 plans 5 pages of 500 rows; the short page 2 (or the empty page 3) ends the data
+    with serve_comtrade(total_rows=600) as url:
+        with PurpleAgent() as agent:
+            assert agent.run("T2_multi_page", str(tmp_path / "out"), url)
+    metadata = json.loads((tmp_path / "out" / "metadata.json").read_text())
+    assert metadata["row_count"] == 600
+    assert metadata["request_count"] <= 3
@@ -0,0 +1,63 @@
+import json
+
+from http_pool import ConnectionPools, base_url
+from purple_agent import PurpleAgent
+
+
+def test_one_session_per_base_url():
+    pools = ConnectionPools()
+    try:
+        session = pools.session("http://Mock:8000/records?page=1")
+        assert pools.session("HTTP://mock:8000/configure") is session
+        assert pools.session("http://mock:8001/records") is not session
+        assert base_url("http://Mock:8000/a/b") == "http://mock:8000"
+    finally:
+        pools.close()
+
+
+def test_keep_alive_reuses_one_connection(comtrade_url):
+    pools = ConnectionPools(pool_size=2)
+    try:
+        for _ in range(5):
+            pools.session(comtrade_url).get(f"{comtrade_url}/records", timeout=5)
+        stats = pools.stats(comtrade_url)
+    finally:
+        pools.close()
+    assert stats == {
+        "pool_size": 2,
+        "keep_alive": True,
+        "requests": 5,
+        "connections_opened": 1,
+        "connections_reused": 4,
+        "idle_connections": 1,
+    }
+    assert pools.stats() == {"pool_size": 2, "keep_alive": True, "pools": {}}
+
+
+def test_without_keep_alive_every_request_connects(comtrade_url):
+    pools = ConnectionPools(keep_alive=False)
+    try:
+        for _ in range(3):
+            pools.session(comtrade_url).get(f"{comtrade_url}/records", timeout=5)
+        stats = pools.stats(comtrade_url)
+    finally:
+        pools.close()
+    assert (stats["requests"], stats["connections_opened"], stats["connections_reused"]) == (3, 3, 0)
+
+
+def test_runs_report_reuse_of_the_shared_pool(comtrade_url, tmp_path):
+    pools = ConnectionPools()
+    try:
+        with PurpleAgent(pools=pools) as agent:
+            for run in ("first", "second"):
+                assert agent.run("T2_multi_page", str(tmp_path / run), comtrade_url)
+    finally:
+        pools.close()
+    first, second = (json.loads((tmp_path / run / "metadata.json").read_text()) for run in ("first", "second"))
+    # Readiness polling and /configure share the /records connection
+    assert first["connection_pool"]["requests"] > first["request_count"]
+    # Stats are cumulative per mock_url; the second run starts on the first run's warm connection
+    first, second = first["connection_pool"], second["connection_pool"]
+    assert first["connections_opened"] == second["connections_opened"] == 1
+    assert second["requests"] > first["requests"]
+    assert second["connections_reused"] == second["requests"] - 1
@@ -0,0 +1,49 @@
+import asyncio
+import io
+import threading
+import types
+
+import log_sink
+from async_purple_agent import AsyncPurpleAgent
+from log_sink import LogLine, QueueSink
+from purple_agent import PurpleAgent
+
+
+def sink_threads():
+    return sum(1 for thread in threading.enumerate() if thread.name == "log-sink")
+
+
+def test_close_writes_queued_lines_and_drops_exit_hook(monkeypatch):
+    hooks = []
+    monkeypatch.setattr(log_sink, "atexit", types.SimpleNamespace(register=hooks.append, unregister=hooks.remove))
+    stream = io.StringIO()
+    sink = QueueSink("[x] ", stream=stream)
+    assert hooks == [sink.close]
+    sink.emit(LogLine("INFO", "{}", (), "hello"))
+    sink.close()
+    sink.close()
+    assert hooks == []
+    assert not sink._thread.is_alive()
+    assert stream.getvalue() == "[x] hello\n"
+
+
+def test_agents_release_their_sink_threads():
+    before = sink_threads()
+    agents = [PurpleAgent() for _ in range(5)]
+    assert sink_threads() == before + 5
+    for agent in agents:
+        agent.close()
+    assert sink_threads() == before
+
+
+def test_agent_context_managers_close_the_sink():
+    with PurpleAgent() as agent:
+        assert agent.log_sink._thread.is_alive()
+    assert not agent.log_sink._thread.is_alive()
+
+    async def run():
+        async with AsyncPurpleAgent() as agent:
+            assert agent.log_sink._thread.is_alive()
+        return agent
+
+    assert not asyncio.run(run()).log_sink._thread.is_alive()
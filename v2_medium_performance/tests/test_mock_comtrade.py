@@ -0,0 +1,126 @@
+import dataclasses
+
+import pytest
+import requests
+
+from conftest import serve_comtrade
+from mock_comtrade import Scenario
+from tasks import get_task
+
+
+def definition(task_id, **fault):
+    task = dataclasses.asdict(get_task(task_id))
+    task["fault_injection"] = dict(task["fault_injection"], **fault)
+    return task
+
+
+def configure(url, task_id, **fault):
+    response = requests.post(f"{url}/configure", json=definition(task_id, **fault), timeout=5)
+    response.raise_for_status()
+    return response.json()
+
+
+def records(url, **params):
+    return requests.get(f"{url}/records", params=params, timeout=5)
+
+
+def served(url, task_id, pages):
+    configure(url, task_id)
+    return [records(url, page=page).content for page in pages]
+
+
+def test_same_seed_serves_the_same_bytes(comtrade_url):
+    # Page drift shuffles every response, seeded by the call number
+    expected = served(comtrade_url, "T6_page_drift", [1, 2, 1, 3])
+    with serve_comtrade(seed=0) as same, serve_comtrade(seed=1) as other:
+        assert served(same, "T6_page_drift", [1, 2, 1, 3]) == expected
+        assert served(other, "T6_page_drift", [1, 2, 1, 3]) != expected
+    assert expected[0] != expected[2]
+
+
+def test_rows_depend_only_on_their_position():
+    scenario = Scenario(definition("T2_multi_page"))
+    stream = scenario.window(0, 3000, call=1)
+    assert len(stream) == 2345
+    assert [row["record_id"] for row in stream] == list(range(2345))
+    assert scenario.window(700, 50, call=9) == stream[700:750]
+    assert Scenario(definition("T2_multi_page"), total_rows=10).window(0, 500, call=1) == stream[:10]
+
+
+def test_page_and_offset_windows_agree(comtrade_url):
+    configure(comtrade_url, "T7_totals_trap")
+    by_page = records(comtrade_url, page=2, page_size=100).json()["data"]
+    assert records(comtrade_url, offset=100, maxRecords=100).json()["data"] == by_page
+    assert records(comtrade_url, offset=700, maxRecords=100).json()["data"][-1]["record_id"] == 749
+
+
+def test_duplicates_repeat_earlier_rows():
+    scenario = Scenario(definition("T3_duplicates", duplicate_rate=0.2, cross_page_duplicate_rate=0.1), total_rows=1000)
+    stream = scenario.window(0, 1000, call=1)
+    first = {}
+    repeats = 0
+    for position, row in enumerate(stream):
+        if row["record_id"] != position:
+            repeats += 1
+            assert row["record_id"] < position
+            assert row == first[row["record_id"]]
+        first.setdefault(row["record_id"], row)
+    assert 150 <= repeats <= 250
+    # Rated faults hit evenly spaced positions, so even the 25-row task gets its share
+    small = Scenario(definition("T3_duplicates")).window(0, 25, call=1)
+    assert any(row["record_id"] != position for position, row in enumerate(small))
+
+
+@pytest.mark.parametrize("task_id, status", [("T4_rate_limit_429", 429), ("T5_server_error_500", 500)])
+def test_fail_on_counts_records_calls(comtrade_url, task_id, status):
+    configure(comtrade_url, task_id)
+    responses = [records(comtrade_url, page=page) for page in (1, 1, 1)]
+    assert [response.status_code for response in responses] == [200, status, 200]
+    if status == 429:
+        assert responses[1].headers["Retry-After"] == "1"
+    # /configure starts the call count again
+    configure(comtrade_url, task_id)
+    assert records(comtrade_url, page=1).status_code == 200
+
+
+def test_fail_rate_is_seeded_by_call_number():
+    failures = [
+        [Scenario(definition("T5_server_error_500", fail_on=[], fail_rate=0.3), seed).fault(call) for call in range(1, 201)]
+        for seed in (0, 0, 1)
+    ]
+    assert failures[0] == failures[1] != failures[2]
+    assert 30 <= failures[0].count(500) <= 90
+    assert set(failures[0]) == {None, 500}
+
+
+def test_page_drift_reorders_and_repeats_across_pages():
+    scenario = Scenario(definition("T6_page_drift", drift_rate=1.0))
+    first, second = scenario.window(12, 12, call=1), scenario.window(12, 12, call=2)
+    assert first != second
+    assert sorted(first, key=repr) == sorted(second, key=repr)
+    # The first row of the page repeats the last row of the page before
+    assert scenario.row(12) == scenario.row(11)
+
+
+def test_totals_trap_marks_every_totals_every_row():
+    stream = Scenario(definition("T7_totals_trap")).window(0, 750, call=1)
+    totals = [row for row in stream if row["isTotal"]]
+    assert [row["record_id"] for row in totals] == list(range(49, 750, 50))
+    assert all(row["partner"] == "WLD" and row["hs"] == "TOTAL" for row in totals)
+
+
+def test_bad_requests(comtrade_url):
+    response = requests.post(f"{comtrade_url}/configure", json=definition("T1_single_page", mode="flood"), timeout=5)
+    assert response.status_code == 400
+    assert "flood" in response.json()["error"]
+    assert records(f"{comtrade_url}/never-configured").status_code == 409
+    configure(comtrade_url, "T1_single_page")
+    assert records(comtrade_url, offset=-1).status_code == 400
+
+
+def test_prefixes_keep_separate_scenarios(comtrade_url):
+    assert configure(f"{comtrade_url}/a", "T1_single_page")["task_id"] == "T1_single_page"
+    configure(f"{comtrade_url}/b", "T4_rate_limit_429")
+    assert len(records(f"{comtrade_url}/a", page=1).json()["data"]) == 800
+    assert records(f"{comtrade_url}/b", page=1).status_code == 200
+    assert records(f"{comtrade_url}/b", page=2).status_code == 429
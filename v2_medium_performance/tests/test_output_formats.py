@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+pyarrow = pytest.importorskip("pyarrow")
+import pyarrow.ipc  # noqa: E402
+import pyarrow.parquet  # noqa: E402
+
+from output_formats import FormatWriters  # noqa: E402
+
+
+def batch(rows):
+    return "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+
+
+def row(i, value, **extra):
+    return dict({"year": 2021, "reporter": "840", "partner": "156", "flow": "M", "hs": "85",
+                 "record_id": i, "value": value, "isTotal": False}, **extra)
+
+
+def read(path, kind):
+    if kind == "parquet":
+        return pyarrow.parquet.read_table(path)
+    with pyarrow.ipc.open_file(path) as reader:
+        return reader.read_all()
+
+
+@pytest.mark.parametrize("kind", ["parquet", "arrow"])
+def test_integral_then_fractional_numbers(tmp_path, kind):
+    writers = FormatWriters(tmp_path, [kind])
+    # The first batch only has integral values; later ones are fractional
+    writers.write(batch([row(i, 100, qty=3) for i in range(1024)]))
+    writers.write(batch([row(1024, 100.5, qty=2.25)]))
+    writers.close()
+    (described,) = writers.describe()
+    assert "error" not in described
+    table = read(tmp_path / described["file"], kind)
+    assert table.num_rows == 1025
+    assert table.schema.field("value").type == pyarrow.float64()
+    assert table.schema.field("record_id").type == pyarrow.int64()
+    assert table.schema.field("qty").type == pyarrow.float64()
+    assert table.column("value")[-1].as_py() == 100.5
+    assert table.column("qty")[-1].as_py() == 2.25
+
+
+def test_incompatible_batch_is_reported(tmp_path):
+    writers = FormatWriters(tmp_path, ["parquet"])
+    writers.write(batch([row(1, 1.5)]))
+    writers.write(batch([row(2, 1.5, surprise="column")]))
+    writers.close()
+    (described,) = writers.describe()
+    assert described["file"] is None and described["error"]
+    assert not (tmp_path / "data.parquet").exists()
@@ -0,0 +1,50 @@
+import hashlib
+import io
+import json
+
+import pytest
+
+from output_writer import HashingWriter
+from purple_agent import PurpleAgent
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.parametrize("batch_rows", [1, 3, 1024])
+def test_digest_matches_the_file_and_sinks(tmp_path, batch_rows):
+    path = tmp_path / "data.jsonl"
+    sink = io.BytesIO()
+    with HashingWriter(path, batch_rows=batch_rows, encode=lambda rows: "\n".join(map(json.dumps, rows)),
+                       sinks=[sink]) as writer:
+        for i in range(10):
+            writer.write({"record_id": i, "name": "café"})
+        writer.write_text('{"raw": true}\n')
+        writer.write({"record_id": 10})
+    data = path.read_bytes()
+    assert data.count(b"\n") == 12
+    assert data.index(b'{"raw": true}') > data.index(b'"record_id": 9')
+    assert sink.getvalue() == data
+    assert writer.hexdigest() == sha256(data)
+    assert (writer.lines, writer.bytes_written) == (11, len(data))
+
+
+def test_empty_output_hashes_as_empty(tmp_path):
+    with HashingWriter(tmp_path / "data.jsonl") as writer:
+        pass
+    assert (tmp_path / "data.jsonl").read_bytes() == b""
+    assert writer.hexdigest() == sha256(b"")
+
+
+def test_metadata_records_the_output_hashes(comtrade_url, tmp_path):
+    with PurpleAgent() as agent:
+        assert agent.run("T3_duplicates", str(tmp_path), comtrade_url)
+    text = (tmp_path / "metadata.json").read_text(encoding="utf-8")
+    metadata = json.loads(text)
+    hashes = metadata["output_hashes"]
+    assert hashes["data_sha256"] == sha256((tmp_path / "data.jsonl").read_bytes())
+    # metadata_sha256 covers metadata.json as written with that one field null
+    written = hashes["metadata_sha256"]
+    hashes["metadata_sha256"] = None
+    assert written == sha256(json.dumps(metadata, ensure_ascii=True, indent=2).encode("utf-8") + b"\n")
@@ -0,0 +1,116 @@
+import asyncio
+import contextvars
+import json
+import threading
+
+import pytest
+
+import tracing
+from async_purple_agent import AsyncPurpleAgent
+from purple_agent import PurpleAgent
+from retry_policy import RetryPolicy
+
+
+def load(path):
+    """(spans by span_id, flow events) of a trace.json."""
+    events = json.loads(path.read_text())["traceEvents"]
+    spans = {event["args"]["span_id"]: event for event in events if event["ph"] == "X"}
+    return spans, [event for event in events if event["ph"] in ("s", "f")]
+
+
+def parent(spans, span):
+    parent_id = span["args"]["parent_id"]
+    return None if parent_id is None else spans[parent_id]["name"]
+
+
+def test_no_span_without_an_active_trace():
+    assert tracing.span("step") is tracing.NO_SPAN
+    assert tracing.start("run", enabled=False) is tracing.NO_SPAN
+    assert tracing.current() is None
+
+
+def test_nested_spans_are_exported_when_the_root_ends(tmp_path):
+    root = tracing.start("run", task_id="T1")
+    root.trace.path = tmp_path / tracing.TRACE_FILENAME
+    with root:
+        with tracing.span("fetch") as fetch:
+            with tracing.span("GET /records", page=1):
+                assert tracing.current().parent is fetch
+        with pytest.raises(ValueError):
+            with tracing.span("write"):
+                raise ValueError("disk full")
+        assert not root.trace.path.exists()
+    spans, flows = load(root.trace.path)
+    assert {span["name"]: parent(spans, span) for span in spans.values()} == {
+        "run": None, "fetch": "run", "GET /records": "fetch", "write": "run",
+    }
+    by_name = {span["name"]: span for span in spans.values()}
+    assert by_name["GET /records"]["args"]["page"] == 1
+    assert by_name["write"]["args"]["error"] == "ValueError: disk full"
+    # Children finish first and lie within their parent
+    assert by_name["fetch"]["ts"] <= by_name["GET /records"]["ts"]
+    assert by_name["GET /records"]["dur"] <= by_name["fetch"]["dur"]
+    assert flows == []
+
+
+def test_spans_follow_the_context_to_threads_and_tasks(tmp_path):
+    root = tracing.start("run")
+    root.trace.path = tmp_path / tracing.TRACE_FILENAME
+
+    def on_thread():
+        with tracing.span("worker"):
+            pass
+
+    async def in_tasks():
+        async def step(name):
+            with tracing.span(name):
+                await asyncio.sleep(0)
+        await asyncio.gather(step("task-a"), step("task-b"))
+
+    with root:
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(on_thread,))
+        thread.start()
+        thread.join()
+        asyncio.run(in_tasks())
+    spans, flows = load(root.trace.path)
+    by_name = {span["name"]: span for span in spans.values()}
+    assert all(parent(spans, by_name[name]) == "run" for name in ("worker", "task-a", "task-b"))
+    tids = {by_name[name]["tid"] for name in ("run", "worker", "task-a", "task-b")}
+    assert len(tids) == 4
+    # One flow arrow (start on the parent's track, end on the child's) per child on another track
+    assert sorted((flow["id"], flow["ph"]) for flow in flows) == sorted(
+        (by_name[name]["args"]["span_id"], ph) for name in ("worker", "task-a", "task-b") for ph in "sf"
+    )
+
+
+def run_agent(agent_class, output_dir, url):
+    options = dict(trace=True, concurrency=2, retry_policy=RetryPolicy(base_seconds=0.01))
+    if agent_class is PurpleAgent:
+        with PurpleAgent(**options) as agent:
+            return agent.run("T4_rate_limit_429", str(output_dir), url)
+
+    async def run_async():
+        async with AsyncPurpleAgent(**options) as agent:
+            return await agent.run("T4_rate_limit_429", str(output_dir), url)
+
+    return asyncio.run(run_async())
+
+
+@pytest.mark.parametrize("agent_class", [PurpleAgent, AsyncPurpleAgent])
+def test_agent_trace_parentage(comtrade_url, tmp_path, agent_class):
+    assert run_agent(agent_class, tmp_path, comtrade_url)
+    spans, flows = load(tmp_path / tracing.TRACE_FILENAME)
+    (root,) = [span for span in spans.values() if span["args"]["parent_id"] is None]
+    assert (root["name"], root["args"]["task_id"]) == ("run", "T4_rate_limit_429")
+    parents = {}
+    for span in spans.values():
+        parents.setdefault(span["name"], set()).add(parent(spans, span))
+    for name in ("wait_for_http", "configure_mock", "fetch_all_pages", "process_rows", "write_outputs"):
+        assert parents[name] == {"run"}
+    assert parents["POST /configure"] == {"configure_mock"}
+    # Attempts run on fetch worker threads (or tasks) but nest under the fetch that queued them
+    fetch = "fetch_page" if agent_class is AsyncPurpleAgent else "fetch_all_pages"
+    assert parents["GET /records"] == {fetch}
+    attempts = [span for span in spans.values() if span["name"] == "GET /records"]
+    assert sorted(span["args"]["status"] for span in attempts) == [200, 200, 200, 429]
+    assert flows
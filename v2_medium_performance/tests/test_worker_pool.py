@@ -0,0 +1,74 @@
+import asyncio
+import contextvars
+import threading
+
+import pytest
+
+import worker_pool
+from worker_pool import WorkerPool
+
+
+@pytest.mark.parametrize("env, expected", [("3", 3), ("0", 1), (None, 32)])
+def test_pool_size_from_env(monkeypatch, env, expected):
+    monkeypatch.setattr(worker_pool.os, "cpu_count", lambda: 64)
+    if env is None:
+        monkeypatch.delenv("PURPLE_WORKERS", raising=False)
+    else:
+        monkeypatch.setenv("PURPLE_WORKERS", env)
+    pool = WorkerPool()
+    try:
+        assert pool.max_workers == expected
+    finally:
+        pool.shutdown()
+
+
+def test_gauges_track_queued_and_active_runs():
+    pool = WorkerPool(2)
+    release = threading.Event()
+    started = threading.Semaphore(0)
+
+    def blocked(fail=False):
+        started.release()
+        release.wait(5)
+        if fail:
+            raise RuntimeError("boom")
+        return "ok"
+
+    try:
+        futures = [pool.submit(blocked), pool.submit(blocked, fail=True), pool.submit(blocked), pool.submit(blocked)]
+        for _ in range(2):
+            assert started.acquire(timeout=5)
+        stats = pool.stats()
+        assert (stats["max_workers"], stats["active_workers"], stats["queue_depth"]) == (2, 2, 2)
+        release.set()
+        assert [f.result(5) for f in (futures[0], futures[2], futures[3])] == ["ok"] * 3
+        with pytest.raises(RuntimeError):
+            futures[1].result(5)
+    finally:
+        release.set()
+        pool.shutdown()
+    assert pool.stats() == {"max_workers": 2, "queue_depth": 0, "active_workers": 0, "completed": 3, "failed": 1}
+
+
+def test_run_awaits_in_the_callers_context():
+    pool = WorkerPool(1)
+    var = contextvars.ContextVar("var", default=None)
+
+    async def scenario():
+        var.set("request-1")
+        return await pool.run(lambda: (var.get(), threading.current_thread().name))
+
+    try:
+        value, thread = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+    assert value == "request-1"
+    assert thread.startswith("purple-worker")
+
+
+def test_submit_after_shutdown_leaves_no_queued_run():
+    pool = WorkerPool(1)
+    pool.shutdown()
+    with pytest.raises(RuntimeError):
+        pool.submit(print)
+    assert pool.stats()["queue_depth"] == 0
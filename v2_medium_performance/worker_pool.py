@@ -0,0 +1,89 @@
+"""
+Process-wide worker pool for blocking agent runs.
+
+The A2A servers hand every tasks/send call to one bounded thread pool created
+at startup instead of building (and tearing down) a ThreadPoolExecutor per
+request. The pool keeps queue-depth and active-worker gauges so saturation is
+visible from the health endpoint.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+def default_workers() -> int:
+    """Pool size from PURPLE_WORKERS, else the ThreadPoolExecutor default."""
+    env = os.getenv("PURPLE_WORKERS")
+    if env:
+        return max(1, int(env))
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+class WorkerPool:
+    """Bounded thread pool with queue-depth and active-worker gauges."""
+
+    def __init__(self, max_workers: Optional[int] = None, thread_name_prefix: str = "purple-worker"):
+        self.max_workers = max(1, max_workers or default_workers())
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=thread_name_prefix,
+        )
+        self._lock = threading.Lock()
+        # Gauges
+        self.queued = 0
+        self.active = 0
+        # Counters
+        self.completed = 0
+        self.failed = 0
+
+    def _call(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self.active -= 1
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """Queue fn(*args, **kwargs) on the pool, in a copy of the caller's context (trace spans)."""
+        with self._lock:
+            self.queued += 1
+        try:
+            return self._executor.submit(contextvars.copy_context().run, self._call, fn, *args, **kwargs)
+        except RuntimeError:
+            with self._lock:
+                self.queued -= 1
+            raise
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Await fn(*args, **kwargs) on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, int]:
+        """Current gauges and counters."""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queue_depth": self.queued,
+                "active_workers": self.active,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,237 @@
+"""
+Pluggable JSON codec: orjson or msgspec when installed, the stdlib otherwise.
+
+Every result is exactly what the stdlib would produce, so switching codecs
+never changes data.jsonl:
+
+- loads() matches json.loads(). orjson reads integers wider than 64 bits
+  as floats and neither fast codec accepts NaN/Infinity or lone
+  surrogates, so such documents are decoded by the stdlib.
+- dumps() matches json.dumps(obj), and dumps_lines() matches
+  "\n".join(map(json.dumps, objs)). Flat dicts, i.e. /records rows, go
+  through the fast codec - a whole batch per call for dumps_lines() - and
+  get the stdlib's ", " and ": " separators back; anything whose rendering
+  could differ (exponent floats, escapes, non-ASCII, nesting, null/NaN,
+  big ints) is re-encoded by the stdlib.
+- dumps_compact() matches the JSON body Starlette's JSONResponse renders.
+
+PURPLE_JSON_CODEC (auto, orjson, msgspec, stdlib) or use() picks the
+backend; auto prefers orjson, then msgspec.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+CODECS = ("auto", "orjson", "msgspec", "stdlib")
+
+# Guards run as substring searches over a copy with every digit mapped to
+# "0" (a regex is several times slower than the fast codecs themselves)
+_ZERO_DIGITS = bytes.maketrans(b"123456789", b"000000000")
+# orjson decodes integers beyond 64 bits as floats
+_LONG_NUMBER = b"0" * 19
+# Digit runs of 1e16 and up, which the stdlib prints with an exponent
+_LONG_FLOAT = b"0" * 17
+
+
+def _unsafe_numbers(data: bytes) -> bool:
+    """Floats the stdlib would print differently: exponents, under 1e-4, 1e16 and up."""
+    if b".0000" in data:
+        return True
+    digits = data.translate(_ZERO_DIGITS)
+    return b"0e" in digits or b"0E" in digits or _LONG_FLOAT in digits
+
+
+def _stdlib_compact(obj: Any) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _orjson_loads(data: Union[bytes, str]) -> Any:
+    raw = data.encode("utf-8") if isinstance(data, str) else data
+    if _LONG_NUMBER not in raw.translate(_ZERO_DIGITS):
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def _msgspec_loads(data: Union[bytes, str]) -> Any:
+    try:
+        return msgspec.json.decode(data)
+    except msgspec.DecodeError:
+        return json.loads(data)
+
+
+def _row_dumps(encode: Callable[[Any], bytes]) -> Callable[[Any], str]:
+    def dumps(obj: Any) -> str:
+        if type(obj) is not dict:
+            return json.dumps(obj)
+        try:
+            data = encode(obj)
+        except (TypeError, ValueError, OverflowError):
+            return json.dumps(obj)
+        fields = len(obj)
+        # Escapes, nesting, DEL and null (also what NaN/inf encode to) render
+        # differently; every '":' and ',"' is a separator only when the
+        # counts match the fields
+        if (
+            not data.isascii()
+            or b"\\" in data
+            or b"[" in data
+            or b"\x7f" in data
+            or b"null" in data
+            or _unsafe_numbers(data)
+            or data.count(b"{") != 1
+            or data.count(b'":') != fields
+            or data.count(b',"') != max(0, fields - 1)
+        ):
+            return json.dumps(obj)
+        return data.replace(b'":', b'": ').replace(b',"', b', "').decode("ascii")
+
+    return dumps
+
+
+def _lines_dumps(encode: Callable[[Any], bytes], dumps: Callable[[Any], str]) -> Callable[[List[Any]], str]:
+    def dumps_lines(objs: List[Any]) -> str:
+        count = len(objs)
+        if not count or not all(type(obj) is dict for obj in objs):
+            return "\n".join(map(dumps, objs))
+        try:
+            data = encode(objs)
+        except (TypeError, ValueError, OverflowError):
+            return "\n".join(map(dumps, objs))
+        fields = sum(map(len, objs))
+        # As in dumps(), plus: every row is a non-empty flat dict, so rows are
+        # joined by the only '},{' sequences and each row has fields - 1 ',"'
+        if (
+            not data.isascii()
+            or b"\\" in data
+            or b"{}" in data
+            or b"\x7f" in data
+            or b"null" in data
+            or _unsafe_numbers(data)
+            or data.count(b"[") != 1
+            or data.count(b"{") != count
+            or data.count(b"},{") != count - 1
+            or data.count(b'":') != fields
+            or data.count(b',"') != fields - count
+        ):
+            return "\n".join(map(dumps, objs))
+        return data[1:-1].replace(b'":', b'": ').replace(b',"', b', "').replace(b"},{", b"}\n{").decode("ascii")
+
+    return dumps_lines
+
+
+def _compact_dumps(encode: Callable[[Any], bytes]) -> Callable[[Any], bytes]:
+    def dumps_compact(obj: Any) -> bytes:
+        try:
+            data = encode(obj)
+        except (TypeError, ValueError, OverflowError):
+            return _stdlib_compact(obj)
+        if b"null" in data or _unsafe_numbers(data):
+            return _stdlib_compact(obj)
+        return data
+
+    return dumps_compact
+
+
+class JsonCodec:
+    """loads/dumps/dumps_compact for one backend."""
+
+    def __init__(
+        self,
+        name: str,
+        loads: Callable[[Union[bytes, str]], Any],
+        dumps: Callable[[Any], str],
+        dumps_compact: Callable[[Any], bytes],
+        dumps_lines: Optional[Callable[[List[Any]], str]] = None,
+    ):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+        self.dumps_compact = dumps_compact
+        self.dumps_lines = dumps_lines or (lambda objs: "\n".join(map(dumps, objs)))
+
+
+def _build(name: str) -> Optional[JsonCodec]:
+    if name in ("orjson", "msgspec"):
+        if name == "orjson" and orjson is not None:
+            encode, loads = orjson.dumps, _orjson_loads
+        elif name == "msgspec" and msgspec is not None:
+            encode, loads = msgspec.json.encode, _msgspec_loads
+        else:
+            return None
+        dumps = _row_dumps(encode)
+        return JsonCodec(name, loads, dumps, _compact_dumps(encode), _lines_dumps(encode, dumps))
+    if name == "stdlib":
+        return JsonCodec(name, json.loads, json.dumps, _stdlib_compact)
+    return None
+
+
+def available() -> Dict[str, bool]:
+    return {"orjson": orjson is not None, "msgspec": msgspec is not None, "stdlib": True}
+
+
+def select(name: str = "auto") -> JsonCodec:
+    """Codec for `name`; auto (or an unavailable backend) picks the fastest installed."""
+    if name not in CODECS:
+        raise ValueError(f"Unknown JSON codec {name!r}, expected one of {CODECS}")
+    for candidate in ((name,) if name != "auto" else ()) + ("orjson", "msgspec", "stdlib"):
+        codec = _build(candidate)
+        if codec is not None:
+            return codec
+    raise AssertionError("stdlib codec is always available")
+
+
+_codec = select(os.getenv("PURPLE_JSON_CODEC") or "auto")
+
+
+def use(name: str) -> JsonCodec:
+    """Switch the process-wide codec."""
+    global _codec
+    _codec = select(name)
+    return _codec
+
+
+def active() -> str:
+    return _codec.name
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    return _codec.loads(data)
+
+
+def dumps(obj: Any) -> str:
+    return _codec.dumps(obj)
+
+
+def dumps_lines(objs: List[Any]) -> str:
+    return _codec.dumps_lines(objs)
+
+
+def dumps_compact(obj: Any) -> bytes:
+    return _codec.dumps_compact(obj)
+
+
+def response_class() -> type:
+    """Starlette JSONResponse subclass that renders bodies with the active codec."""
+    from starlette.responses import JSONResponse
+
+    class CodecJSONResponse(JSONResponse):
+        def render(self, content: Any) -> bytes:
+            return dumps_compact(content)
+
+    return CodecJSONResponse
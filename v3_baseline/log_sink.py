@@ -0,0 +1,174 @@
+"""
+Console sink for PurpleAgent._log.
+
+Every _log call used to build its line and print() it on the calling
+thread, so a run with thousands of pages serialized its fetch workers on
+stdout. Now a call only appends a LogLine (level, fields, message and
+its %-args) to the run's log_lines and hands it to a sink:
+
+- QueueSink (default) queues the line for one background thread, which
+  formats whatever has queued up and writes it with one write() and
+  flush() per batch.
+- StreamSink prints on the calling thread, as before.
+
+Lines are formatted on first str() - by the sink thread, or when run.log is
+written - and run.log always gets every line in full, exactly as before.
+The level filter applies to the console only.
+"""
+
+from __future__ import annotations
+
+import atexit
+import queue
+import sys
+import threading
+from typing import Any, Optional, TextIO, Tuple
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+
+SINKS = ("queue", "sync")
+
+# Lines a QueueSink writes per batch at most
+DEFAULT_BATCH_LINES = 512
+
+
+def message_level(message: str) -> str:
+    """Level named by a "WARN: ..." style message prefix (INFO when there is none)."""
+    head = message[:6]
+    for level in ("ERROR", "WARN", "DEBUG"):
+        if head.startswith(level + ":"):
+            return level
+    return "INFO"
+
+
+class LogLine:
+    """One run.log line, formatted on first str(): template.format(*fields, message % args)."""
+
+    __slots__ = ("level", "template", "fields", "message", "args", "_text")
+
+    def __init__(self, level: str, template: str, fields: Tuple[Any, ...], message: str, args: Tuple[Any, ...] = ()):
+        self.level = level
+        self.template = template
+        self.fields = fields
+        self.message = message
+        self.args = args
+        self._text: Optional[str] = None
+
+    def __str__(self) -> str:
+        text = self._text
+        if text is None:
+            message = self.message % self.args if self.args else self.message
+            text = self._text = self.template.format(*self.fields, message)
+        return text
+
+
+class StreamSink:
+    """Prints each line at or above `level` on the calling thread."""
+
+    def __init__(self, prefix: str = "", level: str = "INFO", stream: Optional[TextIO] = None):
+        if level not in LEVELS:
+            raise ValueError(f"Unknown log level {level!r}, expected one of {tuple(LEVELS)}")
+        self.prefix = prefix
+        self.level = level
+        self.threshold = LEVELS[level]
+        # None: whatever sys.stdout is at write time
+        self.stream = stream
+
+    def enabled(self, level: str) -> bool:
+        return LEVELS.get(level, 20) >= self.threshold
+
+    def emit(self, line: LogLine) -> None:
+        if self.enabled(line.level):
+            print(f"{self.prefix}{line}", file=self.stream or sys.stdout)
+
+    def flush(self) -> None:
+        (self.stream or sys.stdout).flush()
+
+    def close(self) -> None:
+        self.flush()
+
+
+class QueueSink(StreamSink):
+    """Hands lines to one background writer thread that formats and writes them in batches."""
+
+    def __init__(
+        self,
+        prefix: str = "",
+        level: str = "INFO",
+        stream: Optional[TextIO] = None,
+        batch_lines: int = DEFAULT_BATCH_LINES,
+    ):
+        super().__init__(prefix, level, stream)
+        self.batch_lines = max(1, batch_lines)
+        self._queue: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._closed = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def emit(self, line: LogLine) -> None:
+        if self._closed:
+            # After close() (e.g. at interpreter exit) lines are printed directly
+            super().emit(line)
+        elif self.enabled(line.level):
+            self._queue.put(line)
+
+    def _write(self, lines: list) -> None:
+        if not lines:
+            return
+        prefix = self.prefix
+        stream = self.stream or sys.stdout
+        try:
+            stream.write("".join(f"{prefix}{line}\n" for line in lines))
+            stream.flush()
+        except (OSError, ValueError):
+            # Closed or broken stdout; run.log still has every line
+            pass
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_lines:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for item in batch:
+                if isinstance(item, LogLine):
+                    lines.append(item)
+                    continue
+                # flush()/close() marker: everything queued before it is written first
+                self._write(lines)
+                lines = []
+                item.set()
+                if item is self._stop:
+                    return
+            self._write(lines)
+
+    def flush(self) -> None:
+        """Block until every line queued so far has been written."""
+        if self._closed or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self) -> None:
+        """Write what is queued, stop the writer thread and drop the exit hook."""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        if self._thread.is_alive():
+            self._queue.put(self._stop)
+            self._thread.join()
+
+
+def create_sink(kind: str = "queue", level: str = "INFO", prefix: str = "") -> StreamSink:
+    if kind == "queue":
+        return QueueSink(prefix, level)
+    if kind == "sync":
+        return StreamSink(prefix, level)
+    raise ValueError(f"Unknown log sink {kind!r}, expected one of {SINKS}")
@@ -0,0 +1,245 @@
+"""
+Optional output files written alongside data.jsonl.
+
+Every extra format is fed the exact bytes that go into data.jsonl, one
+HashingWriter batch at a time, so the contract files (data.jsonl,
+metadata.json, run.log) are the same whether or not extra formats are on:
+
+- jsonl.gz: data.jsonl.gz, one gzip member per ~1 MiB block, compressed on
+  a thread pool (zlib releases the GIL); concatenated members are one valid
+  gzip stream
+- jsonl.zst: data.jsonl.zst from zstandard's multi-threaded compressor
+- parquet / arrow: data.parquet / data.arrow (Arrow IPC file), each batch
+  parsed by pyarrow's JSON reader against one schema: the contract fields
+  (year, reporter, ..., value, isTotal) have fixed types, and other columns
+  take the first batch's inferred type, with integers widened to double so
+  a later fractional value still fits
+
+pyarrow and zstandard are optional. A format whose library is missing, or
+whose rows stop fitting the schema (a new column, a string where the first
+batch had numbers), is reported with an
+error in metadata.json["output_formats"] and its partial file is removed.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.json
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+FORMATS = ("parquet", "arrow", "jsonl.gz", "jsonl.zst")
+
+FILENAMES = {
+    "parquet": "data.parquet",
+    "arrow": "data.arrow",
+    "jsonl.gz": "data.jsonl.gz",
+    "jsonl.zst": "data.jsonl.zst",
+}
+
+# Uncompressed bytes per gzip member
+GZIP_BLOCK_BYTES = 1 << 20
+
+
+def default_threads() -> int:
+    return os.cpu_count() or 1
+
+
+def parse_formats(value: Union[None, str, Iterable[str]]) -> Tuple[str, ...]:
+    """Format names from "parquet,jsonl.gz" or a list of names, in order, without repeats."""
+    if not value:
+        return ()
+    names = value.split(",") if isinstance(value, str) else [part for item in value for part in item.split(",")]
+    formats: List[str] = []
+    for name in (name.strip() for name in names):
+        if not name:
+            continue
+        if name not in FORMATS:
+            raise ValueError(f"Unknown output format {name!r}, expected one of {FORMATS}")
+        if name not in formats:
+            formats.append(name)
+    return tuple(formats)
+
+
+class GzipWriter:
+    """data.jsonl.gz built from gzip members compressed in parallel, written in order."""
+
+    def __init__(self, path: Path, threads: int, level: int = 6):
+        self.level = level
+        self._file = open(path, "wb")
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="gzip")
+        self._pending: Deque[Future] = deque()
+        self._max_pending = threads * 2
+        self._block = bytearray()
+
+    def _submit(self) -> None:
+        # mtime=0 keeps the file identical across runs
+        self._pending.append(self._executor.submit(gzip.compress, bytes(self._block), self.level, mtime=0))
+        self._block.clear()
+        while len(self._pending) > self._max_pending:
+            self._file.write(self._pending.popleft().result())
+
+    def write(self, data: bytes) -> None:
+        self._block += data
+        if len(self._block) >= GZIP_BLOCK_BYTES:
+            self._submit()
+
+    def close(self) -> None:
+        try:
+            if self._block or not self._pending:
+                self._submit()
+            while self._pending:
+                self._file.write(self._pending.popleft().result())
+        finally:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._file.close()
+
+
+class ZstdWriter:
+    """data.jsonl.zst from a zstandard stream compressed on `threads` worker threads."""
+
+    def __init__(self, path: Path, threads: int, level: int = 3):
+        if zstandard is None:
+            raise RuntimeError("jsonl.zst output needs zstandard (pip install zstandard)")
+        self._file = open(path, "wb")
+        compressor = zstandard.ZstdCompressor(level=level, threads=threads)
+        self._stream = compressor.stream_writer(self._file, closefd=False)
+
+    def write(self, data: bytes) -> None:
+        self._stream.write(data)
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._file.close()
+
+
+def _contract_types() -> Dict[str, Any]:
+    """Arrow types of the data.jsonl contract fields."""
+    return {
+        "year": pyarrow.int64(),
+        "reporter": pyarrow.string(),
+        "partner": pyarrow.string(),
+        "flow": pyarrow.string(),
+        "hs": pyarrow.string(),
+        "record_id": pyarrow.int64(),
+        "value": pyarrow.float64(),
+        "isTotal": pyarrow.bool_(),
+    }
+
+
+def stable_schema(inferred: Any) -> Any:
+    """The schema every batch is parsed with, from the one inferred for the first batch."""
+    contract = _contract_types()
+    fields = []
+    for field in inferred:
+        kind = contract.get(field.name)
+        if kind is None:
+            kind = pyarrow.float64() if pyarrow.types.is_integer(field.type) else field.type
+        fields.append(pyarrow.field(field.name, kind))
+    return pyarrow.schema(fields)
+
+
+class ArrowWriter:
+    """data.parquet or data.arrow, one record batch per data.jsonl batch."""
+
+    def __init__(self, path: Path, kind: str):
+        if pyarrow is None:
+            raise RuntimeError(f"{kind} output needs pyarrow (pip install pyarrow)")
+        self.path = path
+        self.kind = kind
+        self._writer: Any = None
+        self._parse_options: Any = None
+
+    def _open(self, schema: Any) -> None:
+        if self.kind == "parquet":
+            self._writer = pyarrow.parquet.ParquetWriter(str(self.path), schema)
+        else:
+            self._writer = pyarrow.ipc.new_file(str(self.path), schema)
+        # Later batches must have the same columns and types
+        self._parse_options = pyarrow.json.ParseOptions(explicit_schema=schema, unexpected_field_behavior="error")
+
+    def write(self, data: bytes) -> None:
+        if not data.strip():
+            return
+        if self._parse_options is None:
+            self._open(stable_schema(pyarrow.json.read_json(io.BytesIO(data)).schema))
+        table = pyarrow.json.read_json(io.BytesIO(data), parse_options=self._parse_options)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        if self._writer is None:
+            # No rows: a valid file with no columns
+            self._open(pyarrow.schema([]))
+        self._writer.close()
+
+
+class FormatWriters:
+    """The extra output files of one run, fed every batch HashingWriter writes."""
+
+    def __init__(self, output_dir: Path, formats: Iterable[str], threads: Optional[int] = None):
+        threads = max(1, threads or default_threads())
+        self._writers: Dict[str, Any] = {}
+        self._errors: Dict[str, str] = {}
+        self._paths = {name: output_dir / FILENAMES[name] for name in formats}
+        for name, path in self._paths.items():
+            try:
+                if name == "jsonl.gz":
+                    self._writers[name] = GzipWriter(path, threads)
+                elif name == "jsonl.zst":
+                    self._writers[name] = ZstdWriter(path, threads)
+                else:
+                    self._writers[name] = ArrowWriter(path, name)
+            except Exception as exc:
+                self._fail(name, exc)
+
+    def _fail(self, name: str, exc: Exception) -> None:
+        self._errors[name] = f"{type(exc).__name__}: {exc}"
+        writer = self._writers.pop(name, None)
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+        self._paths[name].unlink(missing_ok=True)
+
+    def write(self, data: bytes) -> None:
+        for name, writer in list(self._writers.items()):
+            try:
+                writer.write(data)
+            except Exception as exc:
+                self._fail(name, exc)
+
+    def close(self) -> None:
+        for name, writer in list(self._writers.items()):
+            try:
+                writer.close()
+            except Exception as exc:
+                self._fail(name, exc)
+
+    def describe(self) -> List[Dict[str, Any]]:
+        """metadata.json["output_formats"]: file and size per format, or its error."""
+        described = []
+        for name, path in self._paths.items():
+            if name in self._errors:
+                described.append({"format": name, "file": None, "error": self._errors[name]})
+            else:
+                described.append({"format": name, "file": path.name, "bytes": path.stat().st_size})
+        return described
@@ -0,0 +1,70 @@
+"""
+Client-side rate limiting for mock service requests.
+
+Every task declares rate_limit_qps in its constraints; pacing requests at
+that rate up front avoids tripping server-side throttling (HTTP 429) and
+the backoff sleeps that follow.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict
+
+
+class TokenBucket:
+    """Thread-safe token bucket that paces callers at a fixed rate.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. A
+    caller that finds the bucket empty reserves its token anyway and sleeps
+    until it is due, so concurrent callers are served in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(capacity))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        # Stats
+        self.acquired = 0
+        self.waited_seconds = 0.0
+
+    def _reserve(self, tokens: float) -> float:
+        """Take tokens from the bucket and return how long to wait for them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.acquired += 1
+            self.waited_seconds += wait
+            return wait
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until `tokens` are available; returns seconds waited."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, tokens: float = 1.0) -> float:
+        """Like acquire(), but waits with asyncio.sleep instead of blocking the thread."""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def stats(self) -> Dict[str, Any]:
+        """Summary for metadata.json."""
+        return {
+            "qps": self.rate,
+            "burst": self.capacity,
+            "requests_paced": self.acquired,
+            "wait_seconds": round(self.waited_seconds, 3),
+        }
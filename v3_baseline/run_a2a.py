@@ -13,15 +13,16 @@ print("[STARTUP] Importing modules...", flush=True)
 
 import argparse
 import asyncio
-import concurrent.futures
 import json
 import logging
 import os
 import sys
 from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 import uvicorn
 from pydantic import BaseModel
+from starlette.responses import Response
 
 from a2a.server.agent_execution import AgentExecutor, RequestContext
 from a2a.server.apps import A2AStarletteApplication
@@ -33,6 +34,15 @@ from a2a.utils import new_agent_text_message, new_task
 from a2a.utils.errors import ServerError
 from a2a.types import InvalidParamsError
 
+import json_codec
+from log_sink import LEVELS, SINKS
+from output_formats import FORMATS, parse_formats
+from profiling import DEFAULT_TOP, PROFILES, parse_profile
+from admission import AdmissionController, AdmissionMiddleware
+from server_metrics import CONTENT_TYPE, ServerMetrics
+import tracing
+from worker_pool import WorkerPool
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("purple-agent")
@@ -43,13 +53,50 @@ class TaskRequest(BaseModel):
     task_id: str
     mock_url: str = "http://mock-comtrade:8000"
     output_dir: str = None
+    # Extra output files for this run (default: --output-format)
+    output_formats: Optional[List[str]] = None
+    # Profile this run: "cpu", "mem" or "both" (default: --profile)
+    profile: Optional[str] = None
 
 
 class PurpleExecutor(AgentExecutor):
     """A2A AgentExecutor for Purple Comtrade Baseline."""
 
-    def __init__(self):
-        pass
+    def __init__(
+        self,
+        agent_options: Optional[Dict[str, Any]] = None,
+        use_async: bool = False,
+        pool: Optional[WorkerPool] = None,
+        metrics: Optional[ServerMetrics] = None,
+    ):
+        self.agent_options = agent_options or {}
+        self.use_async = use_async
+        # Shared worker pool for threaded agent runs
+        self.pool = pool or WorkerPool()
+        # Prometheus counters and histograms, fed by every agent run
+        self.metrics = metrics or ServerMetrics()
+        # One long-lived agent serves every task (created on first use)
+        self._agent = None
+
+    def _get_agent(self):
+        if self._agent is None:
+            if self.use_async:
+                from async_purple_agent import AsyncPurpleAgent
+                self._agent = AsyncPurpleAgent(metrics=self.metrics, **self.agent_options)
+            else:
+                from purple_agent import PurpleAgent
+                self._agent = PurpleAgent(metrics=self.metrics, **self.agent_options)
+        return self._agent
+
+    async def aclose(self) -> None:
+        """Release the agent's client and log sink once the server stops."""
+        if self._agent is None:
+            return
+        if self.use_async:
+            await self._agent.aclose()
+        else:
+            self._agent.close()
+        self._agent = None
 
     async def execute(
         self,
@@ -63,8 +110,10 @@ class PurpleExecutor(AgentExecutor):
 
         # Parse as TaskRequest
         try:
-            request_data = json.loads(request_text)
+            request_data = json_codec.loads(request_text)
             task_request = TaskRequest(**request_data)
+            output_formats = None if task_request.output_formats is None else parse_formats(task_request.output_formats)
+            profile = parse_profile(task_request.profile) if task_request.profile is not None else None
         except (json.JSONDecodeError, Exception) as e:
             logger.error(f"Failed to parse TaskRequest: {e}")
             raise ServerError(error=InvalidParamsError(message=f"Invalid TaskRequest format: {e}"))
@@ -89,35 +138,47 @@ class PurpleExecutor(AgentExecutor):
             new_agent_text_message(f"Starting task {task_request.task_id}")
         )
 
-        # Run task in background thread
-        try:
-            from purple_agent import PurpleAgent
-            agent = PurpleAgent()
-            loop = asyncio.get_event_loop()
-
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                success = await loop.run_in_executor(
-                    executor,
-                    agent.run,
-                    task_request.task_id,
-                    task_request.output_dir,
-                    task_request.mock_url
-                )
-
-            if success:
-                await updater.update_status(
-                    TaskState.working,
-                    new_agent_text_message(f"Task {task_request.task_id} completed successfully")
-                )
-                await updater.complete()
-            else:
-                await updater.failed(new_agent_text_message(f"Task {task_request.task_id} failed"))
-                raise ServerError(error=InvalidParamsError(message=f"Task execution failed"))
-
-        except Exception as e:
-            logger.error(f"Task execution error: {e}")
-            await updater.failed(new_agent_text_message(f"Task failed: {e}"))
-            raise
+        # Root span of the run's trace (with --trace); spans of the agent run on the
+        # worker thread nest under it
+        with tracing.start("a2a execute", "server", enabled=self.agent_options.get("trace", False), task_id=task_request.task_id):
+            # Run task on the event loop (asyncio agent) or in a background thread
+            try:
+                agent = self._get_agent()
+                if self.use_async:
+                    success = await self.metrics.run_task_async(
+                        agent.run,
+                        task_request.task_id,
+                        task_request.output_dir,
+                        task_request.mock_url,
+                        output_formats,
+                        profile,
+                    )
+                else:
+                    logger.info(f"Submitting {task_request.task_id} to worker pool: {self.pool.stats()}")
+                    success = await self.pool.run(
+                        self.metrics.run_task,
+                        agent.run,
+                        task_request.task_id,
+                        task_request.output_dir,
+                        task_request.mock_url,
+                        output_formats,
+                        profile,
+                    )
+
+                if success:
+                    await updater.update_status(
+                        TaskState.working,
+                        new_agent_text_message(f"Task {task_request.task_id} completed successfully")
+                    )
+                    await updater.complete()
+                else:
+                    await updater.failed(new_agent_text_message(f"Task {task_request.task_id} failed"))
+                    raise ServerError(error=InvalidParamsError(message=f"Task execution failed"))
+
+            except Exception as e:
+                logger.error(f"Task execution error: {e}")
+                await updater.failed(new_agent_text_message(f"Task failed: {e}"))
+                raise
 
     async def cancel(
         self, request: RequestContext, event_queue: EventQueue
@@ -154,16 +215,75 @@ async def main():
     parser.add_argument("--host", default="0.0.0.0", help="Server host")
     parser.add_argument("--port", type=int, default=9009, help="Server port")
     parser.add_argument("--card-url", default=None, help="External agent URL")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent page fetch workers")
+    parser.add_argument("--pool-size", type=int, default=None, help="HTTP connections kept alive per mock_url (default: $PURPLE_POOL_SIZE or 10)")
+    parser.add_argument("--no-keep-alive", action="store_true", default=False, help="Close the HTTP connection after every request")
+    parser.add_argument("--memory-budget-mb", type=float, default=256, help="Rows buffered per run before spilling sorted runs to disk, in MB (0 never spills)")
+    parser.add_argument("--spill-dir", default=None, help="Directory for spilled sorted runs (default: system temp dir)")
+    parser.add_argument("--external-sort", action="store_true", default=False, help="Dedup while merging spilled runs instead of with an in-memory key set")
+    parser.add_argument("--dedup-digest-bits", type=int, choices=[64, 128], default=None, help="Keep dedup keys as digests of this width: less memory, slower (default: key tuples)")
+    parser.add_argument("--shards", type=int, default=1, help="Worker processes that sort and encode large runs (default: 1, in-process)")
+    parser.add_argument("--shard-threshold", type=int, default=500_000, help="Rows a run needs before sorting is sharded across processes")
+    parser.add_argument("--json-codec", choices=list(json_codec.CODECS), default=None, help="JSON codec for responses, rows and request bodies")
+    parser.add_argument("--output-format", action="append", default=None, metavar="FORMAT", help=f"Also write data.jsonl as FORMAT, repeatable or comma-separated: {', '.join(FORMATS)}")
+    parser.add_argument("--compress-threads", type=int, default=None, help="Threads compressing jsonl.gz / jsonl.zst outputs (default: CPU count)")
+    parser.add_argument("--fsync-outputs", action="store_true", default=False, help="fsync output files in one batch before they are atomically committed")
+    parser.add_argument("--log-sink", choices=list(SINKS), default="queue", help="Console log writer: background batched queue or synchronous print")
+    parser.add_argument("--log-level", choices=list(LEVELS), default="INFO", help="Lowest level printed to the console; run.log always has every line")
+    parser.add_argument("--trace", action="store_true", default=False, help="Write a span trace of each run to trace.json (Chrome trace-event format) in its output directory")
+    parser.add_argument("--profile", choices=list(PROFILES), default=None, help="Profile each run with cProfile (cpu), tracemalloc (mem) or both; writes profile.pstats / memory_top.txt next to data.jsonl")
+    parser.add_argument("--profile-top", type=int, default=DEFAULT_TOP, help="Allocation sites listed in memory_top.txt")
+    parser.add_argument("--engine", choices=["row", "columnar"], default="row", help="Row processing engine; columnar needs NumPy and keeps rows in memory")
+    parser.add_argument("--async-agent", action="store_true", default=False, help="Use the asyncio agent (httpx)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker pool size (default: $PURPLE_WORKERS or min(32, CPUs + 4))")
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Max concurrent task runs (default: worker pool size)")
+    parser.add_argument("--max-queue", type=int, default=16, help="Task runs allowed to wait for a slot before rejecting with 503")
+    parser.add_argument("--queue-timeout", type=float, default=30.0, help="Seconds a queued task run waits for a slot")
+    parser.add_argument("--retry-jitter", choices=["none", "full", "decorrelated"], default="none", help="Backoff jitter mode")
+    parser.add_argument("--retry-base", type=float, default=1.0, help="Base backoff in seconds")
+    parser.add_argument("--retry-budget", type=float, default=None, help="Total retry sleep budget per run in seconds")
 
     args, unknown = parser.parse_known_args()
     if unknown:
         logger.info(f"Ignoring unknown args: {unknown}")
+    if args.json_codec:
+        json_codec.use(args.json_codec)
+    try:
+        output_formats = parse_formats(args.output_format)
+    except ValueError as e:
+        parser.error(str(e))
 
     # Determine agent URL
     agent_url = args.card_url or f"http://{args.host}:{args.port}"
 
     # Create executor
-    executor = PurpleExecutor()
+    from http_pool import ConnectionPools
+    from retry_policy import RetryPolicy
+    pools = ConnectionPools(args.pool_size, keep_alive=not args.no_keep_alive)
+    executor = PurpleExecutor(agent_options={
+        "concurrency": args.concurrency,
+        "pools": pools,
+        "memory_budget_mb": args.memory_budget_mb or None,
+        "spill_dir": args.spill_dir,
+        "external_sort": args.external_sort,
+        "engine": args.engine,
+        "dedup_digest_bits": args.dedup_digest_bits,
+        "shards": args.shards,
+        "shard_threshold": args.shard_threshold,
+        "output_formats": output_formats,
+        "compress_threads": args.compress_threads,
+        "fsync_outputs": args.fsync_outputs,
+        "log_sink": args.log_sink,
+        "log_level": args.log_level,
+        "trace": args.trace,
+        "profile": args.profile,
+        "profile_top": args.profile_top,
+        "retry_policy": RetryPolicy(
+            base_seconds=args.retry_base,
+            jitter=args.retry_jitter,
+            budget_seconds=args.retry_budget,
+        ),
+    }, use_async=args.async_agent, pool=WorkerPool(args.workers))
 
     # Create agent card
     agent_card = create_agent_card(agent_url)
@@ -183,13 +303,38 @@ async def main():
     # Build app
     app = a2a_server.build()
 
+    # Health and metrics endpoints with worker pool gauges
+    CodecJSONResponse = json_codec.response_class()
+
+    # Cap concurrent task runs with a bounded wait queue (503 + Retry-After when saturated)
+    admission = AdmissionController(args.max_in_flight or executor.pool.max_workers, args.max_queue, args.queue_timeout)
+
+    async def health(request):
+        return CodecJSONResponse({
+            "status": "ok",
+            "worker_pool": executor.pool.stats(),
+            "admission": admission.stats(),
+            "connection_pools": pools.stats(),
+            "json_codec": json_codec.active(),
+        })
+
+    async def prometheus_metrics(request):
+        return Response(executor.metrics.render(executor.pool, admission), media_type=CONTENT_TYPE)
+
+    app.add_route("/health", health, methods=["GET"])
+    app.add_route("/metrics", prometheus_metrics, methods=["GET"])
+    app = AdmissionMiddleware(app, admission)
+
     logger.info(f"Starting Purple Comtrade Baseline on {args.host}:{args.port}")
     logger.info(f"Agent URL: {agent_url}")
 
     # Run server
     config = uvicorn.Config(app, host=args.host, port=args.port)
     server = uvicorn.Server(config)
-    await server.serve()
+    try:
+        await server.serve()
+    finally:
+        await executor.aclose()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,82 @@
+import contextlib
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# The agent modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tasks import get_task  # noqa: E402
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """/docs, /configure and /records; bodies of the first /records calls come from `bodies`."""
+
+    bodies = []
+    configure_body = b'{"ok": true}'
+    calls = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/records"):
+            type(self).calls += 1
+            if self.bodies:
+                return self._send(self.bodies.pop(0))
+            task = get_task("T1_single_page")
+            rows = [dict(task.query, record_id=i, value=1.5, isTotal=False) for i in range(task.constraints["total_rows"])]
+            return self._send(json.dumps({"data": rows}).encode())
+        self._send(b"{}")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._send(self.configure_body)
+
+
+@pytest.fixture
+def mock_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    MockHandler.calls = 0
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@contextlib.contextmanager
+def serve_comtrade(**options):
+    """mock_comtrade's create_app(**options) on a free local port; yields its URL."""
+    import uvicorn
+    from mock_comtrade import create_app
+
+    server = uvicorn.Server(uvicorn.Config(create_app(**options), host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{server.servers[0].sockets[0].getsockname()[1]}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+@pytest.fixture(scope="session")
+def comtrade_url():
+    """mock_comtrade (seed 0, no latency) shared by the session's tests."""
+    with serve_comtrade() as url:
+        yield url
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+
+from admission import BUSY_ERROR_CODE, AdmissionController, AdmissionMiddleware, ServerBusy
+
+
+def test_waiting_request_gets_the_freed_slot():
+    async def scenario():
+        controller = AdmissionController(1, max_queue=1, queue_timeout=5.0)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0.01)
+        assert controller.waiting == 1
+        # The queue holds one waiter; a third request is turned away at once
+        with pytest.raises(ServerBusy) as busy:
+            await controller.acquire()
+        assert busy.value.reason == "queue_full"
+        controller.release()
+        await asyncio.wait_for(waiter, 1.0)
+        return controller.stats()
+
+    assert asyncio.run(scenario()) == {
+        "max_in_flight": 1, "max_queue": 1, "in_flight": 1, "waiting": 0, "admitted": 2, "rejected": 1,
+    }
+
+
+def test_queued_request_times_out():
+    async def scenario():
+        controller = AdmissionController(1, max_queue=4, queue_timeout=0.05)
+        async with controller.slot():
+            with pytest.raises(ServerBusy) as busy:
+                await controller.acquire()
+        return controller, busy.value
+
+    controller, busy = asyncio.run(scenario())
+    assert busy.reason == "queue_timeout"
+    assert (controller.in_flight, controller.waiting, controller.rejected) == (0, 0, 1)
+
+
+def test_no_queue_rejects_immediately_and_none_disables_the_cap():
+    async def scenario():
+        capped = AdmissionController(1)
+        await capped.acquire()
+        with pytest.raises(ServerBusy):
+            await capped.acquire()
+        uncapped = AdmissionController(None)
+        for _ in range(100):
+            await uncapped.acquire()
+        return uncapped.in_flight
+
+    assert asyncio.run(scenario()) == 100
+
+
+def call(app, method):
+    """Drive the ASGI app with one empty request; returns the messages it sent."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app({"type": "http", "method": method, "path": "/"}, receive, send))
+    return sent
+
+
+def test_middleware_answers_503_with_retry_after_when_busy():
+    calls = []
+
+    async def inner(scope, receive, send):
+        calls.append(scope["method"])
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    controller = AdmissionController(1, retry_after=2.5)
+    app = AdmissionMiddleware(inner, controller)
+    assert call(app, "POST")[0]["status"] == 200
+    assert controller.in_flight == 0
+
+    asyncio.run(controller.acquire())
+    start, body = call(app, "POST")
+    assert start["status"] == 503
+    assert dict(start["headers"])[b"retry-after"] == b"3"
+    error = json.loads(body["body"])["error"]
+    assert error["code"] == BUSY_ERROR_CODE
+    assert error["data"] == {"reason": "queue_full", "retry_after_seconds": 2.5}
+    # GETs (agent card, health) are never held back
+    assert call(app, "GET")[0]["status"] == 200
+    assert calls == ["POST", "GET"]
@@ -0,0 +1,63 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from async_purple_agent import AsyncPurpleAgent
+from conftest import serve_comtrade
+from purple_agent import PurpleAgent
+from retry_policy import RetryPolicy
+
+
+class RecordingAgent(AsyncPurpleAgent):
+    """Notes the thread every page merge runs on."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.merge_threads = []
+
+    def _merge_planned_pages(self, *args):
+        self.merge_threads.append(threading.current_thread())
+        return super()._merge_planned_pages(*args)
+
+
+def test_pages_are_merged_off_the_event_loop(mock_url, tmp_path):
+    agent = RecordingAgent(retry_policy=RetryPolicy(base_seconds=0.01))
+
+    async def run():
+        loop_thread = threading.current_thread()
+        assert await agent.run("T1_single_page", str(tmp_path / "out"), mock_url)
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert agent.merge_threads
+    assert loop_thread not in agent.merge_threads
+    assert sum(1 for _ in open(tmp_path / "out" / "data.jsonl")) == 800
+
+
+def run_async_agent(agent, task_id, output_dir, url):
+    async def run():
+        async with agent:
+            return await agent.run(task_id, output_dir, url)
+
+    return asyncio.run(run())
+
+
+def test_pages_merge_as_they_arrive_and_end_of_data_stops_fetching(tmp_path):
+    agent = RecordingAgent()
+    # T2 plans 5 pages of 500 rows; the short page 2 (or the empty page 3) ends the data
+    with serve_comtrade(total_rows=600) as url:
+        assert run_async_agent(agent, "T2_multi_page", str(tmp_path / "out"), url)
+    metadata = json.loads((tmp_path / "out" / "metadata.json").read_text())
+    assert metadata["row_count"] == 600
+    assert metadata["request_count"] <= 3
+    assert len(agent.merge_threads) == metadata["request_count"]
+
+
+@pytest.mark.parametrize("task_id", ["T2_multi_page", "T3_duplicates", "T7_totals_trap"])
+def test_async_agent_writes_the_threaded_agents_bytes(comtrade_url, tmp_path, task_id):
+    with PurpleAgent() as agent:
+        assert agent.run(task_id, str(tmp_path / "threaded"), comtrade_url)
+    assert run_async_agent(AsyncPurpleAgent(concurrency=4), task_id, str(tmp_path / "async"), comtrade_url)
+    assert (tmp_path / "async" / "data.jsonl").read_bytes() == (tmp_path / "threaded" / "data.jsonl").read_bytes()
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+columnar = pytest.importorskip("columnar")
+
+from compact_rows import dumps_rows  # noqa: E402
+from purple_agent import PurpleAgent  # noqa: E402
+from row_pipeline import RowPipeline  # noqa: E402
+
+DEDUP_KEY = ["year", "reporter", "partner", "flow", "hs", "record_id"]
+
+
+def is_totals(row):
+    return row.get("isTotal") == True and row.get("partner") == "WLD" and row.get("hs") == "TOTAL"
+
+
+def pages(seed, record_id=lambda rng: rng.randrange(400), layouts=False):
+    rng = random.Random(seed)
+    result = []
+    for _ in range(8):
+        page = []
+        for _ in range(250):
+            row = {
+                "year": rng.choice([2020, 2021]),
+                "reporter": "840",
+                "partner": rng.choice(["156", "276", "WLD"]),
+                "flow": rng.choice(["M", "X"]),
+                "hs": rng.choice(["85", "TOTAL"]),
+                "record_id": record_id(rng),
+                "value": rng.choice([100, 100.5, 2.5e20, None, "n/a"]),
+                "isTotal": rng.random() < 0.2,
+            }
+            if layouts and rng.random() < 0.1:
+                row = dict(reversed(row.items()))
+            page.append(row)
+        result.append(page)
+    return result
+
+
+def output(pipeline, data):
+    for page in data:
+        pipeline.extend(page)
+    text = dumps_rows(list(pipeline.sorted_rows()))
+    return text, pipeline
+
+
+@pytest.mark.parametrize(
+    "record_id, layouts, fallback",
+    [
+        (lambda rng: rng.randrange(400), False, False),
+        (lambda rng: f"r{rng.randrange(400):04d}", True, False),
+        # 7 and 7.0 are one key to the row engine but not to a typed array
+        (lambda rng: rng.choice([rng.randrange(400), float(rng.randrange(400))]), False, True),
+        (lambda rng: rng.choice([rng.randrange(400), float(rng.randrange(400))]), True, True),
+    ],
+    ids=["ints", "strings_mixed_layouts", "mixed_types", "mixed_types_and_layouts"],
+)
+def test_columnar_writes_the_row_engine_bytes(record_id, layouts, fallback):
+    data = pages(7, record_id, layouts)
+    expected, rows = output(RowPipeline(DEDUP_KEY, is_totals=is_totals), data)
+    text, vectorized = output(columnar.ColumnarPipeline(DEDUP_KEY, is_totals=is_totals), data)
+    assert text == expected
+    assert vectorized.fallback is fallback
+    assert vectorized.totals_dropped == rows.totals_dropped > 0
+    assert vectorized.duplicates_dropped == rows.duplicates_dropped > 0
+
+
+def test_missing_key_field_and_nul_strings_fall_back():
+    data = [
+        [{"year": 2021, "record_id": "a\0"}, {"year": 2021, "record_id": "a"}],
+        [{"record_id": "a", "year": 2021}, {"year": 2021, "record_id": "a\0", "value": 1}],
+    ]
+    expected, _ = output(RowPipeline(DEDUP_KEY), data)
+    text, vectorized = output(columnar.ColumnarPipeline(DEDUP_KEY), data)
+    assert text == expected
+    assert vectorized.fallback
+    assert columnar.key_column(["a\0", "a"]) is None
+
+
+@pytest.mark.parametrize("task_id", ["T3_duplicates", "T7_totals_trap"])
+def test_columnar_agent_writes_the_same_data(comtrade_url, tmp_path, task_id):
+    outputs = []
+    for engine in ("row", "columnar"):
+        with PurpleAgent(engine=engine) as agent:
+            assert agent.run(task_id, str(tmp_path / engine), comtrade_url)
+        outputs.append((tmp_path / engine / "data.jsonl").read_bytes())
+    assert outputs[0] == outputs[1]
+    assert outputs[0]
@@ -0,0 +1,21 @@
+from conftest import MockHandler
+from purple_agent import PurpleAgent
+from retry_policy import RetryPolicy
+
+
+def run_t1(mock_url, tmp_path):
+    agent = PurpleAgent(retry_policy=RetryPolicy(base_seconds=0.01))
+    return agent.run("T1_single_page", str(tmp_path / "out"), mock_url)
+
+
+def test_malformed_page_body_is_retried(mock_url, tmp_path, monkeypatch):
+    monkeypatch.setattr(MockHandler, "bodies", [b'{"data": [', b"<html>oops</html>"])
+    assert run_t1(mock_url, tmp_path)
+    assert MockHandler.calls == 3
+    assert sum(1 for _ in open(tmp_path / "out" / "data.jsonl")) == 800
+
+
+def test_malformed_configure_body_fails_the_run_cleanly(mock_url, tmp_path, monkeypatch):
+    monkeypatch.setattr(MockHandler, "configure_body", b"not json")
+    assert run_t1(mock_url, tmp_path) is False
+    assert MockHandler.calls == 0
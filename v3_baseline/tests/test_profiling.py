@@ -0,0 +1,59 @@
+import asyncio
+import json
+import os
+import pstats
+
+import pytest
+
+from async_purple_agent import AsyncPurpleAgent
+from atomic_output import StagedOutput
+from profiling import MEMORY_FILENAME, PSTATS_FILENAME
+from purple_agent import PurpleAgent
+
+
+@pytest.fixture
+def staged_files(monkeypatch):
+    """Names in each staging directory at the moment it is committed."""
+    seen = []
+    commit = StagedOutput.commit
+
+    def recording_commit(self):
+        seen.append(sorted(os.listdir(self.path)))
+        return commit(self)
+
+    monkeypatch.setattr(StagedOutput, "commit", recording_commit)
+    return seen
+
+
+def run(agent_class, output_dir, url):
+    if agent_class is PurpleAgent:
+        with PurpleAgent(profile="both") as agent:
+            return agent.run("T2_multi_page", str(output_dir), url)
+
+    async def run_async():
+        async with AsyncPurpleAgent(profile="both") as agent:
+            return await agent.run("T2_multi_page", str(output_dir), url)
+
+    return asyncio.run(run_async())
+
+
+@pytest.mark.parametrize("agent_class", [PurpleAgent, AsyncPurpleAgent])
+def test_profile_files_are_committed_with_the_outputs(comtrade_url, tmp_path, staged_files, agent_class):
+    output_dir = tmp_path / "out"
+    assert run(agent_class, output_dir, comtrade_url)
+
+    (staged,) = staged_files
+    assert {PSTATS_FILENAME, MEMORY_FILENAME, "data.jsonl", "metadata.json"} <= set(staged)
+    assert sorted(os.listdir(output_dir)) == staged
+
+    profile = json.loads((output_dir / "metadata.json").read_text())["profile"]
+    assert profile["mode"] == "both"
+    assert profile["files"] == [PSTATS_FILENAME, MEMORY_FILENAME]
+    assert profile["peak_traced_bytes"] > 0
+
+    # Includes the output writer, which the async agent runs on another thread
+    functions = {name for _, _, name in pstats.Stats(str(output_dir / PSTATS_FILENAME)).stats}
+    assert {"_fetch_all_pages", "_write_files"} <= functions
+    report = (output_dir / MEMORY_FILENAME).read_text()
+    assert report.startswith("Peak traced memory: ")
+    assert "allocation sites by size" in report
@@ -0,0 +1,67 @@
+import asyncio
+import types
+
+import pytest
+
+import rate_limit
+from rate_limit import TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock; sleeping advances it."""
+    now = [100.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(rate_limit, "time", types.SimpleNamespace(monotonic=lambda: now[0], sleep=sleep))
+    clock = types.SimpleNamespace(slept=slept)
+    clock.advance = lambda seconds: now.__setitem__(0, now[0] + seconds)
+    return clock
+
+
+def test_burst_then_paced_at_rate(clock):
+    bucket = TokenBucket(10, capacity=3)
+    waits = [bucket.acquire() for _ in range(5)]
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3:] == pytest.approx([0.1, 0.1])
+    assert clock.slept == pytest.approx([0.1, 0.1])
+    assert bucket.stats() == {"qps": 10.0, "burst": 3.0, "requests_paced": 5, "wait_seconds": 0.2}
+
+
+def test_refill_is_capped_at_capacity(clock):
+    bucket = TokenBucket(4, capacity=2)
+    bucket.acquire()
+    bucket.acquire()
+    clock.advance(10)
+    assert [bucket.acquire() for _ in range(3)] == pytest.approx([0.0, 0.0, 0.25])
+
+
+def test_callers_reserve_in_arrival_order(clock):
+    # Reservations without sleeping, as concurrent threads make them
+    bucket = TokenBucket(20)
+    assert [bucket._reserve(1.0) for _ in range(4)] == pytest.approx([0.0, 0.05, 0.1, 0.15])
+    assert bucket.waited_seconds == pytest.approx(0.3)
+
+
+def test_async_acquire_paces_without_blocking():
+    bucket = TokenBucket(50)
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        waits = await asyncio.gather(*(bucket.acquire_async() for _ in range(4)))
+        return waits, loop.time() - start
+
+    waits, elapsed = asyncio.run(scenario())
+    assert sorted(waits) == pytest.approx([0.0, 0.02, 0.04, 0.06], abs=0.005)
+    assert 0.05 <= elapsed < 0.5
+
+
+@pytest.mark.parametrize("rate", [0, -1])
+def test_rate_must_be_positive(rate):
+    with pytest.raises(ValueError):
+        TokenBucket(rate)
@@ -0,0 +1,96 @@
+import pickle
+import random
+
+import pytest
+
+import json_codec
+import sharding
+from compact_rows import SchemaRegistry
+from row_pipeline import RowPipeline
+
+DEDUP_KEY = ["year", "reporter", "partner", "flow", "hs", "record_id"]
+
+
+def rows(count, seed=0):
+    rng = random.Random(seed)
+    out = []
+    for i in range(count):
+        row = {"year": 2021, "reporter": "840", "partner": rng.choice(["156", "250"]), "flow": "M",
+               "hs": "85", "record_id": rng.randint(0, count // 2), "value": i * 0.5, "isTotal": False}
+        if i % 11 == 0:
+            # A schema without hs, whose key getter is a lambda (its own year keeps keys comparable)
+            del row["hs"]
+            row["year"] = 2020
+        out.append(row)
+    return out
+
+
+def run(pipeline, data):
+    for start in range(0, len(data), 100):
+        pipeline.extend(data[start:start + 100])
+    try:
+        lines = [row[0].dumps(row) for row in pipeline.sorted_rows()]
+        return lines, pipeline.stats()
+    finally:
+        pipeline.close()
+
+
+def test_packed_rows_pickle_with_their_schema():
+    registry = SchemaRegistry(DEDUP_KEY)
+    row = registry.pack({"year": 2021, "record_id": 3, "value": 1.5})
+    copy = pickle.loads(pickle.dumps(row))
+    assert copy[0].key(copy) == row[0].key(row)
+    assert copy[0].dumps(copy) == row[0].dumps(row)
+
+
+def test_sharded_sort_matches_in_process(monkeypatch):
+    monkeypatch.setattr(sharding, "MAX_WORKERS", 4)
+    data = rows(3000)
+    expected, _ = run(RowPipeline(DEDUP_KEY), data)
+    lines, stats = run(RowPipeline(DEDUP_KEY, dedup_on_merge=True, shards=3, shard_threshold=1000), data)
+    assert stats["shards"] == 3
+    assert lines == expected
+    assert sharding._workers_in_use == 0
+
+
+def test_shards_are_opt_in():
+    _, stats = run(RowPipeline(DEDUP_KEY, shard_threshold=10), rows(200))
+    assert stats["shards"] == 0
+
+
+def test_worker_cap_is_shared(monkeypatch):
+    monkeypatch.setattr(sharding, "MAX_WORKERS", 5)
+    assert sharding.reserve_workers(4) == 4
+    # One slot left: not enough to shard
+    assert sharding.reserve_workers(4) == 0
+    sharding.release_workers(4)
+    assert sharding.reserve_workers(8) == 5
+    sharding.release_workers(5)
+    assert sharding._workers_in_use == 0
+
+
+def test_run_sorts_in_process_when_no_workers_are_free(monkeypatch):
+    monkeypatch.setattr(sharding, "MAX_WORKERS", 1)
+    data = rows(2000)
+    expected, _ = run(RowPipeline(DEDUP_KEY), data)
+    lines, stats = run(RowPipeline(DEDUP_KEY, shards=4, shard_threshold=100), data)
+    assert stats["shards"] == 0
+    assert lines == expected
+
+
+@pytest.mark.parametrize("method", ["forkserver", "spawn"])
+def test_workers_never_fork_the_agent_process(monkeypatch, method):
+    monkeypatch.setattr(sharding.multiprocessing, "get_all_start_methods", lambda: ["fork", method])
+    assert sharding.start_method() == method
+
+
+def test_workers_use_the_agent_codec():
+    default = json_codec.active()
+    if default == "stdlib":
+        pytest.skip("no faster codec installed to switch away from")
+    json_codec.use("stdlib")
+    try:
+        with sharding.worker_pool(2) as pool:
+            assert pool.apply(json_codec.active) == "stdlib"
+    finally:
+        json_codec.use(default)
@@ -0,0 +1,45 @@
+import json
+import time
+
+from purple_agent import PurpleAgent
+from telemetry import PHASES, RunTelemetry
+
+
+def test_time_producing_rows_is_charged_to_process_not_write(tmp_path):
+    telemetry = RunTelemetry()
+
+    def sorted_rows():
+        for row in range(3):
+            time.sleep(0.05)
+            yield row
+
+    telemetry.mark("process")
+    rows = telemetry.timed("process", sorted_rows())
+    telemetry.mark("write")
+    for _ in rows:
+        time.sleep(0.02)
+    telemetry.mark(None)
+    assert 0.15 <= telemetry.phases["process"] < 0.2
+    assert 0.06 <= telemetry.phases["write"] < 0.1
+
+    telemetry.write_events(tmp_path / "metrics.jsonl")
+    events = [json.loads(line) for line in open(tmp_path / "metrics.jsonl")]
+    assert [event["phase"] for event in events] == ["process", "write"]
+    telemetry.close()
+
+
+def test_metrics_and_metadata_report_the_same_phases(comtrade_url, tmp_path):
+    # A tiny memory budget makes the spilled-run merge real processing work
+    with PurpleAgent(memory_budget_mb=0.05) as agent:
+        assert agent.run("T2_multi_page", str(tmp_path), comtrade_url)
+    metadata = json.loads((tmp_path / "metadata.json").read_text())
+    events = [json.loads(line) for line in open(tmp_path / "metrics.jsonl")]
+    requests = [event for event in events if event["event"] == "request"]
+    phases = {event["phase"]: event["seconds"] for event in events if event["event"] == "phase"}
+
+    assert len(requests) == metadata["performance"]["requests"]
+    assert events[len(requests):] == [{"event": "phase", "phase": phase, "seconds": phases[phase]} for phase in PHASES]
+    assert phases == metadata["performance"]["phases_seconds"]
+    assert metadata["pipeline"]["spilled_runs"] > 1
+    assert phases["process"] > 0
+    assert phases["fetch"] > phases["process"]
@@ -0,0 +1,211 @@
+"""
+Span tracing of a task run, exported as a Chrome trace-event file.
+
+A span times one step of a run (wait_for_http, configure_mock, each HTTP
+attempt, write_outputs, ...). The current span lives in a ContextVar, so
+children nest under it on the same thread, in asyncio tasks, and on pool
+threads that run their work in a copy of the submitting context
+(WorkerPool, PageScheduler, asyncio.to_thread). That is how an A2A request
+span in the server becomes the parent of the agent's run span on a worker
+thread. Spans inside an asyncio task are drawn on a track of their own, as
+if the task were a thread.
+
+With no trace active, span() returns a shared no-op, so tracing costs one
+ContextVar lookup per step when it is off.
+
+When the root span of a trace ends, the trace is written to its path
+(trace.json in the run's output directory) as {"traceEvents": [...]}:
+one complete ("X") event per span with span_id and parent_id in args,
+thread names, and flow arrows from a parent to children started on other
+threads. Open it in chrome://tracing or https://ui.perfetto.dev.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import itertools
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+import json_codec
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+TRACE_FILENAME = "trace.json"
+
+
+class Trace:
+    """Finished spans of one trace, in Chrome trace-event form."""
+
+    def __init__(self) -> None:
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        # Where the root span exports the trace (first run to set it wins)
+        self.path: Optional[Path] = None
+        self._ids = itertools.count(1)
+        self._events: List[Dict[str, Any]] = []
+        self._threads: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def _us(self, t: float) -> float:
+        return round((t - self.origin) * 1e6, 3)
+
+    def finish(self, span: "Span", ended: float) -> None:
+        args = dict(span.args, span_id=span.id, parent_id=span.parent.id if span.parent else None)
+        events = [{
+            "name": span.name,
+            "cat": span.cat,
+            "ph": "X",
+            "ts": self._us(span.started),
+            "dur": self._us(ended) - self._us(span.started),
+            "pid": self.pid,
+            "tid": span.tid,
+            "args": args,
+        }]
+        parent = span.parent
+        if parent is not None and parent.tid != span.tid:
+            # Flow arrow from the parent's thread to the child's
+            flow = {"name": "spawn", "cat": span.cat, "id": span.id, "ts": self._us(span.started), "pid": self.pid}
+            events.append(dict(flow, ph="s", tid=parent.tid))
+            events.append(dict(flow, ph="f", bp="e", tid=span.tid))
+        with self._lock:
+            self._threads.setdefault(span.tid, span.thread_name)
+            self._events.extend(events)
+
+    def export(self, path: Path) -> int:
+        """Write the trace to `path` (atomically replaced); returns the span count."""
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        meta = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json_codec.dumps({"traceEvents": meta + events, "displayTimeUnit": "ms"}))
+        os.replace(tmp, path)
+        return sum(1 for event in events if event["ph"] == "X")
+
+
+_current: ContextVar[Optional["Span"]] = ContextVar("purple_span", default=None)
+
+
+class Span:
+    """One timed step; use as a context manager. set() adds args shown in the viewer."""
+
+    __slots__ = ("trace", "id", "parent", "name", "cat", "args", "started", "tid", "thread_name", "_token")
+
+    def __init__(self, trace: Trace, name: str, cat: str, parent: Optional["Span"], args: Dict[str, Any]):
+        self.trace = trace
+        self.id = trace.next_id()
+        self.parent = parent
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def set(self, **args: Any) -> None:
+        self.args.update(args)
+
+    def __enter__(self) -> "Span":
+        thread = threading.current_thread()
+        self.tid, self.thread_name = thread.ident or 0, thread.name
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is not None:
+            # Concurrent tasks share the loop's thread; give each its own track
+            self.tid, self.thread_name = id(task), f"{thread.name} {task.get_name()}"
+        self._token = _current.set(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> Optional[bool]:
+        ended = time.perf_counter()
+        _current.reset(self._token)
+        if exc is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        self.trace.finish(self, ended)
+        if self.parent is None and self.trace.path is not None:
+            try:
+                self.trace.export(self.trace.path)
+            except OSError as e:
+                logger.warning("Could not write trace %s: %s", self.trace.path, e)
+        return None
+
+
+class _NoSpan:
+    """Stands in for a span while no trace is active."""
+
+    __slots__ = ()
+
+    def set(self, **args: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoSpan":
+        return self
+
+    def __exit__(self, *exc: Any) -> Optional[bool]:
+        return None
+
+
+NO_SPAN = _NoSpan()
+
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+
+def span(name: str, cat: str = "agent", **args: Any) -> Any:
+    """Child of the current span, or a no-op when no trace is active."""
+    parent = _current.get()
+    if parent is None:
+        return NO_SPAN
+    return Span(parent.trace, name, cat, parent, args)
+
+
+def start(name: str, cat: str = "agent", enabled: bool = True, **args: Any) -> Any:
+    """Child of the current span, else the root of a new trace if enabled, else a no-op."""
+    parent = _current.get()
+    if parent is not None:
+        return Span(parent.trace, name, cat, parent, args)
+    if not enabled:
+        return NO_SPAN
+    return Span(Trace(), name, cat, None, args)
+
+
+def traced(name: Optional[str] = None, cat: str = "agent") -> Callable[[F], F]:
+    """Decorator running each call of a (sync or async) function in a span."""
+
+    def decorate(fn: F) -> F:
+        label = name or fn.__name__.lstrip("_")
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(label, cat):
+                    return await fn(*args, **kwargs)
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(label, cat):
+                return fn(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+
+    return decorate